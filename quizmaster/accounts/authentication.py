@@ -1,37 +1,119 @@
 from bson import ObjectId
+from django.conf import settings
 
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import AuthenticationFailed
 
+from quizmaster import metrics, mongo_async
 from quizmaster.mongo_client import users_collection
+from quizmaster.ttl_cache import TTLCache
+
+_config = getattr(settings, "AUTH_PRINCIPAL", {})
+
+# "lookup": load the user from Mongo (through the principal cache).
+# "claims": build the user from the access token's claims only, no DB access.
+PRINCIPAL_MODE = _config.get("MODE", "lookup")
+
+# Short-lived cache of user documents (without password), keyed by user id
+principal_cache = metrics.caches.register("principal", TTLCache(
+    max_size=_config.get("CACHE_MAX_SIZE", 10000),
+    ttl=_config.get("CACHE_TTL", 30),
+))
+
+
+def invalidate_principal(user_id):
+    """Drop a cached user. Call whenever a user's profile changes (login and logout do)."""
+    principal_cache.invalidate(str(user_id))
+
+
+def load_principal(user_id):
+    """Return the user document for ``user_id`` (cached), or ``None`` if it does not exist."""
+    user_id = str(user_id)
+
+    def load():
+        user_doc = users_collection.find_one({"_id": ObjectId(user_id)}, {"password": 0})
+        if user_doc:
+            user_doc["_id"] = str(user_doc["_id"])
+        return user_doc
+
+    return principal_cache.get_or_load(user_id, load)
+
+
+async def aload_principal(user_id):
+    """Async ``load_principal`` for consumers and middleware; queries on the event loop."""
+    user_id = str(user_id)
+    user_doc = principal_cache.get(user_id)
+    if user_doc is None:
+        user_doc = await mongo_async.users.get_by_id(user_id, {"password": 0})
+        if user_doc:
+            user_doc["_id"] = str(user_doc["_id"])
+            principal_cache.set(user_id, user_doc)
+    return user_doc
+
+
+def principal_from_claims(token):
+    """Build a user document from token claims, or ``None`` if the token lacks them."""
+    if "username" not in token:
+        return None  # issued before the username claim existed
+    return {
+        "_id": str(token["user_id"]),
+        "email": token.get("email"),
+        "username": token["username"],
+        "is_staff": bool(token.get("is_staff", False)),
+    }
+
 
 class DictUser(dict):
     @property
     def is_authenticated(self):
         return True
 
+    @property
+    def is_staff(self):
+        # Set ``is_staff: true`` on a user document to grant admin endpoints
+        return bool(self.get("is_staff", False))
+
 class CookieJWTAuthentication(JWTAuthentication):
     
     def authenticate(self, request):
-        token = request.COOKIES.get("access_token")
-        if not token:
+        validated_token = self._validated_token(request)
+        if validated_token is None:
             return None  # No token means no authentication attempted
 
+        user_doc = principal_from_claims(validated_token) if PRINCIPAL_MODE == "claims" else None
+        if user_doc is None:
+            try:
+                user_doc = load_principal(validated_token.get("user_id"))
+            except Exception:
+                raise AuthenticationFailed("Invalid user id in token")
+        return self._result(user_doc, validated_token)
+
+    async def aauthenticate(self, request):
+        """``authenticate`` for async views (``quizmaster/async_api.py``); looks up on the event loop."""
+        validated_token = self._validated_token(request)
+        if validated_token is None:
+            return None
+
+        user_doc = principal_from_claims(validated_token) if PRINCIPAL_MODE == "claims" else None
+        if user_doc is None:
+            try:
+                user_doc = await aload_principal(validated_token.get("user_id"))
+            except Exception:
+                raise AuthenticationFailed("Invalid user id in token")
+        return self._result(user_doc, validated_token)
+
+    def _validated_token(self, request):
+        token = request.COOKIES.get("access_token")
+        if not token:
+            return None
         try:
-            validated_token = self.get_validated_token(token)
+            return self.get_validated_token(token)
         except AuthenticationFailed as e:
             raise AuthenticationFailed(f"Token validation failed: {str(e)}")
- 
-         
-        try:
-            user_doc = users_collection.find_one({"_id": ObjectId(validated_token.get("user_id"))}, {"password": 0})
-        except Exception:
-            raise AuthenticationFailed("Invalid user id in token")
-        
+
+    @staticmethod
+    def _result(user_doc, validated_token):
         if not user_doc:
             raise AuthenticationFailed("User not found")
-        
-        user_doc["_id"] = str(user_doc["_id"])
-        
-         
-        return (DictUser(user_doc), validated_token)
\ No newline at end of file
+        # Copy, so a view mutating request.user never touches the cached document
+        return (DictUser(user_doc), validated_token)
@@ -1,3 +1,59 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from quiz.tests import MongoTestCase
+
+from accounts import authentication
+
+
+class PrincipalTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        authentication.principal_cache.clear()
+        self.addCleanup(authentication.principal_cache.clear)
+        self.user_id = str(self.db.users.insert_one({"email": "a@example.com", "username": "a", "password": "x"}).inserted_id)
+
+    async def test_async_lookup_matches_sync_and_is_cached(self):
+        user = await authentication.aload_principal(self.user_id)
+        self.assertEqual(user, {"_id": self.user_id, "email": "a@example.com", "username": "a"})
+
+        self.db.users.delete_many({})
+        self.assertEqual(await authentication.aload_principal(self.user_id), user)  # from the cache
+        self.assertEqual(authentication.load_principal(self.user_id), user)
+
+    async def test_unknown_user_is_none(self):
+        authentication.invalidate_principal(self.user_id)
+        self.db.users.delete_many({})
+        self.assertIsNone(await authentication.aload_principal(self.user_id))
+
+
+class TokenPrincipalTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        authentication.principal_cache.clear()
+        self.addCleanup(authentication.principal_cache.clear)
+
+    def request(self, user, method="get"):
+        from rest_framework.test import APIRequestFactory
+        from accounts.views import create_tokens_for_user
+
+        request = getattr(APIRequestFactory(), method)("/")
+        request.COOKIES["access_token"] = create_tokens_for_user(user)[0]
+        return request
+
+    async def test_claims_mode_builds_the_principal_without_mongo(self):
+        request = self.request({"_id": "0" * 24, "email": "s@example.com", "username": "s", "is_staff": True})
+        with mock.patch.object(authentication, "PRINCIPAL_MODE", "claims"):
+            user, _ = await authentication.CookieJWTAuthentication().aauthenticate(request)  # no such user in Mongo
+        self.assertEqual(user, {"_id": "0" * 24, "email": "s@example.com", "username": "s", "is_staff": True})
+        self.assertTrue(user.is_staff)
+
+    def test_logout_drops_the_cached_principal(self):
+        from accounts.views import logout
+
+        user_id = str(self.db.users.insert_one({"email": "a@example.com", "username": "a"}).inserted_id)
+        request = self.request({"_id": user_id, "email": "a@example.com", "username": "a"}, "post")
+        self.assertEqual(authentication.load_principal(user_id)["username"], "a")  # cached
+
+        self.db.users.update_one({}, {"$set": {"username": "renamed"}})
+        self.assertEqual(logout(request).status_code, 205)
+        self.assertEqual(authentication.load_principal(user_id)["username"], "renamed")
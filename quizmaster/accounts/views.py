@@ -1,11 +1,12 @@
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.permissions import IsAuthenticated
-from accounts.authentication import CookieJWTAuthentication
+from accounts.authentication import CookieJWTAuthentication, invalidate_principal
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken, AccessToken
 from .util import hash_password, verify_password
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from .serializers import SignupSerializer, LoginSerializer
 from quizmaster.mongo_client import users_collection
 
@@ -35,6 +36,9 @@ def signup(request):
     }
     try:
         users_collection.insert_one(user_data)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent signup; the unique email index caught it.
+        return Response({"error": "User with this email already exists."}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({"error": "Failed to create user."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -43,7 +47,7 @@ def signup(request):
 
     response = Response({
         "message": "User created successfully",
-        "id": str(user["_id"]),
+        "id": user["_id"],
         "username": user["username"],
         "email": user["email"]
     }, status=status.HTTP_201_CREATED)
@@ -67,10 +71,11 @@ def login(request):
     if not user or not verify_password(user["password"], data["password"]):
         return Response({"error": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
 
+    invalidate_principal(user["_id"])  # a fresh login sees changes made to the account since
     access_token, refresh_token = create_tokens_for_user(user)
 
     response = Response({
-        "id": str(user["_id"]),
+        "id": user["_id"],
         "username": user["username"],
         "email": user["email"]
     }, status=status.HTTP_200_OK)
@@ -101,7 +106,11 @@ def logout(request):
     # response.set_cookie('access_token', value='', expires='Thu, 01 Jan 1970 00:00:00 GMT', httponly=True, secure=COOKIE_SECURE, samesite=SAME_SITE)
     # response.set_cookie('refresh_token', value='', expires='Thu, 01 Jan 1970 00:00:00 GMT', httponly=True, secure=COOKIE_SECURE, samesite=SAME_SITE)
     # return response
+    invalidate_principal(request.user["_id"])
     response = Response({'msg': 'Logout successfully'}, status=status.HTTP_205_RESET_CONTENT)
+    return response
+
+
 @api_view(['POST'])
 def cookieTokenRefresh(request):  
     """Issue a new access token using the refresh token stored in cookies."""
@@ -145,6 +154,8 @@ def create_tokens_for_user(user: dict) -> tuple:
     refresh = RefreshToken()
     refresh["user_id"] = str(user["_id"])
     refresh["email"] = user["email"]
+    refresh["username"] = user["username"]  # lets claims-only auth skip the user lookup
+    refresh["is_staff"] = bool(user.get("is_staff", False))  # admin endpoints in claims mode
     return str(refresh.access_token), str(refresh)
 
  
\ No newline at end of file
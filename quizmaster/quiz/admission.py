@@ -0,0 +1,147 @@
+# quiz/admission.py
+"""Join admission control, checked before join_quiz touches Mongo.
+
+Each session's capacity, status and set of joined users are kept in Redis (or
+in-process when ``REDIS_URL`` is not set) so a full, started or duplicate join
+is rejected in O(1) with its precise reason. The state is seeded from Mongo
+the first time a worker sees a session; Mongo stays the source of truth.
+"""
+import threading
+
+from django.conf import settings
+
+from quizmaster import mongo_async
+from quizmaster.redis_client import REDIS_URL, get_async_redis
+
+ADMITTED = "admitted"
+FULL = "full"
+STARTED = "started"
+DUPLICATE = "duplicate"
+UNKNOWN = "unknown"  # no session with this quiz_id
+
+STATE_TTL = getattr(settings, "ADMISSION", {}).get("STATE_TTL", 24 * 3600)  # seconds
+
+# KEYS[1] = state hash (capacity, status), KEYS[2] = joined set; ARGV[1] = user_id
+_ADMIT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return 'unseeded' end
+if redis.call('HGET', KEYS[1], 'status') ~= 'waiting' then return 'started' end
+if redis.call('SISMEMBER', KEYS[2], ARGV[1]) == 1 then return 'duplicate' end
+if redis.call('SCARD', KEYS[2]) >= tonumber(redis.call('HGET', KEYS[1], 'capacity')) then return 'full' end
+redis.call('SADD', KEYS[2], ARGV[1])
+return 'admitted'
+"""
+
+
+class LocalAdmission:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}  # quiz_id -> {"capacity", "status", "joined"}
+
+    async def admit(self, quiz_id, user_id):
+        with self._lock:
+            state = self._sessions.get(quiz_id)
+            if state is None:
+                return None
+            if state["status"] != "waiting":
+                return STARTED
+            if user_id in state["joined"]:
+                return DUPLICATE
+            if len(state["joined"]) >= state["capacity"]:
+                return FULL
+            state["joined"].add(user_id)
+            return ADMITTED
+
+    async def seed(self, quiz_id, capacity, status, joined):
+        with self._lock:
+            state = self._sessions.setdefault(
+                quiz_id, {"capacity": capacity, "status": status, "joined": set()}
+            )
+            state["joined"].update(joined)
+
+    async def release(self, quiz_id, user_id):
+        with self._lock:
+            state = self._sessions.get(quiz_id)
+            if state is not None:
+                state["joined"].discard(user_id)
+
+    async def set_status(self, quiz_id, status):
+        with self._lock:
+            state = self._sessions.get(quiz_id)
+            if state is not None:
+                state["status"] = status
+
+    async def drop(self, quiz_id):
+        with self._lock:
+            self._sessions.pop(quiz_id, None)
+
+
+class RedisAdmission:
+    @staticmethod
+    def _keys(quiz_id):
+        return f"adm:{quiz_id}", f"adm:{quiz_id}:joined"
+
+    async def admit(self, quiz_id, user_id):
+        redis = get_async_redis()
+        result = await redis.eval(_ADMIT_SCRIPT, 2, *self._keys(quiz_id), user_id)
+        return None if result == "unseeded" else result
+
+    async def seed(self, quiz_id, capacity, status, joined):
+        state_key, joined_key = self._keys(quiz_id)
+        async with get_async_redis().pipeline(transaction=True) as pipe:
+            pipe.hsetnx(state_key, "capacity", capacity)
+            pipe.hsetnx(state_key, "status", status)
+            if joined:
+                pipe.sadd(joined_key, *joined)
+            pipe.expire(state_key, STATE_TTL)
+            pipe.expire(joined_key, STATE_TTL)
+            await pipe.execute()
+
+    async def release(self, quiz_id, user_id):
+        await get_async_redis().srem(self._keys(quiz_id)[1], user_id)
+
+    async def set_status(self, quiz_id, status):
+        state_key, _ = self._keys(quiz_id)
+        redis = get_async_redis()
+        # Only update state that exists; an unseeded session is read from Mongo later
+        if await redis.exists(state_key):
+            await redis.hset(state_key, "status", status)
+
+    async def drop(self, quiz_id):
+        await get_async_redis().delete(*self._keys(quiz_id))
+
+
+_backend = RedisAdmission() if REDIS_URL else LocalAdmission()
+
+
+async def admit(quiz_id, user_id, capacity):
+    """Try to take a seat for ``user_id``; returns one of the outcome constants.
+
+    ``capacity`` (the quiz's max_participants) is only used to seed a session
+    this worker has not seen yet.
+    """
+    outcome = await _backend.admit(quiz_id, user_id)
+    if outcome is not None:
+        return outcome
+
+    session = await mongo_async.sessions.get_by_quiz(quiz_id, {"status": 1})
+    if not session:
+        return UNKNOWN
+    joined = [
+        p["user_id"]
+        for p in await mongo_async.participants.list_for_quiz(quiz_id, {"_id": 0, "user_id": 1})
+    ]
+    await _backend.seed(quiz_id, capacity, session["status"], joined)
+    return await _backend.admit(quiz_id, user_id)
+
+
+async def release(quiz_id, user_id):
+    """Give a seat back, e.g. when the Mongo write after admission failed."""
+    await _backend.release(quiz_id, user_id)
+
+
+async def set_status(quiz_id, status):
+    await _backend.set_status(quiz_id, status)
+
+
+async def drop(quiz_id):
+    await _backend.drop(quiz_id)
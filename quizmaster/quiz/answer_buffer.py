@@ -0,0 +1,229 @@
+# quiz/answer_buffer.py
+"""Optional write-behind mode for submit_answer.
+
+Answers are validated against an in-memory copy of each participant's
+``currentQuestionIndex`` and acknowledged straight away, then written to Mongo
+in ordered ``bulk_write`` batches. Every queued write keeps the
+``currentQuestionIndex`` filter, so the database still refuses an answer for a
+question that has already been answered.
+
+Durability bound: an acknowledged answer waits in memory for at most
+``FLUSH_INTERVAL_MS`` (or until ``MAX_BATCH`` answers are queued), and never
+more than ``MAX_PENDING`` answers are unflushed: once that many are queued,
+``accept`` refuses new answers (``BufferFull``) until a flush gets through, so
+while Mongo is down submits fail instead of piling up. Queues are flushed at
+process exit and when a session ends (``flush_session``).
+
+The in-memory state is per process, so this mode needs sticky routing of a
+session's players (HTTP and WebSocket) to one worker. When the scheduler ends
+a session, every worker holding state for it flushes and forgets the session
+(``drop_session``, run through ``quiz/session_events.py``). After that,
+``accept`` refuses the session (``SessionEnded``). A later submit re-seeds
+from Mongo, which checks that the session is still in progress. Between the
+status change in Mongo and that notice, a worker can still accept answers for
+the ended session.
+"""
+import atexit
+import logging
+import threading
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from quizmaster.mongo_client import participants_collection
+from . import session_version
+from .session_events import session_events
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, "ANSWER_WRITE_BEHIND", {})
+
+
+class SessionEnded(Exception):
+    """The participant's buffered state was dropped because the session ended."""
+
+
+class BufferFull(Exception):
+    """``max_pending`` answers are already waiting for Mongo."""
+
+
+class ParticipantState:
+    __slots__ = ("index", "score", "username")
+
+    def __init__(self, index, score, username):
+        self.index = index
+        self.score = score
+        self.username = username
+
+
+class AnswerBuffer:
+    def __init__(self, flush_interval_ms=200, max_batch=500, max_pending=10000):
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._states = {}             # (quiz_id, user_id) -> ParticipantState
+        self._sessions = {}           # quiz_id -> user_ids with state here
+        self._pending = deque()       # (quiz_id, user_id, index, answer_record, is_correct)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.flushed = 0
+        self.conflicts = 0
+
+    # -- participant state ------------------------------------------------------
+
+    def get_state(self, quiz_id, user_id):
+        return self._states.get((quiz_id, user_id))
+
+    def seed_state(self, quiz_id, user_id, participant):
+        """Install state read from Mongo unless another request already did."""
+        with self._lock:
+            self._sessions.setdefault(quiz_id, set()).add(user_id)
+            return self._states.setdefault((quiz_id, user_id), ParticipantState(
+                participant.get("currentQuestionIndex", 0),
+                participant.get("score", 0),
+                participant.get("username"),
+            ))
+
+    def accept(self, quiz_id, user_id, expected_index, answer_record, is_correct):
+        """Advance the participant if they are still on ``expected_index``.
+
+        Returns the updated state, or ``None`` when the question was already answered.
+        Raises ``SessionEnded`` if the session ended since the state was read, and
+        ``BufferFull`` (without advancing the participant) when it is backlogged.
+        """
+        with self._lock:
+            state = self._states.get((quiz_id, user_id))
+            if state is None:
+                raise SessionEnded(quiz_id)
+            if len(self._pending) >= self.max_pending:
+                raise BufferFull(quiz_id)
+            if state.index != expected_index:
+                return None
+            state.index += 1
+            if is_correct:
+                state.score += 1
+            self._pending.append((quiz_id, user_id, expected_index, answer_record, is_correct))
+            pending = len(self._pending)
+            snapshot = ParticipantState(state.index, state.score, state.username)
+
+        self._ensure_started()
+        if pending >= self.max_batch:
+            self._wakeup.set()
+        return snapshot
+
+    def backlogged(self):
+        """True once ``max_pending`` answers are unflushed; callers should then flush themselves."""
+        return len(self._pending) >= self.max_pending
+
+    # -- flushing -----------------------------------------------------------------
+
+    def _take_batch(self):
+        with self._lock:
+            count = min(len(self._pending), self.max_batch)
+            return [self._pending.popleft() for _ in range(count)]
+
+    @staticmethod
+    def _to_operation(item):
+        quiz_id, user_id, index, answer_record, is_correct = item
+        update_ops = {
+            "$push": {"answers": answer_record},
+            "$inc": {"currentQuestionIndex": 1},
+        }
+        if is_correct:
+            update_ops["$inc"]["score"] = 1
+        return UpdateOne(
+            {"quiz_id": quiz_id, "user_id": user_id, "currentQuestionIndex": index},
+            update_ops,
+        )
+
+    def flush(self):
+        """Write every queued answer to Mongo. Safe to call from any thread."""
+        with self._flush_lock:
+            while True:
+                batch = self._take_batch()
+                if not batch:
+                    return
+                try:
+                    # Ordered, so consecutive answers of one participant apply in sequence
+                    result = participants_collection.bulk_write(
+                        [self._to_operation(item) for item in batch], ordered=True
+                    )
+                    matched = result.matched_count
+                except BulkWriteError as e:
+                    failed_at = e.details["writeErrors"][0]["index"]
+                    logger.error("Dropping buffered answer after write error: %s", e.details["writeErrors"][0])
+                    self._requeue(batch[failed_at + 1:])
+                    matched = e.details.get("nMatched", 0)
+                    batch = batch[:failed_at]
+                except PyMongoError:
+                    logger.exception("Answer flush failed, retrying on next tick")
+                    self._requeue(batch)
+                    return
+                self.flushed += matched
+                self.conflicts += len(batch) - matched
+                for quiz_id in {item[0] for item in batch}:
+                    session_version.mark_changed(quiz_id)
+
+    def _requeue(self, items):
+        with self._lock:
+            self._pending.extendleft(reversed(items))
+
+    def has_session(self, quiz_id):
+        return quiz_id in self._sessions
+
+    def flush_session(self, quiz_id):
+        """Forget the session's participants and flush everything (call when it ends)."""
+        with self._lock:
+            for user_id in self._sessions.pop(quiz_id, ()):
+                del self._states[(quiz_id, user_id)]
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="answer-buffer", daemon=True)
+                    self._thread.start()
+
+    def stop(self):
+        """Stop the background flusher and write out whatever is left."""
+        self._stopped.set()
+        self._wakeup.set()
+        self.flush()
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "participants": len(self._states),
+            "flushed": self.flushed,
+            "conflicts": self.conflicts,
+        }
+
+
+ENABLED = _config.get("ENABLED", False)
+
+answer_buffer = AnswerBuffer(
+    flush_interval_ms=_config.get("FLUSH_INTERVAL_MS", 200),
+    max_batch=_config.get("MAX_BATCH", 500),
+    max_pending=_config.get("MAX_PENDING", 10000),
+)
+atexit.register(answer_buffer.stop)
+
+
+@session_events.on_end
+async def drop_session(quiz_id):
+    """Flush and forget this worker's state for a session that has ended."""
+    if ENABLED and answer_buffer.has_session(quiz_id):
+        await sync_to_async(answer_buffer.flush_session, thread_sensitive=False)(quiz_id)
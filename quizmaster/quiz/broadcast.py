@@ -0,0 +1,20 @@
+# quiz/broadcast.py
+"""Helpers for sending events to everyone connected to a quiz room."""
+from channels.layers import get_channel_layer
+
+from . import fanout
+from .protocol import new_event_id
+
+
+def room_group_name(quiz_id):
+    return f"quiz_{quiz_id}"
+
+
+async def abroadcast_to_room(quiz_id, event):
+    # The id lets each worker encode the frame once for all of its sockets
+    event = {**event, "event_id": new_event_id()}
+    if fanout.ENABLED:
+        await fanout.fanout.publish(quiz_id, event)
+    else:
+        await get_channel_layer().group_send(room_group_name(quiz_id), event)
+
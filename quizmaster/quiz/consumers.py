@@ -1,14 +1,30 @@
 # quiz/consumers.py
-import json
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
-from quizmaster.mongo_client import sessions_collection
+from quizmaster import mongo_async
+from quizmaster import metrics
+from quizmaster.slow_queries import current_caller
+from .broadcast import room_group_name
+from . import fanout
+from . import game
+from . import hot_state
+from . import protocol
+from . import ratelimit
+from .roster import roster_snapshot
+
+
+# Rate-limit rule per action; any other frame counts against "ws"
+WS_RULES = {
+    'start_quiz': 'start',
+    'get_roster': 'read',
+    'get_question': 'question',
+    'submit_answer': 'submit',
+}
 
 
 class QuizConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.quiz_id = self.scope['url_route']['kwargs']['quiz_id']
-        self.room_group_name = f'quiz_{self.quiz_id}'
+        self.room_group_name = room_group_name(self.quiz_id)
         self.user = self.scope.get('user')
         
         # Check if user is authenticated
@@ -26,62 +42,139 @@ class QuizConsumer(AsyncWebsocketConsumer):
         else:
             self.is_host = False
 
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
-        await self.accept()
+        # JSON text frames unless the client offers the MessagePack subprotocol
+        subprotocol = protocol.negotiate(self.scope.get('subprotocols', []))
+        self.wire_format = subprotocol or protocol.JSON
+        await self.accept(subprotocol)
+
+        # Joined once accepted: the per-worker fan-out calls our handlers directly
+        if fanout.ENABLED:
+            await fanout.fanout.join(self.quiz_id, self)
+        else:
+            await self.channel_layer.group_add(
+                self.room_group_name,
+                self.channel_name
+            )
+        metrics.ws_connects.inc()
+        metrics.ws_open_sockets.inc()
+        self.counted = True
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        if getattr(self, 'counted', False):
+            metrics.ws_disconnects.inc()
+            metrics.ws_open_sockets.dec()
+        if fanout.ENABLED:
+            await fanout.fanout.leave(self.quiz_id, self)
+        else:
+            await self.channel_layer.group_discard(
+                self.room_group_name,
+                self.channel_name
+            )
     
-    @database_sync_to_async
-    def get_session(self):
-        """Fetch quiz session from MongoDB."""
-        return sessions_collection.find_one({"quiz_id": self.quiz_id})
+    async def get_session(self):
+        """Fetch quiz session from Redis hot state while in progress, else MongoDB (on the event loop)."""
+        if hot_state.ENABLED:
+            session = await hot_state.get_session(self.quiz_id)
+            if session:
+                return session
+        return await mongo_async.sessions.get_by_quiz(self.quiz_id, {"host_id": 1, "status": 1})
 
-    async def receive(self, text_data):
-        data = json.loads(text_data)
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            data = protocol.decode(text_data, bytes_data)
+        except protocol.MalformedFrame:
+            await self.send_frame({
+                'type': 'error',
+                'status': 400,
+                'message': 'Malformed frame.'
+            })
+            return
         action = data.get('action')
+        current_caller.set(f'ws:{action}')
+
+        # Shed floods before touching the database
+        allowed, retry_after = await ratelimit.acheck(WS_RULES.get(action, 'ws'), self.user_id, self.quiz_id)
+        if not allowed:
+            await self.send_frame({
+                'type': 'error',
+                'action': action,
+                'status': 429,
+                'message': 'Too many requests.',
+                'retry_after': round(retry_after, 3)
+            })
+            return
 
         if action == 'start_quiz':
-            # Verify host permission (not is_staff)
-            if self.is_host:
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'broadcast_game_start',
-                        'duration': data.get('duration', 600)
-                    }
-                )
-            else:
-                await self.send(text_data=json.dumps({
-                    'type': 'error',
-                    'message': 'Only the host can start the quiz'
-                }))
+            # Same conditional start as the REST view; the room hears it via broadcast_game_start
+            await self.reply(action, 'quiz_started', game.start_quiz, self.quiz_id, self.user_id)
+
+        elif action == 'get_roster':
+            await self.send_frame({'type': 'roster_snapshot', **await roster_snapshot(self.quiz_id)})
+
+        elif action == 'get_question':
+            await self.reply(action, 'question', game.get_current_question, self.quiz_id, self.user_id)
+
+        elif action == 'submit_answer':
+            # One frame carries both the grading result and the next question
+            await self.reply(action, 'answer_result', game.submit_and_advance,
+                             self.quiz_id, self.user_id, data.get('answer'), data.get('question_index'))
+
+    async def send_frame(self, frame, event=None):
+        """Send a frame in the negotiated format; group events are encoded once per worker."""
+        data = protocol.encode(self.wire_format, frame, event.get('event_id') if event else None)
+        if self.wire_format == protocol.MSGPACK:
+            await self.send(bytes_data=data)
+        else:
+            await self.send(text_data=data)
+
+    async def reply(self, action, reply_type, func, *args):
+        """Run an async game operation and send its result or error frame."""
+        try:
+            payload = await func(*args)
+        except game.GameError as e:
+            await self.send_frame({
+                'type': 'error',
+                'action': action,
+                'status': e.status_code,
+                'message': e.detail
+            })
+            return
+        await self.send_frame({'type': reply_type, **payload})
 
     # Handler: Start Quiz (Server -> Client)
     async def broadcast_game_start(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             'type': 'quiz_start',
             'duration': event['duration']
-        }))
+        }, event)
+
+    # Handler: Question Timer (Server -> Client)
+    async def broadcast_question_tick(self, event):
+        await self.send_frame({
+            'type': 'question_tick',
+            'question_index': event['question_index'],
+            'question_ends_in': event['question_ends_in'],
+            'remaining': event['remaining']
+        }, event)
+
+    # Handler: Quiz Finished (Server -> Client)
+    async def broadcast_quiz_end(self, event):
+        await self.send_frame({
+            'type': 'quiz_end'
+        }, event)
 
     # Handler: Leaderboard Update (Server -> Client)
     async def broadcast_leaderboard(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             'type': 'leaderboard_update',
             'top_players': event['data']
-        }))
-
-    # Handler: Participant Joined (Server -> Client)
-    async def broadcast_participant_joined(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'participant_joined',
-            'user_id': event['user_id'],
-            'username': event['username']
-        }))
+        }, event)
+
+    # Handler: Roster changes, coalesced per window (Server -> Client)
+    async def broadcast_roster_delta(self, event):
+        await self.send_frame({
+            'type': 'roster_delta',
+            'added': event['added'],
+            'total': event['total']
+        }, event)
         
\ No newline at end of file
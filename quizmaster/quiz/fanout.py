@@ -0,0 +1,141 @@
+# quiz/fanout.py
+"""Per-worker room fan-out, an alternative to channel-layer groups.
+
+With ``channels_redis`` a ``group_send`` to ``quiz_<id>`` writes one message
+per member channel to Redis: a 10,000-player room costs 10,000 Redis writes
+per leaderboard tick. In ``"worker"`` mode (``ROOM_FANOUT["MODE"]``) each
+worker process instead keeps a registry of its own ``QuizConsumer`` instances
+per room and subscribes to one Redis pub/sub channel per room that has local
+sockets. A broadcast is a single ``PUBLISH``. Redis delivers it once per
+subscribed worker, and the worker hands it to each local consumer's handler.
+
+Without ``REDIS_URL`` events are delivered to this process's consumers only,
+like the in-memory channel layer.
+
+Handlers run one after the other in the worker's listener task, in publish
+order, so every socket sees a room's events in order. ``send`` only queues the
+frame for the ASGI server, and the frame is encoded once per worker (see
+``quiz/protocol.py``).
+"""
+import asyncio
+import json
+import logging
+import time
+
+from channels.consumer import get_handler_name
+from django.conf import settings
+
+from quizmaster import metrics
+from quizmaster.redis_client import REDIS_URL, get_async_redis
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, "ROOM_FANOUT", {})
+
+ENABLED = _config.get("MODE", "channel_layer") == "worker"
+CHANNEL_PREFIX = _config.get("CHANNEL_PREFIX", "fanout:")
+
+
+class RoomFanout:
+    """This worker's consumers per room, fed by one pub/sub subscription per room."""
+
+    def __init__(self, redis=None, use_redis=bool(REDIS_URL), prefix=CHANNEL_PREFIX):
+        self._redis = redis  # defaults to the shared client of the running loop
+        self.use_redis = use_redis
+        self.prefix = prefix
+        self.rooms = {}  # quiz_id -> set of consumers
+        self._loop = None
+        self._pubsub = None
+        self._listener = None
+        self._lock = None
+
+    def _client(self):
+        return self._redis or get_async_redis()
+
+    def _channel(self, quiz_id):
+        return f"{self.prefix}{quiz_id}"
+
+    async def join(self, quiz_id, consumer):
+        """Register a consumer; the first one in a room subscribes this worker to it."""
+        self._loop = asyncio.get_running_loop()
+        members = self.rooms.setdefault(quiz_id, set())
+        first = not members
+        members.add(consumer)
+        if not self.use_redis:
+            return
+        if first:
+            async with self._subscription_lock():
+                if self._pubsub is None:
+                    self._pubsub = self._client().pubsub()
+                await self._pubsub.subscribe(self._channel(quiz_id))
+        # (Re)started here: listen() returns once the worker has left every room
+        if self._listener is None or self._listener.done():
+            self._listener = self._loop.create_task(self._listen())
+
+    async def leave(self, quiz_id, consumer):
+        """Unregister a consumer; the last one out unsubscribes the worker from the room."""
+        members = self.rooms.get(quiz_id)
+        if members is None or consumer not in members:
+            return
+        members.discard(consumer)
+        if members:
+            return
+        del self.rooms[quiz_id]
+        if self.use_redis:
+            async with self._subscription_lock():
+                if quiz_id not in self.rooms:  # nobody rejoined while we waited
+                    await self._pubsub.unsubscribe(self._channel(quiz_id))
+
+    def _subscription_lock(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def publish(self, quiz_id, event):
+        """Send ``event`` to every consumer of the room, on every worker."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not None and self._loop is not loop:
+            # Worker threads (async_to_sync) run their own loop; publish from the server's, which
+            # owns the consumers and the Redis client, rather than open a client for a throwaway loop
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self.publish(quiz_id, event), self._loop))
+        elif self.use_redis:
+            await self._client().publish(self._channel(quiz_id), json.dumps(event))
+        elif self._loop is not None:  # otherwise nobody ever joined a room here
+            await self.deliver(quiz_id, event)
+
+    async def _listen(self):
+        prefix_length = len(self.prefix)
+        try:
+            async for message in self._pubsub.listen():
+                if message["type"] == "message":
+                    await self.deliver(message["channel"][prefix_length:], json.loads(message["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The next join restarts it; until then this worker's rooms miss events
+            logger.exception("Room fan-out listener stopped")
+
+    async def deliver(self, quiz_id, event):
+        """Run the event's handler on each local consumer of the room."""
+        members = self.rooms.get(quiz_id)
+        if not members:
+            return
+        started = time.perf_counter()
+        handler_name = get_handler_name(event)
+        for consumer in list(members):
+            try:
+                await getattr(consumer, handler_name)(event)
+            except Exception:
+                logger.exception("Room fan-out to %s failed for one socket", quiz_id)
+        metrics.room_fanout_duration.observe(time.perf_counter() - started, event.get("type", ""))
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        self._pubsub = self._listener = None
+        self.rooms.clear()
+
+
+fanout = RoomFanout()
@@ -0,0 +1,229 @@
+# quiz/game.py
+"""Question delivery and answer grading shared by the REST views and QuizConsumer.
+
+Everything here is async and queries Mongo on the event loop.
+"""
+from asgiref.sync import sync_to_async
+
+from quizmaster import mongo_async
+from .quiz_cache import aget_compiled_quiz
+from .utils import is_valid_object_id
+from .leaderboard import arecord_score as record_score
+from . import answer_buffer as write_behind
+from . import hot_state
+from . import session_version
+from .answer_buffer import answer_buffer
+from .session_events import session_events
+from .scheduler import quiz_duration_seconds, start_session
+
+
+class GameError(Exception):
+    """A request that cannot be served; carries the HTTP status the views return."""
+
+    def __init__(self, detail, status_code):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+async def _find_participant(quiz_id, user_id):
+    participant = await mongo_async.participants.get(quiz_id, user_id, {"answers": 0})
+    if participant:
+        return participant
+    # Only on failure: tell a missing session apart from a non-participant
+    if not await mongo_async.sessions.get_by_quiz(quiz_id, {"_id": 1}):
+        raise GameError("Quiz session not found.", 404)
+    raise GameError("User not a participant in this quiz.", 403)
+
+
+async def _get_quiz(quiz_id):
+    quiz = await aget_compiled_quiz(quiz_id)
+    if not quiz:
+        raise GameError("Quiz not found.", 404)
+    return quiz
+
+
+def next_question(quiz, index):
+    """Public payload for ``index`` or ``None`` once the participant is done."""
+    if index >= quiz.total_questions:
+        return None
+    return quiz.question(index)
+
+
+async def get_current_question(quiz_id, user_id):
+    """Return the participant's current question (without the correct answer)."""
+    hot = await hot_state.get_participant(quiz_id, user_id) if hot_state.ENABLED else None
+    state = answer_buffer.get_state(quiz_id, user_id) if write_behind.ENABLED else None
+    if hot is not None:
+        # Redis is ahead of Mongo until the next checkpoint
+        current_index = hot["index"]
+    elif state is not None:
+        # Buffered state is ahead of Mongo until the next flush
+        current_index = state.index
+    else:
+        participant = await _find_participant(quiz_id, user_id)
+        current_index = participant.get("currentQuestionIndex") or 0
+    quiz = await _get_quiz(quiz_id)
+
+    question = next_question(quiz, current_index)
+    if question is None:
+        raise GameError("No more questions left.", 400)
+    return question
+
+
+async def _load_participant(quiz_id, user_id):
+    # Fetch ONLY the participant document, without its answer history
+    participant = await mongo_async.participants.get(quiz_id, user_id, {"answers": 0})
+    if not participant:
+        raise GameError("Session not found or user not a participant.", 404)
+
+    quiz_session = await mongo_async.sessions.get_by_quiz(quiz_id, {"status": 1})
+    if not quiz_session or quiz_session.get("status") != "in_progress":
+        raise GameError("Quiz is not in progress.", 400)
+
+    return participant
+
+
+async def start_quiz(quiz_id, user_id):
+    """Start the session as its host; the duration always comes from the quiz."""
+    quiz_session = await mongo_async.sessions.get_by_quiz(quiz_id, {"host_id": 1})
+    if not quiz_session:
+        raise GameError("Quiz session not found.", 404)
+    if quiz_session["host_id"] != user_id:
+        raise GameError("Only the host can start the quiz.", 403)
+    quiz = await _get_quiz(quiz_id)
+    if not quiz_duration_seconds(quiz):
+        raise GameError("Quiz has no duration.", 400)
+    if not await start_session(quiz_id, quiz):
+        raise GameError("Quiz already started.", 400)
+    return {"duration": quiz_duration_seconds(quiz)}
+
+
+async def submit_answer(quiz_id, user_id, selected_answer, question_index=None):
+    """
+    Evaluates answer, pushes to history, increments score/index atomically.
+    Prevents race conditions using optimistic locking.
+
+    ``question_index`` is optional; when given, an answer for any other question
+    is rejected with 409 instead of being applied to the current one.
+    """
+    if selected_answer is None:
+        raise GameError("selected_answer is required.", 400)
+    if question_index is not None:
+        try:
+            question_index = int(question_index)
+        except (TypeError, ValueError):
+            raise GameError("question_index must be an integer.", 400)
+
+    # 1. Validate Quiz ID and Fetch Quiz (Questions)
+    if not is_valid_object_id(quiz_id):
+        raise GameError("Invalid Quiz ID.", 400)
+    quiz = await _get_quiz(quiz_id)
+
+    # 2. Current position of the participant (Redis hot state, or in-memory in write-behind mode)
+    hot = await hot_state.get_or_load_participant(quiz_id, user_id) if hot_state.ENABLED else None
+    if hot is not None:
+        current_index = hot["index"]
+    elif write_behind.ENABLED:
+        state = answer_buffer.get_state(quiz_id, user_id)
+        if state is None:
+            session_events.listen()  # so this worker drops the state when another one ends the session
+            state = answer_buffer.seed_state(quiz_id, user_id, await _load_participant(quiz_id, user_id))
+        current_index = state.index
+    else:
+        participant = await _load_participant(quiz_id, user_id)
+        current_index = participant.get("currentQuestionIndex", 0)
+
+    # 3. Check if quiz is finished
+    if current_index >= quiz.total_questions:
+        raise GameError("No more questions left.", 400)
+
+    if question_index is not None and question_index != current_index:
+        raise GameError("Answer already submitted for this question.", 409)
+
+    # 4. Evaluate Answer (O(1) lookup in the compiled answer key)
+    is_correct, correct_answer = quiz.grade(current_index, selected_answer)
+
+    answer_record = {
+        "question_index": current_index,
+        "selectedOption": selected_answer,
+        "isCorrect": is_correct,
+    }
+
+    if hot is not None:
+        # The script re-checks the index atomically; the checkpointer writes Mongo later.
+        outcome, value = await hot_state.accept(quiz_id, user_id, current_index, answer_record, is_correct)
+        if outcome == hot_state.CONFLICT:
+            raise GameError("Answer already submitted for this question.", 409)
+        if outcome != hot_state.ACCEPTED:
+            raise GameError("Quiz is not in progress.", 400)
+        await record_score(quiz_id, user_id, hot["username"], value)
+        return {
+            "is_correct": is_correct,
+            "correct_answer": correct_answer,
+            "next_question_index": current_index + 1,
+        }
+
+    if write_behind.ENABLED:
+        if answer_buffer.backlogged():
+            # Backpressure: the flusher has fallen behind, so this request pays for a flush.
+            await sync_to_async(answer_buffer.flush, thread_sensitive=False)()
+        # Acknowledge now; the flusher applies the same index-guarded update later.
+        try:
+            state = answer_buffer.accept(quiz_id, user_id, current_index, answer_record, is_correct)
+        except write_behind.SessionEnded:
+            raise GameError("Quiz is not in progress.", 400)
+        except write_behind.BufferFull:
+            # Still backlogged after the flush (Mongo is down): refuse rather than acknowledge
+            raise GameError("Answers cannot be saved right now, try again.", 503)
+        if state is None:
+            raise GameError("Answer already submitted for this question.", 409)
+        await record_score(quiz_id, user_id, state.username, state.score)
+        return {
+            "is_correct": is_correct,
+            "correct_answer": correct_answer,
+            "next_question_index": current_index + 1,
+        }
+
+    # 5. Atomic Update with Optimistic Locking
+    # We define what we want to change
+    update_ops = {
+        "$push": {"answers": answer_record}, # Append efficiently
+        "$inc": {"currentQuestionIndex": 1}  # Increment atomically
+    }
+
+    # If correct, we also increment the score atomically
+    if is_correct:
+        update_ops["$inc"]["score"] = 1
+
+    # EXECUTE UPDATE
+    # The filter matches the participant only while currentQuestionIndex == current_index
+    # This prevents race conditions. If the index changed while we were calculating,
+    # this update will fail (no document returned), preventing double submission.
+    # The updated participant is returned so the leaderboard gets an absolute score.
+    result = await mongo_async.participants.find_one_and_update(
+        {"quiz_id": quiz_id, "user_id": user_id, "currentQuestionIndex": current_index},
+        update_ops,
+        projection={"username": 1, "score": 1},
+        after=True
+    )
+
+    if result is None:
+        # This happens if the user double-clicked and the index already moved forward
+        raise GameError("Answer already submitted for this question.", 409)
+
+    session_version.mark_changed(quiz_id)
+    await record_score(quiz_id, user_id, result.get("username"), result.get("score", 0))
+
+    return {
+        "is_correct": is_correct,
+        "correct_answer": correct_answer, # Optional: return correct answer to user
+        "next_question_index": current_index + 1,
+    }
+
+
+async def submit_and_advance(quiz_id, user_id, selected_answer, question_index=None):
+    """Grade an answer and attach the next question, so one reply covers both."""
+    result = await submit_answer(quiz_id, user_id, selected_answer, question_index)
+    result["next_question"] = next_question(await _get_quiz(quiz_id), result["next_question_index"])
+    return result
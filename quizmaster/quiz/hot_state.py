@@ -0,0 +1,272 @@
+# quiz/hot_state.py
+"""Redis hot state for in-progress sessions.
+
+While a session is ``in_progress`` its status and host, and every
+participant's ``currentQuestionIndex`` and score, live in Redis hashes.
+``submit_answer`` and ``get_current_question`` read them instead of Mongo, and
+an atomic script applies the same "one answer per index" rule as the Mongo
+path. Accepted answers are queued in Redis and checkpointed to Mongo every
+``CHECKPOINT_INTERVAL`` seconds and when the session finishes, so Mongo sees
+one bulk write per interval rather than one write per answer.
+
+Checkpoint writes keep the ``currentQuestionIndex`` guard of the Mongo path:
+a participant's queued answers are applied only while Mongo's index equals the
+first of them, and the same update moves the index past the last. Replaying
+a batch is therefore a no-op, so after any failure (including ambiguous
+ones, such as a timeout after the server applied the write) the batch is
+simply queued again. Answers that Mongo is not ready for yet, because an
+earlier batch is still in flight on another worker, are queued again too.
+Every worker can therefore checkpoint concurrently. Opt-in (``HOT_STATE["ENABLED"]``, since Mongo then lags by up
+to a checkpoint interval) and only active when ``REDIS_URL`` is set; it
+supersedes ``ANSWER_WRITE_BEHIND`` and needs no sticky routing.
+
+Keys share a ``{quiz_id}`` hash tag, so one session's keys stay on one
+Redis Cluster slot.
+"""
+import asyncio
+import json
+import logging
+
+from django.conf import settings
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from quizmaster import mongo_async
+from quizmaster.redis_client import REDIS_URL, get_async_redis
+from . import session_version
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, "HOT_STATE", {})
+
+ENABLED = bool(_config.get("ENABLED", False) and REDIS_URL)
+CHECKPOINT_INTERVAL = _config.get("CHECKPOINT_INTERVAL", 1.0)
+CHECKPOINT_BATCH = _config.get("CHECKPOINT_BATCH", 1000)
+TTL = _config.get("TTL", 6 * 3600)
+
+ACTIVE_KEY = "hs:active"  # quiz ids with answers that may need checkpointing
+
+# accept() outcomes
+ACCEPTED = "accepted"
+CONFLICT = "conflict"
+NOT_IN_PROGRESS = "not_in_progress"
+UNKNOWN = "unknown"
+
+# KEYS: session hash, participant hash, answers list
+# ARGV: expected index, 1 if correct else 0, queued answer (JSON)
+_ACCEPT_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'status') ~= 'in_progress' then
+    return {-1, 0}
+end
+local index = redis.call('HGET', KEYS[2], 'index')
+if not index then
+    return {-2, 0}
+end
+if tonumber(index) ~= tonumber(ARGV[1]) then
+    return {-3, tonumber(index)}
+end
+redis.call('HINCRBY', KEYS[2], 'index', 1)
+local score = redis.call('HINCRBY', KEYS[2], 'score', tonumber(ARGV[2]))
+redis.call('RPUSH', KEYS[3], ARGV[3])
+return {1, score}
+"""
+
+_OUTCOMES = {1: ACCEPTED, -1: NOT_IN_PROGRESS, -2: UNKNOWN, -3: CONFLICT}
+
+
+def _session_key(quiz_id):
+    return f"hs:{{{quiz_id}}}"
+
+
+def _participant_key(quiz_id, user_id):
+    return f"hs:{{{quiz_id}}}:p:{user_id}"
+
+
+def _users_key(quiz_id):
+    return f"hs:{{{quiz_id}}}:users"
+
+
+def _answers_key(quiz_id):
+    return f"hs:{{{quiz_id}}}:answers"
+
+
+async def load_session(quiz_id):
+    """Copy an in-progress session from Mongo into Redis; ``False`` if it is not in progress.
+
+    Fields are only set where missing, so a concurrent or repeated load never
+    rolls back progress already recorded in Redis.
+    """
+    session = await mongo_async.sessions.get_by_quiz(quiz_id, {"host_id": 1, "status": 1})
+    if not session or session.get("status") != "in_progress":
+        return False
+    participants = await mongo_async.participants.list_for_quiz(
+        quiz_id, {"user_id": 1, "username": 1, "score": 1, "currentQuestionIndex": 1}
+    )
+
+    redis = get_async_redis()
+    pipe = redis.pipeline(transaction=False)
+    session_key, users_key = _session_key(quiz_id), _users_key(quiz_id)
+    pipe.hsetnx(session_key, "status", "in_progress")
+    pipe.hsetnx(session_key, "host_id", session.get("host_id") or "")
+    for p in participants:
+        key = _participant_key(quiz_id, p["user_id"])
+        pipe.hsetnx(key, "index", p.get("currentQuestionIndex") or 0)
+        pipe.hsetnx(key, "score", p.get("score") or 0)
+        pipe.hsetnx(key, "username", p.get("username") or "")
+        pipe.expire(key, TTL)
+        pipe.sadd(users_key, p["user_id"])
+    for key in (session_key, users_key):
+        pipe.expire(key, TTL)
+    pipe.sadd(ACTIVE_KEY, quiz_id)
+    await pipe.execute()
+    return True
+
+
+async def get_session(quiz_id):
+    """``{"status", "host_id"}`` for a session held in Redis, else ``None``."""
+    session = await get_async_redis().hgetall(_session_key(quiz_id))
+    return session or None
+
+
+async def get_participant(quiz_id, user_id):
+    """``{"index", "score", "username"}`` for a participant held in Redis, else ``None``."""
+    state = await get_async_redis().hgetall(_participant_key(quiz_id, user_id))
+    if not state:
+        return None
+    return {"index": int(state["index"]), "score": int(state["score"]), "username": state.get("username")}
+
+
+async def get_or_load_participant(quiz_id, user_id):
+    """Like ``get_participant``, loading the session first if Redis does not have it."""
+    participant = await get_participant(quiz_id, user_id)
+    if participant is None and await get_session(quiz_id) is None and await load_session(quiz_id):
+        participant = await get_participant(quiz_id, user_id)
+    return participant
+
+
+async def accept(quiz_id, user_id, expected_index, answer_record, is_correct):
+    """Advance the participant if still on ``expected_index`` and queue the answer.
+
+    Returns ``(outcome, value)``: the new score when accepted, the current index on conflict.
+    """
+    queued = json.dumps({"user_id": user_id, "is_correct": is_correct, "answer": answer_record})
+    code, value = await get_async_redis().eval(
+        _ACCEPT_SCRIPT, 3,
+        _session_key(quiz_id), _participant_key(quiz_id, user_id), _answers_key(quiz_id),
+        expected_index, 1 if is_correct else 0, queued,
+    )
+    checkpointer.ensure_started()
+    return _OUTCOMES[int(code)], int(value)
+
+
+def _question_index(item):
+    return item["answer"]["question_index"]
+
+
+def _operations(quiz_id, queued):
+    """One guarded update per participant, and the participants' answers in index order."""
+    by_user = {}
+    for item in queued:
+        by_user.setdefault(item["user_id"], []).append(item)
+    operations = []
+    for user_id, items in by_user.items():
+        items.sort(key=_question_index)
+        operations.append(UpdateOne(
+            {"quiz_id": quiz_id, "user_id": user_id, "currentQuestionIndex": _question_index(items[0])},
+            {
+                "$push": {"answers": {"$each": [item["answer"] for item in items]}},
+                "$inc": {"score": sum(1 for item in items if item["is_correct"])},
+                "$set": {"currentQuestionIndex": _question_index(items[-1]) + 1},
+            },
+        ))
+    return operations, list(by_user.values())
+
+
+async def _unapplied(quiz_id, groups):
+    """The queued answers Mongo has not recorded, judged by each participant's index."""
+    indexes = {
+        p["user_id"]: p.get("currentQuestionIndex", 0)
+        for p in await mongo_async.participants.list_for_users(
+            quiz_id, [group[0]["user_id"] for group in groups], {"user_id": 1, "currentQuestionIndex": 1}
+        )
+    }
+    pending = []
+    for group in groups:
+        index = indexes.get(group[0]["user_id"])
+        if index is None:
+            logger.error("Hot state for %s has answers for unknown participant %s", quiz_id, group[0]["user_id"])
+            continue
+        pending.extend(item for item in group if _question_index(item) >= index)
+    return pending
+
+
+async def checkpoint(quiz_id):
+    """Write every queued answer of the session to Mongo, in batches."""
+    redis = get_async_redis()
+    key = _answers_key(quiz_id)
+    while True:
+        raw = await redis.lpop(key, CHECKPOINT_BATCH)
+        if not raw:
+            return
+        operations, groups = _operations(quiz_id, [json.loads(item) for item in raw])
+        try:
+            result = await mongo_async.participants.bulk_write(operations)
+            pending = await _unapplied(quiz_id, groups) if result.matched_count < len(operations) else []
+        except PyMongoError:
+            # Applied updates no longer match their guard, so replaying the whole batch is safe
+            await _requeue(key, [item for group in groups for item in group])
+            logger.exception("Hot state checkpoint for %s failed, retrying", quiz_id)
+            return
+        finally:
+            session_version.mark_changed(quiz_id)
+        if pending:
+            # Earlier answers are still on their way (another worker's batch): retry next pass
+            await _requeue(key, pending)
+            return
+
+
+async def _requeue(key, items):
+    if items:
+        await get_async_redis().lpush(key, *[json.dumps(item) for item in reversed(items)])
+
+
+async def finish(quiz_id):
+    """Mark the session finished, checkpoint everything and drop its keys."""
+    redis = get_async_redis()
+    session_key = _session_key(quiz_id)
+    await redis.hset(session_key, "status", "finished")  # later answers are refused
+    await checkpoint(quiz_id)
+    users = await redis.smembers(_users_key(quiz_id))
+    if await redis.llen(_answers_key(quiz_id)):
+        # Mongo refused part of the final checkpoint: keep the state for the periodic retry
+        logger.error("Hot state for %s kept after finish: checkpoint incomplete", quiz_id)
+        return
+    await redis.delete(session_key, _users_key(quiz_id), *[_participant_key(quiz_id, u) for u in users])
+    await redis.srem(ACTIVE_KEY, quiz_id)
+
+
+class Checkpointer:
+    """Per-worker task that checkpoints every active session on an interval."""
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self._task = None
+
+    def ensure_started(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                redis = get_async_redis()
+                for quiz_id in await redis.smembers(ACTIVE_KEY):
+                    await checkpoint(quiz_id)
+                    if not await redis.exists(_session_key(quiz_id), _answers_key(quiz_id)):
+                        await redis.srem(ACTIVE_KEY, quiz_id)  # expired, nothing left to write
+            except Exception:
+                logger.exception("Hot state checkpoint pass failed")
+
+
+checkpointer = Checkpointer(CHECKPOINT_INTERVAL)
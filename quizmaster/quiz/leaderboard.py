@@ -0,0 +1,407 @@
+# quiz/leaderboard.py
+"""Per-session leaderboards updated incrementally as answers are graded.
+
+Scores live in a Redis sorted set when ``REDIS_URL`` is configured, otherwise in
+an in-process order-statistics structure (single worker only). Both answer
+top-K and "my rank" without reading the session document. Rank uses
+competition ranking: players on the same score share a rank.
+
+The answer path (``arecord_score``) and the pushes run on the event loop with
+the ``redis.asyncio`` client. When a session ends, every worker drops its board
+(``adrop_leaderboard``, see ``quiz/session_events.py``). The Redis keys also
+expire ``KEY_TTL`` after the last write, in case a session never ends.
+"""
+import asyncio
+import bisect
+import threading
+import time
+
+from django.conf import settings
+
+from quizmaster import mongo_async
+from quizmaster.mongo_client import participants_collection
+from quizmaster.redis_client import get_async_redis, get_redis
+from .broadcast import abroadcast_to_room
+from .session_events import session_events
+
+_config = getattr(settings, "LEADERBOARD", {})
+BROADCAST_INTERVAL = _config.get("BROADCAST_INTERVAL", 0.25)  # seconds
+TOP_K = _config.get("TOP_K", 10)
+KEY_TTL = _config.get("KEY_TTL", 86400)  # seconds
+
+
+class _FenwickTree:
+    """Counts of players per score, with O(log n) "how many scored <= s"."""
+
+    def __init__(self, size=64):
+        self._tree = [0] * (size + 1)
+
+    def _grow(self, score):
+        size = len(self._tree) - 1
+        while size <= score:
+            size *= 2
+        counts = [self.count_between(s, s) for s in range(len(self._tree) - 1)]
+        self._tree = [0] * (size + 1)
+        for s, count in enumerate(counts):
+            if count:
+                self.add(s, count)
+
+    def add(self, score, delta):
+        if score >= len(self._tree) - 1:
+            self._grow(score)
+        i = score + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def count_upto(self, score):
+        i = min(score + 1, len(self._tree) - 1)
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def count_between(self, low, high):
+        return self.count_upto(high) - (self.count_upto(low - 1) if low > 0 else 0)
+
+
+class _LocalBoard:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.scores = {}       # user_id -> score
+        self.names = {}        # user_id -> username
+        self.buckets = {}      # score -> {user_id: None}, insertion ordered
+        self.distinct = []     # sorted distinct scores
+        self.counts = _FenwickTree()
+
+    def _remove(self, user_id, score):
+        bucket = self.buckets[score]
+        del bucket[user_id]
+        if not bucket:
+            del self.buckets[score]
+            del self.distinct[bisect.bisect_left(self.distinct, score)]
+        self.counts.add(score, -1)
+
+    def _insert(self, user_id, score):
+        bucket = self.buckets.get(score)
+        if bucket is None:
+            bucket = self.buckets[score] = {}
+            bisect.insort(self.distinct, score)
+        bucket[user_id] = None
+        self.counts.add(score, 1)
+
+    def set_score(self, user_id, username, score):
+        score = max(int(score), 0)
+        old = self.scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            self._remove(user_id, old)
+        self._insert(user_id, score)
+        self.scores[user_id] = score
+        if username is not None:
+            self.names[user_id] = username
+
+    def rank(self, user_id):
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        higher = len(self.scores) - self.counts.count_upto(score)
+        return {"rank": higher + 1, "score": score, "total": len(self.scores)}
+
+    def top(self, k):
+        result = []
+        rank = 1
+        for score in reversed(self.distinct):
+            for user_id in self.buckets[score]:
+                if len(result) >= k:
+                    return result
+                result.append({
+                    "user_id": user_id,
+                    "username": self.names.get(user_id),
+                    "score": score,
+                    "rank": rank,
+                })
+            rank += len(self.buckets[score])
+        return result
+
+
+class LocalLeaderboard:
+    def __init__(self):
+        self._boards = {}
+        self._lock = threading.Lock()
+
+    def _board(self, quiz_id):
+        board = self._boards.get(quiz_id)
+        if board is None:
+            with self._lock:
+                board = self._boards.setdefault(quiz_id, _LocalBoard())
+        return board
+
+    def seed(self, quiz_id, entries):
+        board = self._board(quiz_id)
+        with board.lock:
+            for user_id, username, score in entries:
+                if user_id not in board.scores:
+                    board.set_score(user_id, username, score)
+
+    def set_score(self, quiz_id, user_id, username, score):
+        board = self._board(quiz_id)
+        with board.lock:
+            board.set_score(user_id, username, score)
+
+    def rank(self, quiz_id, user_id):
+        board = self._board(quiz_id)
+        with board.lock:
+            return board.rank(user_id)
+
+    def top(self, quiz_id, k):
+        board = self._board(quiz_id)
+        with board.lock:
+            return board.top(k)
+
+    def drop(self, quiz_id):
+        with self._lock:
+            self._boards.pop(quiz_id, None)
+
+    # In memory, so the async API is the sync one
+    async def aseed(self, quiz_id, entries):
+        self.seed(quiz_id, entries)
+
+    async def aset_score(self, quiz_id, user_id, username, score):
+        self.set_score(quiz_id, user_id, username, score)
+
+    async def atop(self, quiz_id, k):
+        return self.top(quiz_id, k)
+
+    async def adrop(self, quiz_id):
+        self.drop(quiz_id)
+
+
+class RedisLeaderboard:
+    """Sync methods use ``redis``; the ``a*`` ones the running loop's ``redis.asyncio`` client."""
+
+    def __init__(self, redis, async_redis=get_async_redis, ttl=KEY_TTL):
+        self.redis = redis
+        self.async_redis = async_redis
+        self.ttl = ttl
+
+    @staticmethod
+    def _keys(quiz_id):
+        return f"lb:{quiz_id}", f"lb:{quiz_id}:names"
+
+    def _queue_seed(self, pipe, quiz_id, entries):
+        scores_key, names_key = self._keys(quiz_id)
+        pipe.zadd(scores_key, {user_id: score for user_id, _, score in entries}, nx=True)
+        pipe.hset(names_key, mapping={user_id: username or "" for user_id, username, _ in entries})
+        pipe.expire(scores_key, self.ttl)
+        pipe.expire(names_key, self.ttl)
+
+    def _queue_set_score(self, pipe, quiz_id, user_id, username, score):
+        scores_key, names_key = self._keys(quiz_id)
+        pipe.zadd(scores_key, {user_id: score})
+        pipe.expire(scores_key, self.ttl)
+        if username is not None:
+            pipe.hset(names_key, user_id, username)
+            pipe.expire(names_key, self.ttl)
+
+    def seed(self, quiz_id, entries):
+        entries = list(entries)
+        if not entries:
+            return
+        pipe = self.redis.pipeline()
+        self._queue_seed(pipe, quiz_id, entries)
+        pipe.execute()
+
+    async def aseed(self, quiz_id, entries):
+        entries = list(entries)
+        if not entries:
+            return
+        pipe = self.async_redis().pipeline()
+        self._queue_seed(pipe, quiz_id, entries)
+        await pipe.execute()
+
+    def set_score(self, quiz_id, user_id, username, score):
+        pipe = self.redis.pipeline()
+        self._queue_set_score(pipe, quiz_id, user_id, username, score)
+        pipe.execute()
+
+    async def aset_score(self, quiz_id, user_id, username, score):
+        pipe = self.async_redis().pipeline()
+        self._queue_set_score(pipe, quiz_id, user_id, username, score)
+        await pipe.execute()
+
+    def rank(self, quiz_id, user_id):
+        scores_key, _ = self._keys(quiz_id)
+        score = self.redis.zscore(scores_key, user_id)
+        if score is None:
+            return None
+        pipe = self.redis.pipeline()
+        pipe.zcount(scores_key, f"({score}", "+inf")
+        pipe.zcard(scores_key)
+        higher, total = pipe.execute()
+        return {"rank": higher + 1, "score": int(score), "total": total}
+
+    def top(self, quiz_id, k):
+        scores_key, names_key = self._keys(quiz_id)
+        rows = self.redis.zrevrange(scores_key, 0, k - 1, withscores=True)
+        if not rows:
+            return []
+        return self._ranked(rows, self.redis.hmget(names_key, [user_id for user_id, _ in rows]))
+
+    async def atop(self, quiz_id, k):
+        scores_key, names_key = self._keys(quiz_id)
+        redis = self.async_redis()
+        rows = await redis.zrevrange(scores_key, 0, k - 1, withscores=True)
+        if not rows:
+            return []
+        return self._ranked(rows, await redis.hmget(names_key, [user_id for user_id, _ in rows]))
+
+    @staticmethod
+    def _ranked(rows, names):
+        result = []
+        rank, previous = 0, None
+        for position, ((user_id, score), username) in enumerate(zip(rows, names), start=1):
+            if score != previous:
+                rank, previous = position, score
+            result.append({"user_id": user_id, "username": username, "score": int(score), "rank": rank})
+        return result
+
+    def drop(self, quiz_id):
+        self.redis.delete(*self._keys(quiz_id))
+
+    async def adrop(self, quiz_id):
+        await self.async_redis().delete(*self._keys(quiz_id))
+
+
+_redis = get_redis()
+_backend = RedisLeaderboard(_redis) if _redis is not None else LocalLeaderboard()
+# quiz_id -> monotonic time until which this process trusts the board to be seeded.
+# Seeding sets the Redis keys' TTL, so they outlive the mark.
+_seeded = {}
+_seed_lock = threading.Lock()
+_PARTICIPANT_FIELDS = {"_id": 0, "user_id": 1, "username": 1, "score": 1}
+
+
+def _is_seeded(quiz_id):
+    return _seeded.get(quiz_id, 0) > time.monotonic()
+
+
+def _mark_seeded(quiz_id):
+    now = time.monotonic()
+    for stale in [q for q, until in _seeded.items() if until <= now]:
+        _seeded.pop(stale, None)
+    _seeded[quiz_id] = now + KEY_TTL
+
+
+def _entries(participants):
+    return [(p["user_id"], p.get("username"), p.get("score", 0)) for p in participants]
+
+
+def _ensure_seeded(quiz_id):
+    """Load existing scores for a session the first time this process sees it."""
+    if _is_seeded(quiz_id):
+        return
+    with _seed_lock:
+        if _is_seeded(quiz_id):
+            return
+        _backend.seed(quiz_id, _entries(participants_collection.find({"quiz_id": quiz_id}, _PARTICIPANT_FIELDS)))
+        _mark_seeded(quiz_id)
+
+
+async def _aensure_seeded(quiz_id):
+    """``_ensure_seeded`` on the event loop (seeding twice is harmless, it never lowers a score)."""
+    if _is_seeded(quiz_id):
+        return
+    session_events.listen()  # so the board is dropped here when the session ends
+    await _backend.aseed(quiz_id, _entries(await mongo_async.participants.list_for_quiz(quiz_id, _PARTICIPANT_FIELDS)))
+    _mark_seeded(quiz_id)
+
+
+def record_score(quiz_id, user_id, username, score):
+    """Set a participant's absolute score (idempotent, O(log n)); does not push."""
+    _ensure_seeded(quiz_id)
+    _backend.set_score(quiz_id, user_id, username, score)
+
+
+async def arecord_score(quiz_id, user_id, username, score):
+    """``record_score`` on the event loop, then schedule a push."""
+    await _aensure_seeded(quiz_id)
+    await _backend.aset_score(quiz_id, user_id, username, score)
+    broadcaster.schedule(quiz_id)
+
+
+def top_players(quiz_id, k=TOP_K):
+    _ensure_seeded(quiz_id)
+    return _backend.top(quiz_id, k)
+
+
+async def atop_players(quiz_id, k=TOP_K):
+    await _aensure_seeded(quiz_id)
+    return await _backend.atop(quiz_id, k)
+
+
+def player_rank(quiz_id, user_id):
+    """Return ``{"rank", "score", "total"}`` for ``user_id`` or ``None``."""
+    _ensure_seeded(quiz_id)
+    return _backend.rank(quiz_id, user_id)
+
+
+def drop_leaderboard(quiz_id):
+    _seeded.pop(quiz_id, None)
+    _backend.drop(quiz_id)
+    broadcaster.forget(quiz_id)
+
+
+@session_events.on_end
+async def adrop_leaderboard(quiz_id):
+    """Forget this worker's board for a session that has ended (and its Redis keys)."""
+    _seeded.pop(quiz_id, None)
+    await _backend.adrop(quiz_id)
+    broadcaster.forget(quiz_id)
+
+
+class LeaderboardBroadcaster:
+    """Coalesces leaderboard pushes to at most one per ``interval`` per room.
+
+    Pushes are tasks on the server's event loop, like ``RosterAggregator``'s
+    flushes, so a busy room costs no extra threads, loops or Redis clients.
+    """
+
+    def __init__(self, interval=BROADCAST_INTERVAL, top_k=TOP_K):
+        self.interval = interval
+        self.top_k = top_k
+        self._tasks = {}      # quiz_id -> pending push task
+        self._last_sent = {}  # quiz_id -> monotonic time of the last push
+
+    def schedule(self, quiz_id):
+        """Push the room's top players within ``interval``; call on the event loop."""
+        if quiz_id not in self._tasks:
+            delay = max(self._last_sent.get(quiz_id, 0) + self.interval - time.monotonic(), 0)
+            self._tasks[quiz_id] = asyncio.get_running_loop().create_task(self._flush_later(quiz_id, delay))
+
+    async def _flush_later(self, quiz_id, delay):
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self._tasks.pop(quiz_id, None)
+        await self.flush(quiz_id)
+
+    async def flush(self, quiz_id):
+        self._last_sent[quiz_id] = time.monotonic()
+        top = await atop_players(quiz_id, self.top_k)
+        await abroadcast_to_room(quiz_id, {
+            "type": "broadcast_leaderboard",
+            "data": top,
+        })
+
+    def forget(self, quiz_id):
+        self._last_sent.pop(quiz_id, None)
+        task = self._tasks.get(quiz_id)
+        if task is not None:
+            # Let the final push go out, then forget its timestamp too
+            task.add_done_callback(lambda _: self._last_sent.pop(quiz_id, None))
+
+
+broadcaster = LeaderboardBroadcaster()
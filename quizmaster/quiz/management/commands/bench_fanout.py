@@ -0,0 +1,140 @@
+import asyncio
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.fanout import RoomFanout
+from quizmaster.redis_client import REDIS_URL
+
+
+class _Socket:
+    """Stands in for a ``QuizConsumer``: counts the room events handed to it."""
+
+    def __init__(self):
+        self.received = 0
+
+    async def broadcast_leaderboard(self, event):
+        self.received += 1
+
+
+async def _redis_calls(client):
+    stats = await client.info("commandstats")
+    return sum(stat["calls"] for stat in stats.values())
+
+
+async def _measure(client, work):
+    """Redis commands executed server-wide (Lua ``redis.call``s included) while ``work`` runs."""
+    before = await _redis_calls(client)
+    started = time.perf_counter()
+    await work()
+    elapsed = time.perf_counter() - started
+    return await _redis_calls(client) - before - 1, elapsed  # minus the first INFO itself
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare Redis operations per room broadcast for channel-layer groups (one write per socket) "
+        "and the per-worker pub/sub fan-out (one message per worker), and check that every simulated "
+        "socket on every simulated worker receives each broadcast exactly once. Counts come from "
+        "INFO commandstats, so run it against an otherwise idle Redis. Times are per group_send for "
+        "the channel layer and per publish-and-deliver for the fan-out."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sockets", type=int, default=10000, help="Sockets in the room, across all workers.")
+        parser.add_argument("--workers", type=int, default=4, help="Simulated worker processes (pub/sub mode).")
+        parser.add_argument("--broadcasts", type=int, default=10)
+        parser.add_argument("--redis-url", default=REDIS_URL or "redis://127.0.0.1:6379/0")
+        parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for every delivery.")
+
+    def handle(self, *args, **options):
+        if options["broadcasts"] > 100:
+            raise CommandError("--broadcasts must be at most 100 (the channel layer's per-channel capacity).")
+        results = asyncio.run(self._run(options))
+        self.stdout.write(
+            f"{options['sockets']} sockets, {options['workers']} workers, {options['broadcasts']} broadcasts"
+        )
+        broadcasts = options["broadcasts"]
+        for mode, (ops, elapsed) in results.items():
+            self.stdout.write(
+                f"{mode:<16} {ops / broadcasts:>10.1f} Redis ops/broadcast "
+                f"{elapsed / broadcasts * 1000:>10.2f} ms/broadcast"
+            )
+
+    async def _run(self, options):
+        import redis.asyncio
+
+        admin = redis.asyncio.Redis.from_url(options["redis_url"], decode_responses=True)
+        run_id = uuid.uuid4().hex[:8]
+        try:
+            return {
+                "channel_layer": await self._channel_layer(admin, run_id, options),
+                "worker": await self._worker(admin, run_id, options),
+            }
+        finally:
+            await admin.aclose()
+
+    async def _channel_layer(self, admin, run_id, options):
+        from channels_redis.core import RedisChannelLayer
+
+        layer = RedisChannelLayer(hosts=[options["redis_url"]], prefix=f"bench-fanout-{run_id}")
+        group = f"quiz_{run_id}"
+        channels = [await layer.new_channel() for _ in range(options["sockets"])]
+        for channel in channels:
+            await layer.group_add(group, channel)
+
+        async def broadcast():
+            for i in range(options["broadcasts"]):
+                await layer.group_send(group, {"type": "broadcast_leaderboard", "data": [], "seq": i})
+
+        try:
+            measured = await _measure(admin, broadcast)
+            # Spot-check delivery: draining every channel would dwarf the broadcast itself
+            for channel in channels[:: max(1, len(channels) // 100)]:
+                for _ in range(options["broadcasts"]):
+                    await asyncio.wait_for(layer.receive(channel), options["timeout"])
+            return measured
+        finally:
+            await layer.flush()
+            await layer.close_pools()
+
+    async def _worker(self, admin, run_id, options):
+        import redis.asyncio
+
+        prefix = f"bench-fanout-{run_id}:"
+        quiz_id = run_id
+        clients = [
+            redis.asyncio.Redis.from_url(options["redis_url"], decode_responses=True)
+            for _ in range(options["workers"])
+        ]
+        workers = [RoomFanout(redis=client, use_redis=True, prefix=prefix) for client in clients]
+        sockets = [_Socket() for _ in range(options["sockets"])]
+        try:
+            for i, socket in enumerate(sockets):
+                await workers[i % len(workers)].join(quiz_id, socket)
+            # SUBSCRIBE is only written by join(); wait until Redis has every worker on the channel
+            expected = min(len(workers), len(sockets))
+            while (await admin.pubsub_numsub(f"{prefix}{quiz_id}"))[0][1] < expected:
+                await asyncio.sleep(0.01)
+
+            async def broadcast():
+                for i in range(options["broadcasts"]):
+                    await workers[0].publish(quiz_id, {"type": "broadcast_leaderboard", "data": [], "seq": i})
+                deadline = time.monotonic() + options["timeout"]
+                while any(socket.received < options["broadcasts"] for socket in sockets):
+                    if time.monotonic() > deadline:
+                        break
+                    await asyncio.sleep(0.001)
+
+            measured = await _measure(admin, broadcast)
+            counts = {socket.received for socket in sockets}
+            if counts != {options["broadcasts"]}:
+                raise CommandError(f"Per-worker fan-out delivered {sorted(counts)} events per socket, "
+                                   f"expected {options['broadcasts']}.")
+            return measured
+        finally:
+            for worker in workers:
+                await worker.close()
+            for client in clients:
+                await client.aclose()
@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+from bson import ObjectId
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+import accounts.authentication as authentication
+import quizmaster.token_auth as token_auth
+from accounts.views import create_tokens_for_user
+from quizmaster.mongo_client import users_collection
+from quizmaster.token_auth import JwtAuthMiddleware
+
+
+async def _accept(scope, receive, send):
+    if not scope["user"] or not scope["user"].is_authenticated:
+        raise RuntimeError("benchmark token was rejected")
+
+
+@database_sync_to_async
+def _legacy_get_user(user_id):
+    user = users_collection.find_one({"_id": ObjectId(user_id)})
+    if user:
+        user["_id"] = str(user["_id"])
+
+        class User:
+            is_authenticated = True
+            id = user["_id"]
+            username = user.get("username")
+            email = user.get("email")
+            is_staff = user.get("is_staff", False)
+        return User()
+    return None
+
+
+class LegacyJwtAuthMiddleware(BaseMiddleware):
+    """The middleware as it was before the principal cache: header dict, hand-split cookie,
+    a thread hop to the sync client and a new ``User`` class per connection."""
+
+    async def __call__(self, scope, receive, send):
+        cookies = dict(scope["headers"]).get(b"cookie", b"").decode()
+        access_token = None
+        for cookie in cookies.split("; "):
+            if cookie.startswith("access_token="):
+                access_token = cookie.split("=")[1]
+                break
+        try:
+            scope["user"] = await _legacy_get_user(AccessToken(access_token)["user_id"])
+        except (InvalidToken, TokenError, KeyError):
+            scope["user"] = AnonymousUser()
+        return await super().__call__(scope, receive, send)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure WebSocket handshakes per second through JwtAuthMiddleware for a reconnect storm: "
+        "the previous middleware (sync lookup on a thread, a User class per call), one async Mongo "
+        "lookup per connection (no cache), cached lookups and claims-only auth."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=5000)
+        parser.add_argument("--concurrency", type=int, default=500)
+        parser.add_argument("--email", help="User to authenticate as (defaults to any existing user).")
+
+    def handle(self, *args, **options):
+        query = {"email": options["email"]} if options["email"] else {}
+        user = users_collection.find_one(query)
+        if not user:
+            raise CommandError("No user found to benchmark with; sign one up first.")
+        access_token, _ = create_tokens_for_user(user)
+        scope = {
+            "type": "websocket",
+            "headers": [(b"host", b"localhost"), (b"cookie", f"theme=dark; access_token={access_token}".encode())],
+        }
+
+        runs = (
+            ("legacy (thread hop, class per call)", LegacyJwtAuthMiddleware, "lookup", False),
+            ("lookup (uncached)", JwtAuthMiddleware, "lookup", False),
+            ("lookup", JwtAuthMiddleware, "lookup", True),
+            ("claims", JwtAuthMiddleware, "claims", True),
+        )
+        for label, middleware_class, mode, cached in runs:
+            rate = asyncio.run(self._run(
+                scope, middleware_class, mode, cached, options["connections"], options["concurrency"],
+            ))
+            self.stdout.write(f"{label:<40} {rate:>10.0f} connections/s")
+
+    async def _run(self, scope, middleware_class, mode, cached, connections, concurrency):
+        cache = authentication.principal_cache
+        ttl, previous_mode = cache.ttl, token_auth.PRINCIPAL_MODE
+        middleware = middleware_class(_accept)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def connect():
+            async with semaphore:
+                await middleware(dict(scope), None, None)
+
+        try:
+            token_auth.PRINCIPAL_MODE = mode
+            cache.clear()
+            if not cached:
+                cache.ttl = 0  # every entry is already expired: one Mongo lookup per connection
+            started = time.perf_counter()
+            await asyncio.gather(*(connect() for _ in range(connections)))
+            return connections / (time.perf_counter() - started)
+        finally:
+            cache.ttl = ttl
+            token_auth.PRINCIPAL_MODE = previous_mode
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quizmaster.indexes import collscan_queries, ensure_indexes, index_report
+
+
+class Command(BaseCommand):
+    help = "Create the declared MongoDB indexes and verify hot queries do not COLLSCAN."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Only verify; exit non-zero if an index is missing or a hot query would COLLSCAN.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["check"]:
+            names = ensure_indexes()
+            self.stdout.write(f"Ensured {len(names)} index(es).")
+
+        problems = []
+        for collection, info in index_report().items():
+            for name in info["missing"]:
+                problems.append(f"missing index {collection}.{name}")
+            for name in info["undeclared"]:
+                self.stdout.write(self.style.WARNING(f"undeclared index {collection}.{name}"))
+            for name in info["unused"]:
+                self.stdout.write(self.style.WARNING(f"unused index {collection}.{name}"))
+        for collection, query in collscan_queries():
+            problems.append(f"COLLSCAN for {collection}.find({query})")
+
+        if problems:
+            raise CommandError("\n".join(problems))
+        self.stdout.write(self.style.SUCCESS("All hot queries are index-backed."))
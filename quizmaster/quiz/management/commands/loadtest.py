@@ -0,0 +1,350 @@
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from http.cookies import SimpleCookie
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz import protocol
+from quizmaster.mongo_client import participants_collection, quizzes_collection, sessions_collection, users_collection
+
+QUESTION_OPTIONS = ["A", "B", "C", "D"]
+
+
+def _percentile(ordered, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(int(round(p / 100 * len(ordered))) - 1, 0))]
+
+
+class Recorder:
+    """Latency samples and error counts per operation, plus WebSocket frames seen per type."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = Counter()
+        self.frames = Counter()
+        self._spans = {}  # name -> [first start, last end], for throughput
+
+    def record(self, name, started, ok=True):
+        now = time.perf_counter()
+        if ok:
+            self.samples[name].append(now - started)
+        else:
+            self.errors[name] += 1
+        first, last = self._spans.get(name, (started, now))
+        self._spans[name] = (min(first, started), max(last, now))
+
+    def results(self):
+        results = {}
+        for name in sorted(set(self.samples) | set(self.errors)):
+            ordered = sorted(self.samples[name])
+            first, last = self._spans.get(name, (0.0, 0.0))
+            results[name] = {
+                "count": len(ordered),
+                "errors": self.errors[name],
+                "throughput": len(ordered) / (last - first) if last > first else 0.0,
+                "p50_ms": _percentile(ordered, 50) * 1000,
+                "p95_ms": _percentile(ordered, 95) * 1000,
+                "p99_ms": _percentile(ordered, 99) * 1000,
+                "max_ms": (ordered[-1] if ordered else 0.0) * 1000,
+            }
+        return results
+
+
+class Client:
+    """One simulated user talking to the in-process ASGI application."""
+
+    def __init__(self, application, recorder, email, timeout, wire_format=protocol.JSON):
+        self.application = application
+        self.recorder = recorder
+        self.email = email
+        self.timeout = timeout
+        self.wire_format = wire_format
+        self.cookies = {}
+        self.ws = None
+
+    def _cookie_header(self):
+        return "; ".join(f"{name}={value}" for name, value in self.cookies.items()).encode()
+
+    async def http(self, name, method, path, body=None):
+        from channels.testing import HttpCommunicator
+
+        headers = [(b"host", b"localhost"), (b"content-type", b"application/json"), (b"cookie", self._cookie_header())]
+        payload = json.dumps(body).encode() if body is not None else b""
+        started = time.perf_counter()
+        response = await HttpCommunicator(self.application, method, path, payload, headers).get_response(self.timeout)
+        ok = response["status"] < 400
+        self.recorder.record(name, started, ok)
+        for header, value in response["headers"]:
+            if header.lower() == b"set-cookie":
+                for morsel in SimpleCookie(value.decode()).values():
+                    self.cookies[morsel.key] = morsel.value
+        data = json.loads(response["body"]) if response["body"] else {}
+        if not ok:
+            raise CommandError(f"{method} {path} -> {response['status']}: {data}")
+        return data
+
+    async def signup(self, username):
+        await self.http("POST signup", "POST", "/api/v1/user/signup/", {
+            "username": username, "email": self.email, "password": "loadtest-password",
+        })
+        await self.http("POST login", "POST", "/api/v1/user/login/", {
+            "email": self.email, "password": "loadtest-password",
+        })
+
+    async def connect(self, quiz_id):
+        from channels.testing import WebsocketCommunicator
+
+        self.ws = WebsocketCommunicator(
+            self.application, f"/ws/quiz/{quiz_id}/",
+            headers=[(b"host", b"localhost"), (b"cookie", self._cookie_header())],
+            subprotocols=[self.wire_format] if self.wire_format != protocol.JSON else None,
+        )
+        started = time.perf_counter()
+        connected, _ = await self.ws.connect(self.timeout)
+        self.recorder.record("WS connect", started, connected)
+        if not connected:
+            self.ws = None
+
+    async def expect(self, frame_type):
+        """Read frames until one of ``frame_type`` (or an error) arrives; count everything seen."""
+        while True:
+            # receive_from() kills the application on timeout, so only ever time out on a stuck run
+            data = await self.ws.receive_from(self.timeout)
+            frame = protocol.decode(bytes_data=data) if isinstance(data, bytes) else protocol.decode(data)
+            self.recorder.frames[frame["type"]] += 1
+            if frame["type"] in (frame_type, "error"):
+                return frame
+
+    async def ws_request(self, name, reply_type, message):
+        started = time.perf_counter()
+        data = protocol.encode(self.wire_format, message)
+        if self.wire_format == protocol.MSGPACK:
+            await self.ws.send_to(bytes_data=data)
+        else:
+            await self.ws.send_to(text_data=data)
+        frame = await self.expect(reply_type)
+        ok = frame["type"] == reply_type
+        self.recorder.record(f"WS {name}", started, ok)
+        return frame if ok else None
+
+    async def play_ws(self):
+        question = await self.ws_request("get_question", "question", {"action": "get_question"})
+        while question:
+            result = await self.ws_request("submit_answer", "answer_result", {
+                "action": "submit_answer",
+                "question_index": question["question_index"],
+                "answer": random.choice(question["options"]),
+            })
+            question = result and result.get("next_question")
+
+    async def play_http(self, quiz_id):
+        base = f"/api/v1/quizzes/{quiz_id}"
+        try:
+            question = await self.http("GET question", "GET", f"{base}/question/")
+            for _ in range(question["total_questions"] - question["question_index"]):
+                await self.http("POST submit", "POST", f"{base}/submit/", {
+                    "question_index": question["question_index"],
+                    "answer": random.choice(question["options"]),
+                })
+                question["question_index"] += 1
+        except CommandError:
+            pass  # already counted as an error for that endpoint
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate a live quiz against the in-process ASGI application: N players sign up, log in, "
+        "join, open a WebSocket and answer every question. Reports throughput and p50/p95/p99 "
+        "latency per endpoint and per WebSocket message type. Needs MONGO_URI pointing at a "
+        "disposable database; everything the run creates is removed afterwards unless --keep."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--players", type=int, default=100)
+        parser.add_argument("--concurrency", type=int, default=200, help="Operations in flight at once.")
+        parser.add_argument("--questions", type=int, default=10)
+        parser.add_argument("--answer-via", choices=["ws", "http"], default="ws")
+        parser.add_argument(
+            "--ws-protocol", choices=["json", "msgpack"], default="json",
+            help="WebSocket wire format the players negotiate.",
+        )
+        parser.add_argument(
+            "--channel-layer", choices=["memory", "configured"], default="memory",
+            help="InMemoryChannelLayer (single process) or the layer from settings (e.g. Redis).",
+        )
+        parser.add_argument(
+            "--rate-limits", choices=["off", "on"], default="off",
+            help="Apply RATE_LIMITS. Off by default: every player answers as fast as it can and all "
+                 "of them join within a second, which the per-user and per-room buckets would refuse.",
+        )
+        parser.add_argument("--timeout", type=float, default=60.0, help="Per-operation timeout, seconds.")
+        parser.add_argument("--output", help="Write the results as JSON to this file.")
+        parser.add_argument(
+            "--baseline",
+            help="Results JSON from an earlier run; fail on higher p95 latency or error counts, or lower throughput.",
+        )
+        parser.add_argument(
+            "--tolerance", type=float, default=0.25,
+            help="Allowed relative p95 increase and throughput drop vs --baseline.",
+        )
+        parser.add_argument("--seed", type=int, help="Seed for the answers players pick.")
+        parser.add_argument("--keep", action="store_true", help="Leave the generated users and quiz in Mongo.")
+
+    def handle(self, *args, **options):
+        if options["seed"] is not None:
+            random.seed(options["seed"])
+        if options["channel_layer"] == "memory":
+            from channels.layers import channel_layers
+
+            settings.CHANNEL_LAYERS = {
+                "default": {"BACKEND": "quizmaster.channel_layers.InstrumentedInMemoryChannelLayer", "CONFIG": {"capacity": 1000}},
+            }
+            channel_layers.backends.clear()
+        if options["rate_limits"] == "off":
+            from quiz import ratelimit
+
+            ratelimit.ENABLED = False
+
+        run_id = uuid.uuid4().hex[:8]
+        recorder = Recorder()
+        quiz_id = None
+        try:
+            quiz_id, wall = asyncio.run(self._run(run_id, recorder, options))
+        finally:
+            if not options["keep"]:
+                self._cleanup(run_id, quiz_id)
+
+        results = recorder.results()
+        self._report(results, recorder.frames, wall, options)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump({
+                    "players": options["players"], "rate_limits": options["rate_limits"],
+                    "wall_seconds": wall, "results": results,
+                }, f, indent=2)
+        if options["baseline"]:
+            self._compare(results, options["baseline"], options["tolerance"])
+
+    async def _run(self, run_id, recorder, options):
+        from quizmaster.asgi import application
+
+        players, timeout = options["players"], options["timeout"]
+        wire_format = protocol.MSGPACK if options["ws_protocol"] == "msgpack" else protocol.JSON
+        semaphore = asyncio.Semaphore(options["concurrency"])
+
+        async def each(clients, step):
+            async def bounded(client):
+                async with semaphore:
+                    try:
+                        await step(client)
+                    except (CommandError, asyncio.TimeoutError) as e:
+                        recorder.errors["player aborted"] += 1
+                        self.stderr.write(f"{client.email}: {e!r}")
+            await asyncio.gather(*(bounded(client) for client in clients))
+
+        started = time.perf_counter()
+        host = Client(application, recorder, f"loadtest-{run_id}-host@example.com", timeout)
+        await host.signup(f"loadtest-{run_id}-host")
+        created = await host.http("POST create", "POST", "/api/v1/quizzes/create/", {
+            "title": f"Load test {run_id}",
+            "topic": "load test",
+            "difficulty": "easy",
+            "max_participants": players,
+            "pointsPerCorrect": 1,
+            "duration": 60,  # minutes; long enough that the server clock never ends the run
+            "start_time": (datetime.utcnow() + timedelta(days=1)).isoformat(),  # the host starts it
+            "questions": [
+                {"question": f"Question {i + 1}", "options": QUESTION_OPTIONS, "correct_answer": random.choice(QUESTION_OPTIONS)}
+                for i in range(options["questions"])
+            ],
+        })
+        quiz_id = created["quiz_id"]
+
+        clients = [Client(application, recorder, f"loadtest-{run_id}-{i}@example.com", timeout, wire_format) for i in range(players)]
+
+        async def join(client):
+            await client.signup(client.email.split("@")[0])
+            await client.http("POST join", "POST", f"/api/v1/quizzes/{quiz_id}/join/")
+
+        await each(clients, join)
+        await each(clients, lambda client: client.connect(quiz_id))
+        connected = [client for client in clients if client.ws]
+
+        # Fan-out latency: from the host's start request to each player's quiz_start frame
+        start_sent = time.perf_counter()
+        await host.http("POST start", "POST", f"/api/v1/quizzes/{quiz_id}/start/")
+
+        async def await_start(client):
+            frame = await client.expect("quiz_start")
+            recorder.record("WS quiz_start (fan-out)", start_sent, frame["type"] == "quiz_start")
+
+        await asyncio.gather(*(await_start(client) for client in connected), return_exceptions=True)
+
+        if options["answer_via"] == "ws":
+            await each(connected, Client.play_ws)
+        else:
+            await each(connected, lambda client: client.play_http(quiz_id))
+        await host.http("GET leaderboard", "GET", f"/api/v1/quizzes/{quiz_id}/leaderboard/")
+
+        for client in connected:
+            await client.ws.disconnect()
+        return quiz_id, time.perf_counter() - started
+
+    def _cleanup(self, run_id, quiz_id):
+        from bson import ObjectId
+        from quiz.admission import drop
+        from quiz.leaderboard import drop_leaderboard
+        from quiz.quiz_cache import invalidate_quiz
+
+        users_collection.delete_many({"email": {"$regex": f"^loadtest-{run_id}-"}})
+        if quiz_id:
+            quizzes_collection.delete_one({"_id": ObjectId(quiz_id)})
+            invalidate_quiz(quiz_id)
+            sessions_collection.delete_one({"quiz_id": quiz_id})
+            participants_collection.delete_many({"quiz_id": quiz_id})
+            drop_leaderboard(quiz_id)
+            asyncio.run(drop(quiz_id))
+
+    def _report(self, results, frames, wall, options):
+        self.stdout.write(f"{options['players']} players, {options['questions']} questions, answers via "
+                          f"{options['answer_via']} ({options['ws_protocol']} frames), rate limits {options['rate_limits']}, "
+                          f"{wall:.1f}s wall time")
+        self.stdout.write(f"{'operation':<28} {'count':>7} {'errors':>6} {'ops/s':>9} "
+                          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for name, r in results.items():
+            self.stdout.write(
+                f"{name:<28} {r['count']:>7} {r['errors']:>6} {r['throughput']:>9.1f} "
+                f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['max_ms']:>8.1f}"
+            )
+        self.stdout.write("WebSocket frames received: " + ", ".join(f"{t}={n}" for t, n in sorted(frames.items())))
+
+    def _compare(self, results, path, tolerance):
+        with open(path) as f:
+            baseline = json.load(f)["results"]
+        regressions = []
+        # Operations missing from one side count as zero, so a new "player aborted" row fails too
+        for name in sorted(set(baseline) | set(results)):
+            base, current = baseline.get(name), results.get(name)
+            if current is None:
+                continue
+            if current["errors"] > (base["errors"] if base else 0):
+                regressions.append(f"{name}: {current['errors']} errors vs {base['errors'] if base else 0}")
+            if base is None:
+                continue
+            if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{name}: p95 {current['p95_ms']:.1f}ms vs {base['p95_ms']:.1f}ms")
+            if current["throughput"] < base["throughput"] * (1 - tolerance):
+                regressions.append(f"{name}: {current['throughput']:.1f} ops/s vs {base['throughput']:.1f} ops/s")
+        if regressions:
+            raise CommandError("Regressed vs baseline:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS(
+            f"No new errors and no p95 or throughput regression beyond {tolerance:.0%} of {path}."
+        ))
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from pymongo import ASCENDING, UpdateOne
+
+from quizmaster.mongo_client import sessions_collection, participants_collection
+
+
+class Command(BaseCommand):
+    help = (
+        "Move participants embedded in session documents into the "
+        "session_participants collection. Safe to re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report what would be moved without writing.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        batch_size = options["batch_size"]
+
+        if not dry_run:
+            participants_collection.create_index(
+                [("session_id", ASCENDING), ("user_id", ASCENDING)], unique=True
+            )
+
+        sessions = sessions_collection.find(
+            {"$or": [{"participants": {"$exists": True}}, {"participant_count": {"$exists": False}}]},
+            {"quiz_id": 1, "participants": 1},
+        )
+        migrated_sessions = migrated_participants = 0
+        for session in sessions:
+            session_id = str(session["_id"])
+            participants = session.get("participants") or []
+            migrated_sessions += 1
+            migrated_participants += len(participants)
+            if dry_run:
+                self.stdout.write(f"{session['quiz_id']}: {len(participants)} participant(s)")
+                continue
+
+            operations = [
+                UpdateOne(
+                    {"session_id": session_id, "user_id": p["user_id"]},
+                    {"$setOnInsert": {
+                        "quiz_id": session["quiz_id"],
+                        "username": p.get("username"),
+                        "score": p.get("score", 0),
+                        "currentQuestionIndex": p.get("currentQuestionIndex", 0),
+                        "answers": p.get("answers", []),
+                        "joinedAt": p.get("joinedAt"),
+                    }},
+                    upsert=True,
+                )
+                for p in participants
+            ]
+            for start in range(0, len(operations), batch_size):
+                participants_collection.bulk_write(operations[start:start + batch_size], ordered=False)
+
+            # Only drop the embedded array once every participant has been copied
+            count = participants_collection.count_documents({"session_id": session_id})
+            sessions_collection.update_one(
+                {"_id": session["_id"]},
+                {"$set": {"participant_count": count}, "$unset": {"participants": ""}},
+            )
+
+        verb = "Would migrate" if dry_run else "Migrated"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {migrated_participants} participant(s) from {migrated_sessions} session(s)."
+        ))
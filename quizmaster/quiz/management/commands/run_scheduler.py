@@ -0,0 +1,16 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from quiz.scheduler import scheduler
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the quiz clock (auto-start, question ticks, quiz end) in a dedicated process. "
+        "Several may run; a Redis lock, or a Mongo lease without REDIS_URL, keeps a single leader."
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Quiz scheduler {scheduler.worker_id} running.")
+        asyncio.run(scheduler.run())
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from quizmaster import slow_queries
+from quizmaster.mongo_client import db
+
+
+class Command(BaseCommand):
+    help = "Show slow Mongo commands captured by the slow-query recorder (SLOW_QUERIES in settings)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--flagged", action="store_true", help="Only COLLSCANs and high docsExamined ratios.")
+        parser.add_argument("--clear", action="store_true", help="Drop all stored captures.")
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            db.drop_collection(slow_queries.COLLECTION)
+            self.stdout.write("Slow-query log cleared.")
+            return
+        if not slow_queries.ENABLED:
+            self.stdout.write(self.style.WARNING("SLOW_QUERIES is disabled; showing earlier captures only."))
+
+        captures = slow_queries.recent(options["limit"], flagged_only=options["flagged"])
+        if not captures:
+            self.stdout.write("No slow queries recorded.")
+        for capture in captures:
+            self.stdout.write(
+                f"{capture['at']:%Y-%m-%d %H:%M:%S} {capture['duration_ms']:>9.1f}ms "
+                f"{capture['collection']}.{capture['command']} {capture['filter'] or ''} "
+                f"(caller: {capture['caller'] or '-'})"
+            )
+            explain = capture.get("explain")
+            if explain:
+                line = (f"    plan {' > '.join(explain['stages']) or '?'}, docsExamined {explain['docs_examined']}, "
+                        f"keysExamined {explain['keys_examined']}, nReturned {explain['returned']}")
+                if explain["flags"]:
+                    self.stdout.write(self.style.ERROR(f"{line}  [{', '.join(explain['flags'])}]"))
+                else:
+                    self.stdout.write(line)
@@ -0,0 +1,73 @@
+# quiz/protocol.py
+"""Wire formats for ``QuizConsumer``.
+
+JSON text frames are the default. A client that offers the
+``quiz.msgpack.v1`` subprotocol gets the same frames as binary MessagePack
+and may send its actions that way too.
+
+Group events carry an ``event_id`` (set by ``abroadcast_to_room``), and the
+encoded frame of a group event is cached per worker under that id and the
+format: a room broadcast is encoded once per worker and format, not once per
+socket.
+"""
+import json
+import uuid
+
+import msgpack
+from django.conf import settings
+
+from quizmaster import metrics
+from quizmaster.ttl_cache import TTLCache
+
+_config = getattr(settings, "WS_PROTOCOL", {})
+
+JSON = "json"
+MSGPACK = "quiz.msgpack.v1"
+
+# Preferred first; JSON is what clients that offer nothing get
+SUBPROTOCOLS = (MSGPACK,) if _config.get("MSGPACK", True) else ()
+
+_frames = metrics.caches.register("ws_frames", TTLCache(
+    max_size=_config.get("FRAME_CACHE_SIZE", 1024), ttl=_config.get("FRAME_CACHE_TTL", 10.0),
+))
+
+
+class MalformedFrame(ValueError):
+    pass
+
+
+def negotiate(offered):
+    """The subprotocol to accept for the client's offer, ``None`` for plain JSON."""
+    for subprotocol in SUBPROTOCOLS:
+        if subprotocol in offered:
+            return subprotocol
+    return None
+
+
+def new_event_id():
+    return uuid.uuid4().hex
+
+
+def _encode(fmt, frame):
+    if fmt == MSGPACK:
+        return msgpack.packb(frame, use_bin_type=True, default=str)
+    return json.dumps(frame)
+
+
+def encode(fmt, frame, event_id=None):
+    """``frame`` as ``bytes`` (MessagePack) or ``str`` (JSON), reused per group event."""
+    if event_id is None:
+        return _encode(fmt, frame)
+    return _frames.get_or_load((event_id, fmt), lambda: _encode(fmt, frame))
+
+
+def decode(text_data=None, bytes_data=None):
+    """An incoming frame as a dict; binary frames are MessagePack, text frames JSON."""
+    try:
+        data = msgpack.unpackb(bytes_data, raw=False) if bytes_data is not None else json.loads(text_data)
+    except (ValueError, TypeError) as e:  # msgpack's unpack errors are ValueErrors
+        raise MalformedFrame(str(e)) from None
+    if not isinstance(data, dict):
+        raise MalformedFrame("expected an object")
+    return data
+
@@ -0,0 +1,84 @@
+# quiz/quiz_cache.py
+"""In-process cache of compiled quizzes used by the question/submit hot path.
+
+A quiz does not change once it has started, so instead of re-reading the whole
+document on every question fetch and answer we compile it once into a public
+question deck (no ``correct_answer``) and a separate answer key indexed by
+question position.
+"""
+from django.conf import settings
+
+from quizmaster import metrics, mongo_async
+from quizmaster.ttl_cache import TTLCache
+from .utils import is_valid_object_id
+
+
+class CompiledQuiz:
+    __slots__ = (
+        "quiz_id",
+        "created_by",
+        "deck",
+        "answer_key",
+        "total_questions",
+        "max_participants",
+        "points_per_correct",
+        "duration",
+        "start_time",
+    )
+
+    def __init__(self, quiz_doc):
+        questions = quiz_doc.get("questions", [])
+        self.quiz_id = str(quiz_doc["_id"])
+        self.created_by = quiz_doc.get("created_by")
+        self.total_questions = len(questions)
+        self.deck = tuple(
+            {
+                "question_index": index,
+                "question": q.get("question"),
+                "options": q.get("options", []),
+                "total_questions": self.total_questions,
+            }
+            for index, q in enumerate(questions)
+        )
+        self.answer_key = tuple(q.get("correct_answer") for q in questions)
+        self.max_participants = quiz_doc.get("max_participants", 0)
+        self.points_per_correct = quiz_doc.get("pointsPerCorrect", 1)
+        self.duration = quiz_doc.get("duration")
+        self.start_time = quiz_doc.get("start_time")
+
+    def question(self, index):
+        """Public payload for the question at ``index`` (a copy, safe to mutate)."""
+        return dict(self.deck[index])
+
+    def grade(self, index, answer):
+        correct_answer = self.answer_key[index]
+        return answer == correct_answer, correct_answer
+
+
+_config = getattr(settings, "QUIZ_CACHE", {})
+quiz_cache = metrics.caches.register("quiz", TTLCache(
+    max_size=_config.get("MAX_SIZE", 512),
+    ttl=_config.get("TTL", 300),
+))
+
+
+async def aget_compiled_quiz(quiz_id):
+    """Return the ``CompiledQuiz`` for ``quiz_id`` or ``None`` if it does not exist.
+
+    A miss loads the quiz on the event loop.
+    """
+    if not is_valid_object_id(quiz_id):
+        return None
+    quiz_id = str(quiz_id)
+    quiz = quiz_cache.get(quiz_id)
+    if quiz is None:
+        quiz_doc = await mongo_async.quizzes.get(quiz_id)
+        if quiz_doc:
+            quiz = CompiledQuiz(quiz_doc)
+            quiz_cache.set(quiz_id, quiz)
+    return quiz
+
+
+def invalidate_quiz(quiz_id):
+    """Drop a cached quiz. Call after any edit or delete of the quiz document."""
+    return quiz_cache.invalidate(str(quiz_id))
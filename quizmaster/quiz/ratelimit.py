@@ -0,0 +1,172 @@
+# quiz/ratelimit.py
+"""Token-bucket rate limits for the quiz API and WebSocket actions.
+
+Each rule (``join``, ``submit``, ...) has a per-user bucket and optionally a
+per-room (per quiz) bucket, configured in ``RATE_LIMITS`` as
+``(tokens per second, burst)``. A request takes one token from every bucket
+of its rule, all or nothing, and is refused before any database access when
+one of them is empty. Buckets live in Redis when ``REDIS_URL`` is set (shared
+by all workers), in-process otherwise.
+
+The REST views use the throttle classes below (429 with ``Retry-After``), the
+async ones through ``aallow_request``; ``QuizConsumer`` calls ``acheck`` and
+answers with an error frame.
+"""
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from quizmaster import metrics
+from quizmaster.redis_client import REDIS_URL, get_async_redis, get_redis
+
+_config = getattr(settings, "RATE_LIMITS", {})
+
+ENABLED = _config.get("ENABLED", True)
+RULES = _config.get("RULES", {})
+
+# KEYS: bucket keys; ARGV: rate and burst for each key, in order.
+# Returns {0, "0"} when a token was taken from every bucket, else
+# {n, retry_after} for the first empty bucket (nothing is taken then).
+_TAKE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local levels = {}
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local level = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    level = math.min(burst, level + (now - ts) * rate)
+    if level < 1 then
+        return {i, tostring((1 - level) / rate)}
+    end
+    levels[i] = level
+end
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - 1), 'ts', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil(burst / rate * 1000) + 1000)
+end
+return {0, '0'}
+"""
+
+
+class LocalBuckets:
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets = {}  # key -> [tokens, last refill]
+
+    def take(self, keys, limits):
+        with self._lock:
+            now = self._clock()
+            levels = []
+            for i, (key, (rate, burst)) in enumerate(zip(keys, limits)):
+                tokens, ts = self._buckets.get(key, (burst, now))
+                level = min(burst, tokens + (now - ts) * rate)
+                if level < 1:
+                    return i + 1, (1 - level) / rate
+                levels.append(level)
+            for key, level in zip(keys, levels):
+                self._buckets[key] = [level - 1, now]
+            return 0, 0.0
+
+    async def atake(self, keys, limits):
+        return self.take(keys, limits)
+
+
+class RedisBuckets:
+    @staticmethod
+    def _args(keys, limits):
+        return [len(keys), *keys, *[value for limit in limits for value in limit]]
+
+    def take(self, keys, limits):
+        index, retry_after = get_redis().eval(_TAKE_SCRIPT, *self._args(keys, limits))
+        return int(index), float(retry_after)
+
+    async def atake(self, keys, limits):
+        index, retry_after = await get_async_redis().eval(_TAKE_SCRIPT, *self._args(keys, limits))
+        return int(index), float(retry_after)
+
+
+_backend = RedisBuckets() if REDIS_URL else LocalBuckets()
+
+
+def _buckets(rule, user_id, room):
+    limits = RULES.get(rule, {})
+    buckets = []
+    if "user" in limits and user_id:
+        buckets.append(("user", f"rl:{rule}:u:{user_id}", limits["user"]))
+    if "room" in limits and room:
+        buckets.append(("room", f"rl:{rule}:r:{room}", limits["room"]))
+    return buckets
+
+
+def _result(rule, buckets, index, retry_after, transport):
+    if index == 0:
+        return True, 0.0
+    metrics.rate_limited.inc(rule, buckets[index - 1][0], transport)
+    return False, retry_after
+
+
+def check(rule, user_id, room=None, transport="http"):
+    """Take a token for ``rule``; returns ``(allowed, seconds until a retry can succeed)``."""
+    buckets = _buckets(rule, user_id, room) if ENABLED else []
+    if not buckets:
+        return True, 0.0
+    index, retry_after = _backend.take([b[1] for b in buckets], [b[2] for b in buckets])
+    return _result(rule, buckets, index, retry_after, transport)
+
+
+async def acheck(rule, user_id, room=None, transport="ws"):
+    """Async ``check`` for consumers."""
+    buckets = _buckets(rule, user_id, room) if ENABLED else []
+    if not buckets:
+        return True, 0.0
+    index, retry_after = await _backend.atake([b[1] for b in buckets], [b[2] for b in buckets])
+    return _result(rule, buckets, index, retry_after, transport)
+
+
+class BucketThrottle(BaseThrottle):
+    """DRF throttle for one rule; the room is the view's ``quiz_id`` when it has one."""
+    rule = None
+
+    def allow_request(self, request, view):
+        allowed, self.retry_after = check(self.rule, request.user.get("_id"), view.kwargs.get("quiz_id"))
+        return allowed
+
+    async def aallow_request(self, request, view):
+        """``allow_request`` for async views (``quizmaster/async_api.py``)."""
+        allowed, self.retry_after = await acheck(
+            self.rule, request.user.get("_id"), view.kwargs.get("quiz_id"), transport="http"
+        )
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class CreateThrottle(BucketThrottle):
+    rule = "create"
+
+
+class ReadThrottle(BucketThrottle):
+    rule = "read"
+
+
+class JoinThrottle(BucketThrottle):
+    rule = "join"
+
+
+class StartThrottle(BucketThrottle):
+    rule = "start"
+
+
+class QuestionThrottle(BucketThrottle):
+    rule = "question"
+
+
+class SubmitThrottle(BucketThrottle):
+    rule = "submit"
@@ -0,0 +1,60 @@
+# quiz/roster.py
+"""Coalesced roster updates for quiz rooms.
+
+Joins are buffered per room for ``WINDOW`` seconds and sent as one
+``roster_delta`` event, so a join storm costs one frame per socket per window
+instead of one frame per join. Participants never leave a session (closing a
+socket is not leaving), so a delta only ever adds.
+"""
+import asyncio
+
+from django.conf import settings
+
+from quizmaster import mongo_async
+from .broadcast import abroadcast_to_room
+
+WINDOW = getattr(settings, "ROSTER", {}).get("WINDOW", 0.25)  # seconds
+
+
+class RosterAggregator:
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self._added = {}  # quiz_id -> {user_id: username}
+        self._tasks = {}  # quiz_id -> pending flush task
+
+    def record_join(self, quiz_id, user_id, username):
+        self._added.setdefault(quiz_id, {})[user_id] = username
+        self._schedule(quiz_id)
+
+    def _schedule(self, quiz_id):
+        if quiz_id not in self._tasks:
+            self._tasks[quiz_id] = asyncio.get_running_loop().create_task(self._flush_later(quiz_id))
+
+    async def _flush_later(self, quiz_id):
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            self._tasks.pop(quiz_id, None)
+        await self.flush(quiz_id)
+
+    async def flush(self, quiz_id):
+        added = self._added.pop(quiz_id, {})
+        if not added:
+            return
+        session = await mongo_async.sessions.get_by_quiz(quiz_id, {"participant_count": 1})
+        await abroadcast_to_room(quiz_id, {
+            "type": "broadcast_roster_delta",
+            "added": [{"user_id": user_id, "username": username} for user_id, username in added.items()],
+            "total": (session or {}).get("participant_count", 0),
+        })
+
+
+roster = RosterAggregator()
+
+
+async def roster_snapshot(quiz_id):
+    """Full participant list for clients that (re)connect or fall out of sync."""
+    participants = await mongo_async.participants.list_for_quiz(
+        quiz_id, {"_id": 0, "user_id": 1, "username": 1}
+    )
+    return {"participants": participants, "total": len(participants)}
@@ -0,0 +1,308 @@
+# quiz/scheduler.py
+"""Server-side quiz clock.
+
+One asyncio task per worker drives a hashed timer wheel that
+
+* auto-starts ``waiting`` sessions at their quiz's ``start_time``,
+* emits ``question_tick`` events, one per question slot of the real duration,
+* ends sessions at ``startedAt + duration`` and emits ``quiz_end``.
+
+State transitions are conditional updates (``waiting -> in_progress`` and
+``in_progress -> finished``), so an event fires at most once even if two
+schedulers race. A Redis lock elects a single leader among workers so only one
+of them keeps a wheel at all; without Redis a lease document in Mongo's
+``leases`` collection does, timed by each worker's clock.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+
+from quizmaster import mongo_async
+from quizmaster.redis_client import get_async_redis
+from . import admission
+from . import hot_state
+from . import answer_buffer  # noqa: F401 (registers the session end handler that flushes it)
+from .broadcast import abroadcast_to_room
+from .quiz_cache import aget_compiled_quiz
+from .session_events import session_events
+from .session_version import BUMP
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, "QUIZ_SCHEDULER", {})
+
+LEADER_KEY = "quiz-scheduler:leader"
+
+# Renew the lock only if we still own it
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+def _epoch(dt):
+    """Seconds since the epoch for the naive-UTC datetimes PyMongo returns."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def quiz_duration_seconds(quiz):
+    """Quiz duration is stored in minutes; 0 for a quiz without one (it cannot start)."""
+    return max(int(quiz.duration or 0), 0) * 60
+
+
+class TimerWheel:
+    """Hashed timer wheel: O(1) schedule, and each tick only looks at one slot."""
+
+    def __init__(self, tick=1.0, slots=512):
+        self.tick = tick
+        self._slots = [[] for _ in range(slots)]
+        self._entries = {}  # key -> (due_tick, args); the latest schedule for a key wins
+        self._last_tick = None
+
+    def schedule(self, key, fire_at, *args):
+        due = int(fire_at // self.tick) + 1
+        if self._last_tick is not None and due <= self._last_tick:
+            due = self._last_tick + 1  # already overdue: fire on the next tick
+        self._entries[key] = (due, args)
+        self._slots[due % len(self._slots)].append((due, key))
+
+    def cancel(self, key):
+        self._entries.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def clear(self):
+        for slot in self._slots:
+            slot.clear()
+        self._entries.clear()
+
+    def advance(self, now):
+        """Return ``[(key, args)]`` due up to ``now``, catching up on skipped ticks."""
+        current = int(now // self.tick)
+        if self._last_tick is None:
+            self._last_tick = current - 1
+        fired = []
+        for t in range(self._last_tick + 1, current + 1):
+            slot = self._slots[t % len(self._slots)]
+            remaining = []
+            for due, key in slot:
+                entry = self._entries.get(key)
+                if entry is None or entry[0] != due:
+                    continue  # cancelled or rescheduled
+                if due <= t:
+                    fired.append((key, entry[1]))
+                    del self._entries[key]
+                else:
+                    remaining.append((due, key))  # a later lap of the wheel
+            slot[:] = remaining
+        self._last_tick = current
+        return fired
+
+
+class QuizScheduler:
+    def __init__(self, tick=1.0, poll_interval=15.0, lock_ttl=10.0, start_grace=300.0):
+        self.wheel = TimerWheel(tick)
+        self.poll_interval = poll_interval
+        self.lock_ttl = lock_ttl
+        self.start_grace = start_grace
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self._next_poll = 0.0
+        self._task = None
+
+    # -- lifecycle ----------------------------------------------------------------
+
+    def ensure_started(self):
+        """Start the scheduler on the running loop (once per worker)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self):
+        while True:
+            try:
+                if await self._hold_leadership():
+                    now = time.time()
+                    if now >= self._next_poll:
+                        self._next_poll = now + self.poll_interval
+                        await self._poll(now)
+                    for (kind, quiz_id), args in self.wheel.advance(now):
+                        await getattr(self, f"_fire_{kind}")(quiz_id, *args)
+            except Exception:
+                logger.exception("Quiz scheduler tick failed")
+            await asyncio.sleep(self.wheel.tick)
+
+    async def _hold_leadership(self):
+        was_leader = self.is_leader
+        redis = get_async_redis()
+        if redis is None:
+            self.is_leader = await mongo_async.leases.acquire(LEADER_KEY, self.worker_id, self.lock_ttl)
+        else:
+            ttl_ms = int(self.lock_ttl * 1000)
+            if self.is_leader and await redis.eval(_RENEW_SCRIPT, 1, LEADER_KEY, self.worker_id, ttl_ms):
+                return True
+            self.is_leader = bool(await redis.set(LEADER_KEY, self.worker_id, nx=True, px=ttl_ms))
+        if self.is_leader != was_leader:
+            # Fresh leadership rebuilds its timers from Mongo; lost leadership drops them
+            self.wheel.clear()
+            self._next_poll = 0.0
+        return self.is_leader
+
+    # -- discovering sessions -------------------------------------------------------
+
+    async def _poll(self, now):
+        horizon = datetime.utcfromtimestamp(now + self.poll_interval)
+        earliest = datetime.utcfromtimestamp(now - self.start_grace)
+        upcoming = await mongo_async.quizzes.collection.find(
+            {"start_time": {"$gte": earliest, "$lte": horizon}}, {"start_time": 1}
+        ).to_list(None)
+        if upcoming:
+            start_times = {str(q["_id"]): q["start_time"] for q in upcoming}
+            waiting = await mongo_async.sessions.collection.find(
+                {"quiz_id": {"$in": list(start_times)}, "status": "waiting"}, {"quiz_id": 1}
+            ).to_list(None)
+            for session in waiting:
+                quiz_id = session["quiz_id"]
+                if ("start", quiz_id) not in self.wheel:
+                    self.wheel.schedule(("start", quiz_id), _epoch(start_times[quiz_id]))
+
+        running = await mongo_async.sessions.collection.find(
+            {"status": "in_progress"}, {"quiz_id": 1, "startedAt": 1, "endsAt": 1}
+        ).to_list(None)
+        for session in running:
+            if ("end", session["quiz_id"]) not in self.wheel:
+                await self.track(session["quiz_id"], session.get("startedAt"), session.get("endsAt"))
+
+    async def track(self, quiz_id, started_at, ends_at=None):
+        """Schedule question ticks and the end of a running session."""
+        if not self.is_leader:
+            return  # the leader picks it up on its next poll
+        quiz = await aget_compiled_quiz(quiz_id)
+        if not quiz or not started_at:
+            return
+        start = _epoch(started_at)
+        end = _epoch(ends_at) if ends_at else start + quiz_duration_seconds(quiz)
+        self.wheel.schedule(("end", quiz_id), end)
+        if quiz.total_questions and end > start:
+            # Resume at the question slot we are in now (0 for a session that just started)
+            slot = (end - start) / quiz.total_questions
+            self._schedule_tick(quiz_id, quiz, max(int((time.time() - start) // slot), 0), start, end)
+
+    def _schedule_tick(self, quiz_id, quiz, index, start, end):
+        if index < quiz.total_questions:
+            slot = (end - start) / quiz.total_questions
+            self.wheel.schedule(("tick", quiz_id), start + index * slot, index, start, end)
+
+    # -- events ----------------------------------------------------------------------
+
+    async def _fire_start(self, quiz_id):
+        quiz = await aget_compiled_quiz(quiz_id)
+        if not quiz:
+            return
+        if not quiz_duration_seconds(quiz):
+            logger.warning("Not auto-starting quiz %s: it has no duration", quiz_id)
+            return
+        await start_session(quiz_id, quiz)  # no-op if the host or another scheduler started it
+
+    async def _fire_tick(self, quiz_id, index, start, end):
+        quiz = await aget_compiled_quiz(quiz_id)
+        if not quiz:
+            return
+        now = time.time()
+        slot = (end - start) / quiz.total_questions
+        await abroadcast_to_room(quiz_id, {
+            "type": "broadcast_question_tick",
+            "question_index": index,
+            "question_ends_in": max(round(start + (index + 1) * slot - now), 0),
+            "remaining": max(round(end - now), 0),
+        })
+        self._schedule_tick(quiz_id, quiz, index + 1, start, end)
+
+    async def _fire_end(self, quiz_id):
+        self.wheel.cancel(("tick", quiz_id))
+        result = await mongo_async.sessions.update_by_quiz(
+            quiz_id,
+            {"$set": {"status": "finished", "finishedAt": datetime.utcnow()}, "$inc": BUMP},
+            extra_filter={"status": "in_progress"},
+        )
+        if not result.modified_count:
+            return
+        await end_session(quiz_id)
+
+
+async def start_session(quiz_id, quiz):
+    """Move a ``waiting`` session to ``in_progress`` and tell the room.
+
+    Conditional, so a host start and the scheduler's auto-start cannot both
+    fire; returns ``False`` if the session was not waiting.
+    """
+    duration = quiz_duration_seconds(quiz)
+    started_at = datetime.utcnow()
+    ends_at = started_at + timedelta(seconds=duration)
+    result = await mongo_async.sessions.update_by_quiz(
+        quiz_id,
+        {"$set": {"status": "in_progress", "startedAt": started_at, "endsAt": ends_at}, "$inc": BUMP},
+        extra_filter={"status": "waiting"},
+    )
+    if not result.modified_count:
+        return False
+    await admission.set_status(quiz_id, "in_progress")
+    if hot_state.ENABLED:
+        await hot_state.load_session(quiz_id)
+    await abroadcast_to_room(quiz_id, {"type": "broadcast_game_start", "duration": duration})
+    await scheduler.track(quiz_id, started_at, ends_at)
+    return True
+
+
+async def end_session(quiz_id):
+    """Side effects of a session reaching ``finished``: flush buffers and tell the room."""
+    if hot_state.ENABLED:
+        await hot_state.finish(quiz_id)
+    await session_events.publish_end(quiz_id)  # every worker drops its per-session state
+    await admission.drop(quiz_id)  # a later join re-reads the finished status from Mongo
+    await abroadcast_to_room(quiz_id, {"type": "broadcast_quiz_end"})
+
+
+class SchedulerMiddleware:
+    """ASGI middleware that starts this worker's scheduler with the server.
+
+    On ASGI lifespan startup where the server sends it (uvicorn, hypercorn),
+    otherwise on the first connection of any kind, HTTP included. A worker that
+    gets no traffic under a server without lifespan (daphne) never starts, so
+    run ``manage.py run_scheduler`` next to such deployments.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    scheduler.ensure_started()
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        scheduler.ensure_started()
+        return await self.app(scope, receive, send)
+
+
+ENABLED = _config.get("ENABLED", True)
+
+scheduler = QuizScheduler(
+    tick=_config.get("TICK", 1.0),
+    poll_interval=_config.get("POLL_INTERVAL", 15.0),
+    lock_ttl=_config.get("LOCK_TTL", 10.0),
+    start_grace=_config.get("START_GRACE", 300.0),
+)
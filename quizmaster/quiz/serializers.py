@@ -22,7 +22,7 @@ class QuizCreateSerializer(serializers.Serializer):
     difficulty = serializers.CharField()
     max_participants = serializers.IntegerField()
     pointsPerCorrect = serializers.IntegerField()
-    duration = serializers.IntegerField()  # in minutes
+    duration = serializers.IntegerField(min_value=1)  # in minutes
     start_time = serializers.DateTimeField()
     questions = QuestionSerializer(many=True)
     created_by = serializers.CharField(read_only=True)
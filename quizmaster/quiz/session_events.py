@@ -0,0 +1,86 @@
+# quiz/session_events.py
+"""Per-worker notice that a session has ended.
+
+Workers keep per-session state of their own (the write-behind answer buffer,
+for one). The scheduler ends a session on a single worker, so ``publish_end``
+runs this worker's handlers and then publishes the quiz id on one Redis
+pub/sub channel. Every other worker that keeps such state subscribes to it
+(``listen``) and runs its handlers once per ended session, whether or not it
+serves any socket of that room.
+
+Without ``REDIS_URL`` there is a single worker and the handlers only run
+locally.
+"""
+import asyncio
+import json
+import logging
+import os
+import uuid
+
+from quizmaster.redis_client import REDIS_URL, get_async_redis
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "quiz-session-ended"
+
+
+class SessionEndEvents:
+    def __init__(self, redis=None, use_redis=bool(REDIS_URL), channel=CHANNEL):
+        self._redis = redis  # defaults to the shared client of the running loop
+        self.use_redis = use_redis
+        self.channel = channel
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.handlers = []
+        self._listener = None
+
+    def _client(self):
+        return self._redis or get_async_redis()
+
+    def on_end(self, handler):
+        """Register ``async handler(quiz_id)``; usable as a decorator."""
+        self.handlers.append(handler)
+        return handler
+
+    def listen(self):
+        """Subscribe this worker on the running loop (once; cheap to call again)."""
+        if self.use_redis and (self._listener is None or self._listener.done()):
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def publish_end(self, quiz_id):
+        """Run this worker's handlers for ``quiz_id``, then tell every other worker."""
+        await self.run_handlers(quiz_id)
+        if self.use_redis:
+            await self._client().publish(self.channel, json.dumps({"quiz_id": quiz_id, "worker": self.worker_id}))
+
+    async def run_handlers(self, quiz_id):
+        for handler in self.handlers:
+            try:
+                await handler(quiz_id)
+            except Exception:
+                logger.exception("Session end handler %s failed for %s", handler.__qualname__, quiz_id)
+
+    async def _listen(self):
+        pubsub = self._client().pubsub()
+        try:
+            await pubsub.subscribe(self.channel)
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                event = json.loads(message["data"])
+                if event["worker"] != self.worker_id:  # ours already ran in publish_end
+                    await self.run_handlers(event["quiz_id"])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The next listen() restarts it; until then ended sessions keep their state here
+            logger.exception("Session end listener stopped")
+        finally:
+            await pubsub.aclose()
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+
+session_events = SessionEndEvents()
@@ -0,0 +1,59 @@
+# quiz/session_version.py
+"""Session ``version``: a counter on each session document that changes with it.
+
+``get_sessions`` derives its ETag from it, so an unchanged poll costs one
+indexed lookup. Joins, start and finish bump the version in the same update
+that changes the session. Score changes land in ``session_participants``,
+possibly in batches, so they only mark the session here and the bump is
+written once per ``SCORE_BUMP_INTERVAL`` per worker, after the scores are in
+Mongo.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from pymongo.errors import PyMongoError
+
+from quizmaster.mongo_client import sessions_collection
+
+logger = logging.getLogger(__name__)
+
+BUMP = {"version": 1}  # merge into an update's $inc
+
+SCORE_BUMP_INTERVAL = getattr(settings, "SESSION_VERSION", {}).get("SCORE_BUMP_INTERVAL", 0.5)  # seconds
+
+
+class VersionBumper:
+    """Coalesces version bumps for score changes into one update_many per interval."""
+
+    def __init__(self, interval=SCORE_BUMP_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._changed = set()
+        self._timer = None
+
+    def mark_changed(self, quiz_id):
+        """Note that the session's participants changed in Mongo. Cheap; call from any thread."""
+        with self._lock:
+            self._changed.add(quiz_id)
+            if self._timer is None:
+                self._timer = threading.Timer(self.interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            changed, self._changed = self._changed, set()
+            self._timer = None
+        if not changed:
+            return
+        try:
+            sessions_collection.update_many({"quiz_id": {"$in": list(changed)}}, {"$inc": BUMP})
+        except PyMongoError:
+            logger.exception("Session version bump failed, retrying")
+            for quiz_id in changed:
+                self.mark_changed(quiz_id)
+
+
+bumper = VersionBumper()
+mark_changed = bumper.mark_changed
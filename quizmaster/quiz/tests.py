@@ -1,3 +1,1387 @@
-from django.test import TestCase
+import os
+from datetime import datetime
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import mongomock
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from bson import ObjectId
+from django.test import SimpleTestCase, override_settings
+from pymongo import MongoClient, UpdateOne
+from pymongo.asynchronous.database import AsyncDatabase
+
+from quizmaster import mongo_async
+from quizmaster import mongo_client
+
+# Point at a disposable local mongod (e.g. mongodb://localhost:27017) to run the
+# Mongo tests against the real drivers; otherwise they use mongomock.
+MONGO_TEST_URI = os.getenv("MONGO_TEST_URI")
+TEST_DB_NAME = "quizmaster_test"
+
+
+def _add_update(add_update):
+    # PyMongo >= 4.11 passes ``sort`` for UpdateOne, which mongomock does not know yet
+    def wrapper(self, *args, sort=None, **kwargs):
+        return add_update(self, *args, **kwargs)
+    return wrapper
+
+
+mongomock.collection.BulkOperationBuilder.add_update = _add_update(
+    mongomock.collection.BulkOperationBuilder.add_update
+)
+
+
+class _AsyncCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor.sort(*args, **kwargs)
+        return self
+
+    async def to_list(self, length=None):
+        documents = list(self._cursor)
+        return documents[:length] if length else documents
+
+
+class _AsyncCollection:
+    """The part of PyMongo's ``AsyncCollection`` the repositories use, over mongomock."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def find(self, *args, **kwargs):
+        return _AsyncCursor(self._collection.find(*args, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+
+class _AsyncDatabase:
+    def __init__(self, database):
+        self._database = database
+
+    def __getitem__(self, name):
+        return _AsyncCollection(self._database[name])
+
+
+class MongoTestCase(SimpleTestCase):
+    """Runs the sync proxies and the async repositories against one test database.
+
+    Uses a local mongod when ``MONGO_TEST_URI`` is set, mongomock otherwise.
+    """
+
+    def setUp(self):
+        if MONGO_TEST_URI:
+            self.client = MongoClient(MONGO_TEST_URI)
+            self.client.drop_database(TEST_DB_NAME)
+            patches = [
+                mock.patch.object(mongo_client, "get_db", lambda: self.client[TEST_DB_NAME]),
+                mock.patch.object(mongo_async, "uri", MONGO_TEST_URI),
+                mock.patch.object(mongo_async, "DB_NAME", TEST_DB_NAME),
+                mock.patch.object(mongo_async, "_clients", mongo_async.weakref.WeakKeyDictionary()),
+            ]
+        else:
+            self.client = mongomock.MongoClient()
+            database = self.client[TEST_DB_NAME]
+            patches = [
+                mock.patch.object(mongo_client, "get_db", lambda: database),
+                mock.patch.object(mongo_async, "get_async_db", lambda: _AsyncDatabase(database)),
+            ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.db = self.client[TEST_DB_NAME]
+
+    def tearDown(self):
+        self.client.drop_database(TEST_DB_NAME)
+        self.client.close()
+
+
+class AsyncClientTests(SimpleTestCase):
+    async def test_one_client_per_event_loop(self):
+        with mock.patch.object(mongo_async, "_clients", mongo_async.weakref.WeakKeyDictionary()):
+            database = mongo_async.get_async_db()
+            self.assertIsInstance(database, AsyncDatabase)
+            self.assertEqual(database.name, mongo_async.DB_NAME)
+            self.assertIs(mongo_async.get_async_db().client, database.client)
+
+
+class SyncClientTests(SimpleTestCase):
+    def test_a_forked_process_builds_its_own_client(self):
+        pid = [1000]
+        built = []
+
+        def client(*args, **kwargs):
+            built.append(mock.MagicMock(name=f"client-{pid[0]}"))
+            return built[-1]
+
+        with mock.patch.object(mongo_client, "MongoClient", client), \
+                mock.patch.object(mongo_client.os, "getpid", lambda: pid[0]), \
+                mock.patch.object(mongo_client, "_client", None), \
+                mock.patch.object(mongo_client, "_client_pid", None):
+            parent = mongo_client.get_client()
+            self.assertIs(mongo_client.get_client(), parent)
+            self.assertIs(mongo_client.sessions_collection.find, parent[mongo_client.DB_NAME]["sessions"].find)
+
+            pid[0] = 1001  # the forked child, still holding the parent's client
+            child = mongo_client.get_client()
+            self.assertIsNot(child, parent)
+            self.assertIs(mongo_client.sessions_collection.find, child[mongo_client.DB_NAME]["sessions"].find)
+
+            mongo_client._after_fork_in_child()  # what os.register_at_fork runs in a child
+            self.assertIsNot(mongo_client.get_client(), child)
+            self.assertEqual(len(built), 3)
+            for old in built[:2]:
+                old.close.assert_not_called()  # the other process's sockets are left alone
+
+
+class RepositoryTests(MongoTestCase):
+    async def test_user_lookups(self):
+        user_id = self.db.users.insert_one({"email": "a@example.com", "username": "a", "password": "x"}).inserted_id
+
+        by_id = await mongo_async.users.get_by_id(str(user_id), {"password": 0})
+        self.assertEqual(by_id["username"], "a")
+        self.assertNotIn("password", by_id)
+        self.assertEqual((await mongo_async.users.get_by_email("a@example.com"))["_id"], user_id)
+        self.assertIsNone(await mongo_async.users.get_by_id(str(ObjectId())))
+
+    async def test_session_updates(self):
+        session_id = self.db.sessions.insert_one({"quiz_id": "q1", "status": "waiting"}).inserted_id
+
+        await mongo_async.sessions.update_by_quiz("q1", {"$set": {"status": "in_progress"}}, {"status": "waiting"})
+        result = await mongo_async.sessions.update_by_quiz("q1", {"$set": {"status": "x"}}, {"status": "waiting"})
+        self.assertEqual(result.modified_count, 0)
+        before = await mongo_async.sessions.find_one_and_update(
+            {"_id": session_id}, {"$inc": {"participant_count": 1}}, {"participant_count": 1}
+        )
+        after = await mongo_async.sessions.find_one_and_update(
+            {"_id": session_id}, {"$inc": {"participant_count": 1}}, {"participant_count": 1}, after=True
+        )
+        self.assertNotIn("participant_count", before)
+        self.assertEqual(after["participant_count"], 2)
+        self.assertEqual((await mongo_async.sessions.get_by_quiz("q1"))["status"], "in_progress")
+
+    async def test_participants(self):
+        self.assertTrue(await mongo_async.participants.insert_if_absent("s1", "u2", {
+            "quiz_id": "q1", "joinedAt": datetime(2026, 1, 1, 0, 1),
+        }))
+        self.assertFalse(await mongo_async.participants.insert_if_absent("s1", "u2", {"quiz_id": "q1"}))
+        await mongo_async.participants.insert_if_absent("s1", "u1", {
+            "quiz_id": "q1", "joinedAt": datetime(2026, 1, 1, 0, 0),
+        })
+        await mongo_async.participants.bulk_write([
+            UpdateOne({"quiz_id": "q1", "user_id": "u1"}, {"$inc": {"score": 3}}),
+        ])
+
+        listed = await mongo_async.participants.list_for_quiz("q1", {"_id": 0, "user_id": 1})
+        self.assertEqual(listed, [{"user_id": "u1"}, {"user_id": "u2"}])
+        self.assertEqual((await mongo_async.participants.get("q1", "u1"))["score"], 3)
+
+
+class MigrateParticipantsTests(MongoTestCase):
+    def migrate(self, *args):
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command("migrate_participants", *args, stdout=out)
+        return out.getvalue()
+
+    def embedded(self, user_id, score):
+        return {"user_id": user_id, "username": user_id.upper(), "score": score, "answers": [], "joinedAt": datetime(2026, 1, 1)}
+
+    def test_rerun_after_a_partial_run_copies_each_participant_once(self):
+        session_id = self.db.sessions.insert_one({
+            "quiz_id": "q1", "status": "finished",
+            "participants": [self.embedded("u1", 1), self.embedded("u2", 2), self.embedded("u3", 3)],
+        }).inserted_id
+        self.db.sessions.insert_one({"quiz_id": "q2", "status": "waiting", "participants": []})
+        # An earlier run copied u1, then stopped before dropping the array; u1 has played on since
+        self.db.session_participants.insert_one({"session_id": str(session_id), "quiz_id": "q1", "user_id": "u1", "score": 7})
+
+        self.assertIn("Would migrate 3 participant(s) from 2 session(s).", self.migrate("--dry-run"))
+        self.assertEqual(self.db.session_participants.count_documents({}), 1)  # dry run writes nothing
+
+        self.assertIn("Migrated 3 participant(s) from 2 session(s).", self.migrate("--batch-size", "2"))
+        copies = {p["user_id"]: p["score"] for p in self.db.session_participants.find({"quiz_id": "q1"})}
+        self.assertEqual(copies, {"u1": 7, "u2": 2, "u3": 3})  # u1 not overwritten, nobody twice
+        for session in self.db.sessions.find():
+            self.assertNotIn("participants", session)
+        self.assertEqual(
+            [s["participant_count"] for s in self.db.sessions.find({}, sort=[("quiz_id", 1)])], [3, 0]
+        )
+
+        self.assertIn("Migrated 0 participant(s) from 0 session(s).", self.migrate())
+        self.assertEqual(self.db.session_participants.count_documents({}), 3)
+
+
+class MetricsMiddlewareTests(SimpleTestCase):
+    def test_async_chain_is_awaited_without_adaptation(self):
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from quizmaster.metrics import MetricsMiddleware, http_request_duration
+
+        async def view(request):
+            return HttpResponse(status=201)
+
+        middleware = MetricsMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        http_request_duration.reset()
+        response = async_to_sync(middleware)(RequestFactory().get("/"))
+        self.assertEqual(response.status_code, 201)
+        series = http_request_duration.value("unresolved", "GET", 201)
+        self.assertEqual(sum(series[:-1]), 1)  # bucket counts, then the sum
+
+    def test_sync_chain(self):
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from quizmaster.metrics import MetricsMiddleware
+
+        middleware = MetricsMiddleware(lambda request: HttpResponse())
+        self.assertFalse(iscoroutinefunction(middleware))
+        self.assertEqual(middleware(RequestFactory().get("/")).status_code, 200)
+
+    def test_endpoint_only_answers_allowed_networks(self):
+        from django.http import Http404
+        from django.test import RequestFactory
+        from quizmaster.metrics import metrics_view
+
+        factory = RequestFactory()
+        self.assertEqual(metrics_view(factory.get("/metrics", REMOTE_ADDR="127.0.0.1")).status_code, 200)
+        with self.assertRaises(Http404):
+            metrics_view(factory.get("/metrics", REMOTE_ADDR="203.0.113.7"))
+        with override_settings(METRICS={"ALLOW_FROM": ["203.0.113.0/24"]}):
+            self.assertEqual(metrics_view(factory.get("/metrics", REMOTE_ADDR="203.0.113.7")).status_code, 200)
+
+
+class CallerMiddlewareTests(SimpleTestCase):
+    def test_process_view_matches_the_chain_mode(self):
+        from quizmaster.slow_queries import CallerMiddleware
+
+        async def view(request):
+            pass
+
+        self.assertTrue(iscoroutinefunction(CallerMiddleware(view)))
+        self.assertTrue(iscoroutinefunction(CallerMiddleware(view).process_view))
+        self.assertFalse(iscoroutinefunction(CallerMiddleware(lambda request: None).process_view))
+
+    def test_sync_caller_does_not_outlive_the_request(self):
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from quizmaster.slow_queries import CallerMiddleware, current_caller
+
+        seen = []
+
+        def get_response(request):
+            middleware.process_view(request, None, (), {})
+            seen.append(current_caller.get())
+            return HttpResponse()
+
+        middleware = CallerMiddleware(get_response)
+        middleware(RequestFactory().get("/"))
+        self.assertEqual(seen, ["unresolved"])
+        self.assertIsNone(current_caller.get())  # the next request on this thread starts clean
+
+
+class _WireServer:
+    """Just enough of a mongod for AsyncMongoClient: OP_MSG hello and empty finds."""
+
+    OP_MSG = 2013
+
+    async def start(self):
+        import asyncio
+
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return f"mongodb://127.0.0.1:{self.server.sockets[0].getsockname()[1]}/?directConnection=true"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    @staticmethod
+    def reply(command):
+        if "hello" in command or "isMaster" in command or "ismaster" in command:
+            return {
+                "isWritablePrimary": True, "helloOk": True, "minWireVersion": 0, "maxWireVersion": 21,
+                "maxBsonObjectSize": 16 * 1024 * 1024, "maxMessageSizeBytes": 48000000,
+                "maxWriteBatchSize": 100000, "ok": 1,
+            }
+        if "find" in command:
+            return {"cursor": {"id": 0, "ns": f"{command['$db']}.{command['find']}", "firstBatch": []}, "ok": 1}
+        return {"ok": 1}
+
+    async def _serve(self, reader, writer):
+        import asyncio
+        import struct
+        import bson
+
+        try:
+            while True:
+                length, request_id, _, opcode = struct.unpack("<iiii", await reader.readexactly(16))
+                body = await reader.readexactly(length - 16)
+                # flagBits, then a kind 0 section holding the command document
+                command = bson.decode(body[5:5 + struct.unpack("<i", body[5:9])[0]])
+                payload = struct.pack("<IB", 0, 0) + bson.encode(self.reply(command))
+                writer.write(struct.pack("<iiii", 16 + len(payload), 0, request_id, self.OP_MSG) + payload)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+
+class SlowQueryCallerTests(SimpleTestCase):
+    async def test_async_client_captures_carry_the_calling_view(self):
+        import asyncio
+        from collections import deque
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from pymongo import AsyncMongoClient
+        from pymongo.server_api import ServerApi
+        from quizmaster import slow_queries
+
+        server = _WireServer()
+        client = AsyncMongoClient(
+            await server.start(), server_api=ServerApi("1"),
+            event_listeners=[slow_queries.SlowQueryListener(threshold_ms=0)],
+        )
+
+        async def view(request):
+            await client.quizmaster.sessions.find_one({"quiz_id": "q1"})
+            return HttpResponse()
+
+        middleware = slow_queries.CallerMiddleware(view)
+
+        async def handle(url_name):
+            request = RequestFactory().get("/")
+            request.resolver_match = mock.Mock(url_name=url_name)
+            await middleware.process_view(request, view, (), {})
+            return await middleware(request)
+
+        captures = deque()
+        try:
+            with mock.patch.object(slow_queries, "buffer", captures), \
+                    mock.patch.object(slow_queries, "_get_explainer"):
+                await asyncio.gather(handle("join_quiz"), handle("submit_answer"))
+        finally:
+            await client.close()
+            await server.stop()
+
+        finds = [capture for capture in captures if capture["command"] == "find"]
+        self.assertEqual(sorted(capture["caller"] for capture in finds), ["join_quiz", "submit_answer"])
+
+
+class RendererTests(SimpleTestCase):
+    def test_matches_drf_json_for_mongo_documents(self):
+        from datetime import timezone
+        from decimal import Decimal
+        from bson import Decimal128
+        from rest_framework.renderers import JSONRenderer
+        from quizmaster.renderers import MongoJSONRenderer
+
+        quiz_id = ObjectId()
+        started = datetime(2026, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc)
+        document = {
+            "_id": quiz_id,
+            "created_at": started,
+            "naive_at": datetime(2026, 1, 2, 3, 4, 5),
+            "score": Decimal128("12.5"),
+            "participants": [{"user_id": ObjectId(), "joinedAt": started, "title": "Ünïcode / quiz"}],
+            "max_participants": None,
+        }
+
+        def plain(value):  # what a view had to build before, for DRF's encoder
+            if isinstance(value, dict):
+                return {k: plain(v) for k, v in value.items()}
+            if isinstance(value, list):
+                return [plain(v) for v in value]
+            if isinstance(value, ObjectId):
+                return str(value)
+            if isinstance(value, Decimal128):
+                return value.to_decimal()
+            return value
+
+        self.assertEqual(MongoJSONRenderer().render(document), JSONRenderer().render(plain(document)))
+        self.assertEqual(MongoJSONRenderer().render({"d": Decimal("0.1")}), JSONRenderer().render({"d": Decimal("0.1")}))
+        self.assertEqual(MongoJSONRenderer().render(None), b"")
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    def test_async_chain_compresses(self):
+        import gzip
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from quizmaster.compression import CompressionMiddleware
+
+        async def view(request):
+            return HttpResponse(b"x" * 4096)
+
+        middleware = CompressionMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip"))
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), b"x" * 4096)
+
+
+class MiddlewareStackTests(SimpleTestCase):
+    @override_settings(DEBUG=True)  # Django only logs adaptations in debug
+    def test_no_middleware_is_adapted_under_asgi(self):
+        from django.core.handlers.base import BaseHandler
+
+        with self.assertNoLogs("django.request", level="DEBUG"):
+            BaseHandler().load_middleware(is_async=True)
+
+
+class MetricShardTests(SimpleTestCase):
+    def test_exited_threads_are_folded_into_one_shard(self):
+        import threading
+        from quizmaster.metrics import Counter, Histogram, REGISTRY
+
+        counter = Counter("test_threads_total", "test")
+        histogram = Histogram("test_thread_seconds", "test", buckets=(1.0,))
+        self.addCleanup(REGISTRY.remove, counter)
+        self.addCleanup(REGISTRY.remove, histogram)
+
+        def work():
+            counter.inc("a")
+            histogram.observe(0.5)
+
+        for _ in range(200):
+            thread = threading.Thread(target=work)
+            thread.start()
+            thread.join()
+
+        self.assertLessEqual(len(counter._shards), 1)
+        self.assertEqual(counter.value("a"), 200)
+        self.assertEqual(histogram.value(), [200, 0, 100.0])
+
+    def test_room_gauge_forgets_empty_rooms(self):
+        from quizmaster.metrics import Gauge, REGISTRY
+
+        gauge = Gauge("test_open", "test", ("room",))
+        self.addCleanup(REGISTRY.remove, gauge)
+        gauge.inc("q1")
+        gauge.inc("q1")
+        gauge.dec("q1")
+        gauge.dec("q1")
+        self.assertEqual(gauge.values(), {})
+        self.assertEqual(gauge._shard(), {})
+
+
+class QuizCacheTests(MongoTestCase):
+    async def test_counters_reach_metrics_and_invalidation_reloads(self):
+        from quiz import quiz_cache
+        from quizmaster import metrics
+        from quizmaster.ttl_cache import TTLCache
+
+        cache = TTLCache(max_size=1)
+        with mock.patch.object(quiz_cache, "quiz_cache", metrics.caches.register("quiz", cache)):
+            self.addCleanup(metrics.caches.register, "quiz", quiz_cache.quiz_cache)
+            quiz_id = str(self.db.quizzes.insert_one({"title": "Q", "questions": [{"correct_answer": "A"}]}).inserted_id)
+            other_id = str(self.db.quizzes.insert_one({"title": "R", "questions": []}).inserted_id)
+            await quiz_cache.aget_compiled_quiz(quiz_id)
+            self.assertEqual((await quiz_cache.aget_compiled_quiz(quiz_id)).answer_key, ("A",))
+
+            self.db.quizzes.update_one({"_id": ObjectId(quiz_id)}, {"$set": {"questions.0.correct_answer": "B"}})
+            quiz_cache.invalidate_quiz(quiz_id)
+            self.assertEqual((await quiz_cache.aget_compiled_quiz(quiz_id)).answer_key, ("B",))
+            await quiz_cache.aget_compiled_quiz(other_id)  # evicts the first quiz
+
+            rendered = metrics.render()
+        for line in (
+            'quizmaster_cache_hits_total{cache="quiz"} 1',
+            'quizmaster_cache_misses_total{cache="quiz"} 3',
+            'quizmaster_cache_evictions_total{cache="quiz"} 1',
+            'quizmaster_cache_entries{cache="quiz"} 1',
+        ):
+            self.assertIn(line, rendered.splitlines())
+
+
+class LeaderboardBroadcastTests(MongoTestCase):
+    async def test_pushes_are_coalesced_on_the_loop(self):
+        import asyncio
+        import time
+        from quiz import leaderboard
+
+        pushed = []
+
+        async def broadcast(quiz_id, event):
+            pushed.append((quiz_id, event))
+
+        broadcaster = leaderboard.LeaderboardBroadcaster(interval=0.05, top_k=2)
+        self.addCleanup(leaderboard.drop_leaderboard, "lb1")
+        with mock.patch.object(leaderboard, "broadcaster", broadcaster), \
+                mock.patch.object(leaderboard, "abroadcast_to_room", broadcast):
+            broadcaster._last_sent["lb1"] = time.monotonic()  # as if a push just went out
+            for score, user_id in enumerate(["u1", "u2", "u3"]):
+                await leaderboard.arecord_score("lb1", user_id, user_id, score)
+            self.assertIsInstance(broadcaster._tasks["lb1"], asyncio.Task)  # on this loop, no timer thread
+            self.assertEqual(pushed, [])
+            await asyncio.sleep(0.08)
+            self.assertEqual(len(pushed), 1)
+            await leaderboard.arecord_score("lb1", "u1", "u1", 5)
+            await asyncio.sleep(0.08)
+
+        self.assertEqual(len(pushed), 2)
+        self.assertEqual([p["user_id"] for p in pushed[0][1]["data"]], ["u3", "u2"])
+        self.assertEqual([p["user_id"] for p in pushed[1][1]["data"]], ["u1", "u3"])
+
+
+class LeaderboardLifecycleTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        from quiz import leaderboard
+
+        self.leaderboard = leaderboard
+        self.db.session_participants.insert_many([
+            {"quiz_id": "lb2", "user_id": "u1", "username": "u1", "score": 2},
+            {"quiz_id": "lb2", "user_id": "u2", "username": "u2", "score": 1},
+        ])
+        for patch in (
+            mock.patch.object(leaderboard, "broadcaster", leaderboard.LeaderboardBroadcaster(interval=60)),
+            mock.patch.object(leaderboard, "_seeded", {}),
+            mock.patch.object(leaderboard, "abroadcast_to_room", mock.AsyncMock()),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    async def test_redis_board_is_written_on_the_loop_and_expires(self):
+        import fakeredis
+
+        redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        # No sync client at all: the answer path must not need one
+        backend = self.leaderboard.RedisLeaderboard(None, async_redis=lambda: redis, ttl=600)
+        with mock.patch.object(self.leaderboard, "_backend", backend):
+            await self.leaderboard.arecord_score("lb2", "u2", "u2", 3)
+            self.assertEqual([p["user_id"] for p in await self.leaderboard.atop_players("lb2")], ["u2", "u1"])
+            for key in ("lb:lb2", "lb:lb2:names"):
+                self.assertTrue(0 < await redis.ttl(key) <= 600)
+
+            await self.leaderboard.session_events.run_handlers("lb2")
+        self.assertEqual(await redis.exists("lb:lb2", "lb:lb2:names"), 0)
+        self.assertNotIn("lb2", self.leaderboard._seeded)
+
+    async def test_session_end_forgets_the_local_board(self):
+        backend = self.leaderboard.LocalLeaderboard()
+        with mock.patch.object(self.leaderboard, "_backend", backend):
+            await self.leaderboard.arecord_score("lb2", "u2", "u2", 3)
+            await self.leaderboard.broadcaster.flush("lb2")
+            self.assertEqual(backend.rank("lb2", "u1")["rank"], 2)
+
+            await self.leaderboard.session_events.run_handlers("lb2")
+        self.assertEqual((backend._boards, self.leaderboard._seeded, self.leaderboard.broadcaster._last_sent), ({}, {}, {}))
+
+
+class RosterTests(MongoTestCase):
+    async def test_joins_within_a_window_are_one_delta(self):
+        import asyncio
+        from quiz import roster
+
+        broadcast = mock.AsyncMock()
+        self.db.sessions.insert_one({"quiz_id": "r1", "participant_count": 3})
+        aggregator = roster.RosterAggregator(window=0.05)
+        with mock.patch.object(roster, "abroadcast_to_room", broadcast):
+            for user_id in ("u1", "u2", "u3"):
+                aggregator.record_join("r1", user_id, user_id.upper())
+            aggregator.record_join("r1", "u2", "U2")  # a retried join is not listed twice
+            await asyncio.sleep(0.1)
+            aggregator.record_join("r1", "u4", "U4")
+            await asyncio.sleep(0.1)
+
+        self.assertEqual(broadcast.await_count, 2)
+        quiz_id, event = broadcast.await_args_list[0].args
+        self.assertEqual((quiz_id, event["type"], event["total"]), ("r1", "broadcast_roster_delta", 3))
+        self.assertEqual([p["user_id"] for p in event["added"]], ["u1", "u2", "u3"])
+        self.assertEqual(broadcast.await_args_list[1].args[1]["added"], [{"user_id": "u4", "username": "U4"}])
+
+
+class HotStateTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        import fakeredis
+        from quiz import hot_state
+
+        self.hot_state = hot_state
+        server = fakeredis.FakeServer()
+        self.redis = lambda: fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+        for patch in (
+            mock.patch.object(hot_state, "get_async_redis", self.redis),
+            mock.patch.object(hot_state, "checkpointer", mock.Mock()),
+            mock.patch.object(hot_state.session_version, "mark_changed", mock.Mock()),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.db.sessions.insert_one({"quiz_id": "q1", "status": "in_progress", "host_id": "h"})
+        for user_id in ("u1", "u2"):
+            self.db.session_participants.insert_one({
+                "quiz_id": "q1", "user_id": user_id, "username": user_id, "score": 0, "currentQuestionIndex": 0,
+            })
+
+    async def answer(self, user_id, index, correct=True):
+        record = {"question_index": index, "selectedOption": "A", "isCorrect": correct}
+        return await self.hot_state.accept("q1", user_id, index, record, correct)
+
+    def participant(self, user_id):
+        return self.db.session_participants.find_one({"quiz_id": "q1", "user_id": user_id})
+
+    async def test_one_answer_per_index(self):
+        hs = self.hot_state
+        self.assertTrue(await hs.load_session("q1"))
+        self.assertEqual(await self.answer("u1", 0), (hs.ACCEPTED, 1))
+        self.assertEqual(await self.answer("u1", 0), (hs.CONFLICT, 1))
+        self.assertEqual(await self.answer("u9", 0), (hs.UNKNOWN, 0))
+        await self.redis().hset(hs._session_key("q1"), "status", "finished")
+        self.assertEqual(await self.answer("u1", 1), (hs.NOT_IN_PROGRESS, 0))
+
+    async def test_checkpoint_writes_answers_in_order(self):
+        await self.hot_state.load_session("q1")
+        await self.answer("u1", 0)
+        await self.answer("u2", 0, correct=False)
+        await self.answer("u1", 1, correct=False)
+        await self.hot_state.checkpoint("q1")
+
+        u1, u2 = self.participant("u1"), self.participant("u2")
+        self.assertEqual((u1["currentQuestionIndex"], u1["score"]), (2, 1))
+        self.assertEqual([a["question_index"] for a in u1["answers"]], [0, 1])
+        self.assertEqual((u2["currentQuestionIndex"], u2["score"]), (1, 0))
+        self.assertEqual(await self.redis().llen(self.hot_state._answers_key("q1")), 0)
+
+    async def test_replaying_an_applied_batch_counts_nothing_twice(self):
+        from pymongo.errors import AutoReconnect
+
+        await self.hot_state.load_session("q1")
+        await self.answer("u1", 0)
+        bulk_write = mongo_async.participants.bulk_write
+
+        async def applied_then_timed_out(operations, ordered=False):
+            await bulk_write(operations, ordered)
+            raise AutoReconnect("timed out after the write was applied")
+
+        with mock.patch.object(mongo_async.participants, "bulk_write", applied_then_timed_out):
+            with self.assertLogs("quiz.hot_state", "ERROR"):
+                await self.hot_state.checkpoint("q1")
+        self.assertEqual(await self.redis().llen(self.hot_state._answers_key("q1")), 1)
+        await self.hot_state.checkpoint("q1")
+
+        u1 = self.participant("u1")
+        self.assertEqual((u1["currentQuestionIndex"], u1["score"], len(u1["answers"])), (1, 1, 1))
+        self.assertEqual(await self.redis().llen(self.hot_state._answers_key("q1")), 0)
+
+    async def test_answers_ahead_of_mongo_wait_for_earlier_ones(self):
+        key = self.hot_state._answers_key("q1")
+        await self.hot_state.load_session("q1")
+        await self.answer("u1", 0)
+        await self.answer("u1", 1)
+        in_flight = await self.redis().lpop(key)  # another worker's batch, not written yet
+
+        await self.hot_state.checkpoint("q1")
+        self.assertEqual(self.participant("u1")["currentQuestionIndex"], 0)
+        self.assertEqual(await self.redis().llen(key), 1)
+
+        await self.redis().lpush(key, in_flight)  # that worker failed and requeued it
+        await self.hot_state.checkpoint("q1")
+        u1 = self.participant("u1")
+        self.assertEqual((u1["currentQuestionIndex"], u1["score"]), (2, 2))
+        self.assertEqual([a["question_index"] for a in u1["answers"]], [0, 1])
+
+
+class _Socket:
+    """Stands in for a ``QuizConsumer``: records the room events handed to it."""
+
+    def __init__(self):
+        self.received = []
+
+    async def broadcast_leaderboard(self, event):
+        self.received.append(event["seq"])
+
+
+class RoomFanoutTests(SimpleTestCase):
+    async def wait_for(self, sockets, count):
+        import asyncio
+
+        for _ in range(200):
+            if all(len(socket.received) >= count for socket in sockets):
+                break
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)  # let any duplicate arrive before asserting
+
+    async def test_each_socket_on_each_worker_gets_every_event_once_in_order(self):
+        import fakeredis
+        from quiz.fanout import RoomFanout
+
+        server = fakeredis.FakeServer()
+        workers = [
+            RoomFanout(redis=fakeredis.aioredis.FakeRedis(server=server, decode_responses=True), use_redis=True)
+            for _ in range(3)
+        ]
+        sockets = [_Socket() for _ in range(10)]
+        for i, socket in enumerate(sockets):
+            await workers[i % len(workers)].join("r1", socket)
+        bystander = _Socket()
+        await workers[0].join("r2", bystander)
+        try:
+            for seq in range(20):
+                await workers[seq % 2].publish("r1", {"type": "broadcast_leaderboard", "seq": seq})
+            await self.wait_for(sockets, 20)
+        finally:
+            for worker in workers:
+                await worker.close()
+
+        for socket in sockets:
+            self.assertEqual(socket.received, list(range(20)))
+        self.assertEqual(bystander.received, [])
+
+    async def test_publish_from_a_worker_thread_uses_the_server_loop(self):
+        import asyncio
+        import threading
+        import fakeredis
+        from quiz import fanout
+
+        server = fakeredis.FakeServer()
+        loops = []
+
+        def get_async_redis():
+            loops.append(asyncio.get_running_loop())
+            return fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+
+        socket = _Socket()
+        with mock.patch.object(fanout, "get_async_redis", get_async_redis):
+            for use_redis in (True, False):
+                room = fanout.RoomFanout(use_redis=use_redis)
+                await room.join("r1", socket)
+                event = {"type": "broadcast_leaderboard", "seq": int(use_redis)}
+                # Its own loop, as async_to_sync gives a timer thread
+                thread = threading.Thread(target=lambda: asyncio.run(room.publish("r1", event)))
+                thread.start()
+                await asyncio.get_running_loop().run_in_executor(None, thread.join)
+                await self.wait_for([socket], 2 - use_redis)
+                await room.close()
+
+        self.assertEqual(socket.received, [1, 0])
+        self.assertEqual(set(loops), {asyncio.get_running_loop()})
+
+
+class JoinQuizTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        from accounts.authentication import DictUser
+        from quiz import admission, ratelimit
+
+        self.admission = admission.LocalAdmission()
+        for patch in (
+            mock.patch.object(admission, "_backend", self.admission),
+            mock.patch.object(ratelimit, "ENABLED", False),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.quiz_id = str(self.db.quizzes.insert_one({"title": "Q", "questions": [], "max_participants": 5}).inserted_id)
+        self.db.sessions.insert_one({"quiz_id": self.quiz_id, "status": "waiting", "participant_count": 0})
+        self.user = DictUser(_id="u1", username="u1")
+
+    async def join(self):
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from quiz.views import join_quiz
+
+        request = APIRequestFactory().post(f"/quiz/{self.quiz_id}/join/")
+        force_authenticate(request, user=self.user)
+        return await join_quiz(request, quiz_id=self.quiz_id)
+
+    async def test_session_end_drops_the_admission_state(self):
+        from quiz import admission, scheduler
+
+        with mock.patch("quiz.game.record_score"), mock.patch("quiz.views.roster"):
+            self.assertEqual((await self.join()).status_code, 200)
+        self.assertIn(self.quiz_id, self.admission._sessions)
+
+        self.db.sessions.update_one({"quiz_id": self.quiz_id}, {"$set": {"status": "finished"}})
+        with mock.patch.object(scheduler, "abroadcast_to_room", mock.AsyncMock()):
+            await scheduler.end_session(self.quiz_id)
+        self.assertNotIn(self.quiz_id, self.admission._sessions)
+        self.assertEqual(await admission.admit(self.quiz_id, "u2", 5), admission.STARTED)
+
+    async def test_failed_mongo_write_gives_the_admission_seat_back(self):
+        from pymongo.errors import AutoReconnect
+
+        with mock.patch.object(mongo_async.participants, "insert_if_absent", side_effect=AutoReconnect("down")):
+            with self.assertRaises(AutoReconnect):
+                await self.join()
+        self.assertNotIn("u1", self.admission._sessions[self.quiz_id]["joined"])
+
+        with mock.patch("quiz.game.record_score"), mock.patch("quiz.views.roster"):
+            response = await self.join()
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertTrue(self.db.session_participants.find_one({"quiz_id": self.quiz_id, "user_id": "u1"}))
+
+
+class QuizListTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        from accounts.authentication import DictUser
+        from quiz import ratelimit
+
+        patch = mock.patch.object(ratelimit, "ENABLED", False)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.user = DictUser(_id="u1", username="u1")
+
+    def get(self, view, query=""):
+        from rest_framework.test import APIRequestFactory, force_authenticate
+
+        request = APIRequestFactory().get(f"/quiz/list/{query}")
+        force_authenticate(request, user=self.user)
+        return view(request)
+
+    def test_parse_page_bounds(self):
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+        from quiz.views import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, parse_page
+
+        def page(query):
+            return parse_page(Request(APIRequestFactory().get(f"/{query}")))
+
+        after = ObjectId()
+        self.assertEqual(page(""), (None, DEFAULT_PAGE_SIZE))
+        self.assertEqual(page(f"?after={after}&limit=5"), (after, 5))
+        self.assertEqual(page("?limit=0"), (None, 1))
+        self.assertEqual(page("?limit=-3"), (None, 1))
+        self.assertEqual(page("?limit=100000"), (None, MAX_PAGE_SIZE))
+        for query in ("?limit=ten", "?after=nope"):
+            with self.assertRaises(ValueError):
+                page(query)
+
+        from quiz.views import get_created_quiz_list
+        self.assertEqual(self.get(get_created_quiz_list, "?after=nope").status_code, 400)
+
+    @skipUnless(MONGO_TEST_URI, "mongomock does not implement $lookup with let")
+    def test_created_list_pages_through_the_lookup(self):
+        from quiz.views import get_created_quiz_list
+
+        ids = [
+            self.db.quizzes.insert_one({"title": f"Q{i}", "created_by": "u1", "questions": [{}] * i}).inserted_id
+            for i in range(3)
+        ]
+        self.db.quizzes.insert_one({"title": "other", "created_by": "u2"})
+        self.db.sessions.insert_one({"quiz_id": str(ids[2]), "status": "waiting", "participant_count": 4, "host_id": "u1"})
+
+        first = self.get(get_created_quiz_list, "?limit=2").data
+        self.assertEqual([q["title"] for q in first["quizzes"]], ["Q2", "Q1"])  # newest first
+        self.assertEqual(first["next_cursor"], ids[1])
+        newest = first["quizzes"][0]
+        self.assertEqual(
+            (newest["questionCount"], newest["status"], newest["participantCount"], newest["host_id"]),
+            (2, "waiting", 4, "u1"),
+        )
+        self.assertEqual((first["quizzes"][1]["status"], first["quizzes"][1]["participantCount"]), (None, 0))
+
+        last = self.get(get_created_quiz_list, f"?limit=2&after={first['next_cursor']}").data
+        self.assertEqual([q["title"] for q in last["quizzes"]], ["Q0"])
+        self.assertIsNone(last["next_cursor"])
+
+    def test_enrolled_list_pages_and_scopes_participants(self):
+        from quiz.views import get_enrolled_quiz_list
+
+        quiz_ids = [
+            str(self.db.quizzes.insert_one({"title": f"Q{i}", "created_by": "h", "questions": [{}] * i}).inserted_id)
+            for i in range(3)
+        ]
+        self.db.sessions.insert_one({"quiz_id": quiz_ids[2], "status": "finished", "participant_count": 2})
+        for quiz_id in quiz_ids:  # enrolled in order, so the last one is the most recent
+            self.db.session_participants.insert_one({"quiz_id": quiz_id, "session_id": "s", "user_id": "u1", "score": 1, "answers": []})
+        self.db.session_participants.insert_one({"quiz_id": quiz_ids[2], "session_id": "s", "user_id": "u2", "score": 5, "answers": []})
+
+        first = self.get(get_enrolled_quiz_list, "?limit=2").data
+        self.assertEqual([q["title"] for q in first["quizzes"]], ["Q2", "Q1"])
+        self.assertIsNotNone(first["next_cursor"])
+        newest = first["quizzes"][0]
+        self.assertEqual(
+            (newest["questionCount"], newest["status"], newest["participantCount"], newest["host_id"]),
+            (2, "finished", 2, "h"),
+        )
+        self.assertEqual(newest["participants"], [{"quiz_id": quiz_ids[2], "user_id": "u1", "score": 1, "answers": []}])
+
+        last = self.get(get_enrolled_quiz_list, f"?limit=2&after={first['next_cursor']}").data
+        self.assertEqual([q["title"] for q in last["quizzes"]], ["Q0"])
+        self.assertIsNone(last["next_cursor"])
+
+        everyone = self.get(get_enrolled_quiz_list, "?limit=1&participants=all").data["quizzes"][0]["participants"]
+        self.assertEqual(sorted((p["user_id"], p["score"]) for p in everyone), [("u1", 1), ("u2", 5)])
+        self.assertTrue(all("answers" not in p for p in everyone))
+        self.assertEqual(self.get(get_enrolled_quiz_list, "?participants=some").status_code, 400)
+
+
+class SessionViewTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        from quiz import ratelimit
+
+        patch = mock.patch.object(ratelimit, "ENABLED", False)
+        patch.start()
+        self.addCleanup(patch.stop)
+        questions = [{"question": "Q0", "options": ["A", "B"], "correct_answer": "A", "explanation": "..."}]
+        self.quiz_id = str(self.db.quizzes.insert_one({"title": "Q", "topic": "t", "questions": questions}).inserted_id)
+        self.db.sessions.insert_one({"quiz_id": self.quiz_id, "host_id": "host", "status": "waiting", "version": 3})
+        self.db.session_participants.insert_one({
+            "quiz_id": self.quiz_id, "session_id": "s", "user_id": "p", "score": 1,
+            "answers": [{"question_index": 0, "answer": "A"}], "joinedAt": datetime(2026, 1, 1),
+        })
+
+    def get(self, user_id, query="", etag=None):
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from accounts.authentication import DictUser
+        from quiz.views import get_sessions
+
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        request = APIRequestFactory().get(f"/quiz/{self.quiz_id}/sessions/{query}", **headers)
+        force_authenticate(request, user=DictUser(_id=user_id))
+        return get_sessions(request, quiz_id=self.quiz_id)
+
+    def test_etag_is_revalidated_until_the_version_changes(self):
+        response = self.get("p")
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        cached = self.get("p", etag=f"W/{etag}")  # as weakened by compression
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached["ETag"], etag)
+        self.assertEqual(self.get("host", etag=etag).status_code, 200)  # the host's view differs
+        self.assertEqual(self.get("p", "?fields=quiz.title", etag=etag).status_code, 200)
+
+        self.db.sessions.update_one({}, {"$inc": {"version": 1}})
+        self.assertEqual(self.get("p", etag=etag).status_code, 200)
+
+    def test_fields_narrow_the_response(self):
+        data = self.get("p", "?fields=quiz.title,session.status").data
+        self.assertEqual(set(data), {"quiz", "session"})
+        self.assertEqual(set(data["quiz"]) - {"_id"}, {"title"})
+        self.assertEqual(set(data["session"]) - {"_id"}, {"status"})
+
+        data = self.get("p", "?fields=session").data
+        self.assertEqual(set(data), {"session"})
+        self.assertEqual(data["session"]["participants"][0]["user_id"], "p")
+
+        self.assertEqual(self.get("p", "?fields=quiz.password").status_code, 400)
+
+    def test_only_the_host_gets_the_answers(self):
+        for query in ("", "?fields=quiz.questions,session.participants"):
+            player = self.get("p", query).data
+            self.assertEqual(player["quiz"]["questions"], [{"question": "Q0", "options": ["A", "B"]}])
+            self.assertNotIn("answers", player["session"]["participants"][0])
+
+            host = self.get("host", query).data
+            self.assertEqual(host["quiz"]["questions"][0]["correct_answer"], "A")
+            self.assertEqual(host["session"]["participants"][0]["answers"], [{"question_index": 0, "answer": "A"}])
+
+
+class RateLimitTests(MongoTestCase):
+    def test_local_buckets_refill_and_take_all_or_nothing(self):
+        from quiz.ratelimit import LocalBuckets
+
+        now = [100.0]
+        buckets = LocalBuckets(clock=lambda: now[0])
+        limits = [(0.5, 2), (1, 1)]  # user, room
+        self.assertEqual(buckets.take(["u", "r"], limits), (0, 0.0))
+        self.assertEqual(buckets.take(["u", "r"], limits), (2, 1.0))  # room empty
+        self.assertEqual(buckets.take(["u"], limits[:1]), (0, 0.0))  # the refused take cost the user nothing
+        self.assertEqual(buckets.take(["u"], limits[:1]), (1, 2.0))
+
+        now[0] += 2.0
+        self.assertEqual(buckets.take(["u", "r"], limits), (0, 0.0))
+
+    def test_throttled_view_answers_429_with_retry_after(self):
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from accounts.authentication import DictUser
+        from quiz import ratelimit
+        from quiz.views import get_enrolled_quiz_list
+
+        now = [0.0]
+        for patch in (
+            mock.patch.object(ratelimit, "_backend", ratelimit.LocalBuckets(clock=lambda: now[0])),
+            mock.patch.object(ratelimit, "RULES", {"read": {"user": (0.5, 1)}}),
+            mock.patch.object(ratelimit, "ENABLED", True),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        def get(user_id):
+            request = APIRequestFactory().get("/quiz/enrolled/")
+            force_authenticate(request, user=DictUser(_id=user_id))
+            return get_enrolled_quiz_list(request)
+
+        self.assertEqual(get("u1").status_code, 200)
+        response = get("u1")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "2")
+        self.assertEqual(get("u2").status_code, 200)  # per-user buckets
+
+        now[0] += 2.0
+        self.assertEqual(get("u1").status_code, 200)
+
+
+class AsyncViewTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        from rest_framework_simplejwt.tokens import AccessToken
+        from accounts import authentication
+        from quiz import ratelimit
+
+        self.user_id = str(self.db.users.insert_one({"email": "p@example.com", "username": "p"}).inserted_id)
+        questions = [{"question": "Q0", "options": ["A", "B"], "correct_answer": "A"}]
+        self.quiz_id = str(self.db.quizzes.insert_one({"title": "Q", "questions": questions, "duration": 5}).inserted_id)
+        self.db.sessions.insert_one({"quiz_id": self.quiz_id, "status": "in_progress", "host_id": "h"})
+        self.db.session_participants.insert_one({
+            "quiz_id": self.quiz_id, "user_id": self.user_id, "username": "p", "score": 0, "currentQuestionIndex": 0,
+        })
+        token = AccessToken()
+        token["user_id"] = self.user_id
+        self.token = str(token)
+        authentication.principal_cache.clear()
+        self.addCleanup(authentication.principal_cache.clear)
+        for patch in (
+            # The async views must not fall back to the sync lookups
+            mock.patch.object(authentication, "load_principal", side_effect=AssertionError("sync principal lookup")),
+            mock.patch.object(ratelimit, "check", side_effect=AssertionError("sync rate limit check")),
+            mock.patch.object(ratelimit, "_backend", ratelimit.LocalBuckets()),
+            mock.patch.object(ratelimit, "RULES", {"question": {"user": (1, 1)}}),
+            mock.patch.object(ratelimit, "ENABLED", True),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    async def get_question(self, cookie=True):
+        from rest_framework.test import APIRequestFactory
+        from quiz.views import get_current_question
+
+        request = APIRequestFactory().get(f"/quiz/{self.quiz_id}/question/")
+        if cookie:
+            request.COOKIES["access_token"] = self.token
+        response = await get_current_question(request, quiz_id=self.quiz_id)
+        response.render()
+        return response
+
+    async def test_authentication_and_throttling_are_awaited(self):
+        response = await self.get_question()
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data["question"], "Q0")
+
+        response = await self.get_question()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "1")
+
+    async def test_missing_cookie_is_unauthenticated(self):
+        self.assertEqual((await self.get_question(cookie=False)).status_code, 401)
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class WebSocketFrameTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        from quiz import game, ratelimit
+
+        for patch in (
+            mock.patch.object(ratelimit, "ENABLED", False),
+            mock.patch.object(game, "record_score", mock.AsyncMock()),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        questions = [
+            {"question": "Q0", "options": ["A", "B"], "correct_answer": "A"},
+            {"question": "Q1", "options": ["C", "D"], "correct_answer": "D"},
+        ]
+        self.quiz_id = str(self.db.quizzes.insert_one({"title": "Q", "questions": questions, "duration": 5}).inserted_id)
+        self.db.sessions.insert_one({"quiz_id": self.quiz_id, "status": "in_progress", "host_id": "h"})
+        self.db.session_participants.insert_many([
+            {"quiz_id": self.quiz_id, "user_id": user_id, "username": user_id.upper(), "score": 0,
+             "currentQuestionIndex": 0, "joinedAt": datetime(2024, 1, 1, 0, 0, i)}
+            for i, user_id in enumerate(["u1", "u2"])
+        ])
+
+    async def connect(self, subprotocols=None):
+        from channels.testing import WebsocketCommunicator
+        from quiz.consumers import QuizConsumer
+        from quizmaster.token_auth import WsPrincipal
+
+        communicator = WebsocketCommunicator(
+            QuizConsumer.as_asgi(), f"/ws/quiz/{self.quiz_id}/", subprotocols=subprotocols
+        )
+        communicator.scope["url_route"] = {"kwargs": {"quiz_id": self.quiz_id}}
+        communicator.scope["user"] = WsPrincipal({"_id": "u1", "username": "U1"})
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        self.accepted = subprotocol
+        return communicator
+
+    async def request(self, communicator, **frame):
+        await communicator.send_json_to(frame)
+        return await communicator.receive_json_from()
+
+    async def test_roster_question_and_answer_frames(self):
+        communicator = await self.connect()
+        try:
+            self.assertEqual(await self.request(communicator, action="get_roster"), {
+                "type": "roster_snapshot",
+                "participants": [{"user_id": "u1", "username": "U1"}, {"user_id": "u2", "username": "U2"}],
+                "total": 2,
+            })
+            self.assertEqual(await self.request(communicator, action="get_question"), {
+                "type": "question", "question_index": 0, "question": "Q0", "options": ["A", "B"], "total_questions": 2,
+            })
+            self.assertEqual(await self.request(communicator, action="submit_answer", answer="A", question_index=0), {
+                "type": "answer_result",
+                "is_correct": True,
+                "correct_answer": "A",
+                "next_question_index": 1,
+                "next_question": {"question_index": 1, "question": "Q1", "options": ["C", "D"], "total_questions": 2},
+            })
+            self.assertEqual(await self.request(communicator, action="submit_answer", answer="A", question_index=0), {
+                "type": "error", "action": "submit_answer", "status": 409,
+                "message": "Answer already submitted for this question.",
+            })
+        finally:
+            await communicator.disconnect()
+        participant = self.db.session_participants.find_one({"user_id": "u1"})
+        self.assertEqual((participant["currentQuestionIndex"], participant["score"]), (1, 1))
+
+    async def test_msgpack_subprotocol_frames(self):
+        import msgpack
+        from quiz import protocol
+
+        communicator = await self.connect(subprotocols=["chat.v2", protocol.MSGPACK])
+        try:
+            self.assertEqual(self.accepted, protocol.MSGPACK)
+            await communicator.send_to(bytes_data=msgpack.packb({"action": "get_question"}))
+            frame = await communicator.receive_output()
+            self.assertEqual(msgpack.unpackb(frame["bytes"]), {
+                "type": "question", "question_index": 0, "question": "Q0", "options": ["A", "B"], "total_questions": 2,
+            })
+
+            await communicator.send_to(bytes_data=b"\xc1")  # never valid MessagePack
+            frame = msgpack.unpackb((await communicator.receive_output())["bytes"])
+            self.assertEqual((frame["type"], frame["status"]), ("error", 400))
+        finally:
+            await communicator.disconnect()
+
+
+class ProtocolTests(SimpleTestCase):
+    def test_negotiate_prefers_msgpack_and_falls_back_to_json(self):
+        from quiz import protocol
+
+        self.assertEqual(protocol.negotiate(["chat.v2", protocol.MSGPACK]), protocol.MSGPACK)
+        self.assertIsNone(protocol.negotiate(["chat.v2"]))
+        self.assertIsNone(protocol.negotiate([]))
+        with mock.patch.object(protocol, "SUBPROTOCOLS", ()):  # WS_PROTOCOL["MSGPACK"] off
+            self.assertIsNone(protocol.negotiate([protocol.MSGPACK]))
+
+    def test_round_trip(self):
+        import json
+        from quiz import protocol
+
+        frame = {"type": "leaderboard", "players": [{"user_id": "u1", "score": 3, "name": "Zoë"}], "final": False}
+        packed = protocol.encode(protocol.MSGPACK, frame)
+        self.assertIsInstance(packed, bytes)
+        self.assertEqual(protocol.decode(bytes_data=packed), frame)
+        self.assertEqual(protocol.decode(text_data=protocol.encode(protocol.JSON, frame)), frame)
+
+        at = datetime(2026, 1, 1, 12, 0)
+        self.assertEqual(protocol.decode(bytes_data=protocol.encode(protocol.MSGPACK, {"at": at})), {"at": str(at)})
+        self.assertEqual(json.loads(protocol.encode(protocol.JSON, frame)), frame)
+
+        for kwargs in ({"bytes_data": b"\xc1"}, {"bytes_data": protocol.encode(protocol.MSGPACK, [1])}, {"text_data": "{"}):
+            with self.assertRaises(protocol.MalformedFrame):
+                protocol.decode(**kwargs)
+
+    def test_group_event_is_encoded_once_per_format(self):
+        from quiz import protocol
+
+        event_id = protocol.new_event_id()
+        with mock.patch.object(protocol, "_encode", wraps=protocol._encode) as encode:
+            for _ in range(3):
+                packed = protocol.encode(protocol.MSGPACK, {"type": "x"}, event_id)
+                text = protocol.encode(protocol.JSON, {"type": "x"}, event_id)
+        self.assertEqual(encode.call_count, 2)
+        self.assertEqual(protocol.decode(bytes_data=packed), protocol.decode(text_data=text))
+
+
+class AnswerBufferTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        from quiz import answer_buffer as write_behind, game
+
+        self.write_behind, self.game = write_behind, game
+        self.buffer = write_behind.AnswerBuffer(flush_interval_ms=60000, max_pending=1)
+        self.addCleanup(self.buffer.stop)
+        for patch in (
+            mock.patch.object(write_behind, "ENABLED", True),
+            mock.patch.object(write_behind, "answer_buffer", self.buffer),
+            mock.patch.object(game, "answer_buffer", self.buffer),
+            mock.patch.object(game, "record_score", mock.AsyncMock()),
+            mock.patch.object(game.session_events, "listen", mock.Mock()),
+            mock.patch.object(write_behind.session_version, "mark_changed", mock.Mock()),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        questions = [{"question": f"Q{i}", "options": ["A", "B"], "correct_answer": "A"} for i in range(3)]
+        self.quiz_id = str(self.db.quizzes.insert_one({"title": "Q", "questions": questions, "duration": 5}).inserted_id)
+        self.db.sessions.insert_one({"quiz_id": self.quiz_id, "status": "in_progress", "host_id": "h"})
+        self.db.session_participants.insert_one({
+            "quiz_id": self.quiz_id, "user_id": "u1", "username": "u1", "score": 0, "currentQuestionIndex": 0,
+        })
+
+    def participant(self):
+        return self.db.session_participants.find_one({"quiz_id": self.quiz_id, "user_id": "u1"})
+
+    async def test_backlogged_answers_are_refused_while_mongo_is_down(self):
+        from pymongo.errors import AutoReconnect
+
+        await self.game.submit_answer(self.quiz_id, "u1", "A")  # queued: the buffer is now full
+        with mock.patch.object(self.write_behind.participants_collection, "bulk_write", side_effect=AutoReconnect("down")), \
+                self.assertLogs("quiz.answer_buffer", "ERROR"):
+            with self.assertRaises(self.game.GameError) as caught:
+                await self.game.submit_answer(self.quiz_id, "u1", "A")
+        self.assertEqual(caught.exception.status_code, 503)
+        self.assertEqual(self.buffer.stats()["pending"], 1)
+        self.assertEqual(self.buffer.get_state(self.quiz_id, "u1").index, 1)  # not advanced
+
+        self.assertEqual((await self.game.submit_answer(self.quiz_id, "u1", "A"))["next_question_index"], 2)
+        self.buffer.flush()
+        self.assertEqual((self.participant()["currentQuestionIndex"], self.participant()["score"]), (2, 2))
+
+    async def test_session_end_drops_the_session_on_workers_without_sockets(self):
+        import asyncio
+        import fakeredis
+        from quiz.session_events import SessionEndEvents
+
+        server = fakeredis.FakeServer()
+        redis = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+        scheduler_worker, answer_worker = (
+            SessionEndEvents(redis=fakeredis.aioredis.FakeRedis(server=server, decode_responses=True), use_redis=True)
+            for _ in range(2)
+        )
+        answer_worker.on_end(self.write_behind.drop_session)
+        answer_worker.listen()
+        try:
+            while not (await redis.pubsub_numsub(answer_worker.channel))[0][1]:
+                await asyncio.sleep(0.01)
+
+            await self.game.submit_answer(self.quiz_id, "u1", "A")
+            await scheduler_worker.publish_end(self.quiz_id)
+            for _ in range(100):
+                if not self.buffer.has_session(self.quiz_id):
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await answer_worker.close()
+
+        self.assertFalse(self.buffer.has_session(self.quiz_id))
+        self.assertEqual(self.participant()["currentQuestionIndex"], 1)
+        with self.assertRaises(self.write_behind.SessionEnded):
+            self.buffer.accept(self.quiz_id, "u1", 1, {"question_index": 1, "isCorrect": True}, True)
+
+
+class StartupCheckTests(SimpleTestCase):
+    def test_index_check_runs_in_the_background_and_gates_readiness(self):
+        import json
+        import threading
+        from django.test import RequestFactory
+        from quizmaster import indexes, views
+
+        release = threading.Event()
+        with mock.patch.object(indexes, "startup_check", side_effect=lambda **kwargs: release.wait(5)), \
+                mock.patch.object(views, "get_client"):
+            thread = indexes.start_background_check()  # returns while the check is still blocked
+            response = views.readyz(RequestFactory().get("/readyz"))
+            release.set()
+            thread.join(5)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(json.loads(response.content)["indexes"], "startup check still running")
+        self.assertFalse(indexes.check_pending())
+
+
+class StartQuizTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        from quiz import admission, ratelimit, scheduler
+
+        self.broadcasts = []
+
+        async def broadcast(quiz_id, event):
+            self.broadcasts.append(event)
+
+        for patch in (
+            mock.patch.object(admission, "_backend", admission.LocalAdmission()),
+            mock.patch.object(ratelimit, "ENABLED", False),
+            mock.patch.object(scheduler, "abroadcast_to_room", broadcast),
+            mock.patch.object(scheduler.scheduler, "is_leader", False),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.quiz_id = str(self.db.quizzes.insert_one({"title": "Q", "questions": [], "duration": 2}).inserted_id)
+        self.db.sessions.insert_one({"quiz_id": self.quiz_id, "host_id": "host", "status": "waiting"})
+
+    async def send_start(self, user_id):
+        import json
+        from quiz.consumers import QuizConsumer
+
+        consumer = QuizConsumer()
+        consumer.quiz_id, consumer.user_id = self.quiz_id, user_id
+        consumer.send_frame = mock.AsyncMock()
+        await consumer.receive(text_data=json.dumps({"action": "start_quiz", "duration": 5}))
+        return consumer.send_frame.await_args.args[0]
+
+    async def test_websocket_start_goes_through_the_conditional_start(self):
+        self.assertEqual((await self.send_start("player"))["status"], 403)
+        self.assertEqual(self.broadcasts, [])
+
+        self.assertEqual(await self.send_start("host"), {"type": "quiz_started", "duration": 120})
+        self.assertEqual(self.db.sessions.find_one({"quiz_id": self.quiz_id})["status"], "in_progress")
+        self.assertEqual([event["duration"] for event in self.broadcasts], [120])  # not the client's 5
+
+        self.assertEqual((await self.send_start("host"))["status"], 400)
+        self.assertEqual(len(self.broadcasts), 1)
+
+    async def test_a_quiz_without_duration_never_starts(self):
+        from quiz import scheduler
+
+        self.quiz_id = str(self.db.quizzes.insert_one({"title": "Q", "questions": [], "duration": 0}).inserted_id)
+        self.db.sessions.insert_one({"quiz_id": self.quiz_id, "host_id": "host", "status": "waiting"})
+
+        self.assertEqual((await self.send_start("host"))["message"], "Quiz has no duration.")
+        await scheduler.scheduler._fire_start(self.quiz_id)
+        self.assertEqual(self.db.sessions.find_one({"quiz_id": self.quiz_id})["status"], "waiting")
+        self.assertEqual(self.broadcasts, [])
+
+
+class SchedulerLeaderTests(MongoTestCase):
+    async def test_mongo_lease_elects_one_leader_without_redis(self):
+        from quiz import scheduler
+
+        first, second = scheduler.QuizScheduler(lock_ttl=10), scheduler.QuizScheduler(lock_ttl=10)
+        with mock.patch.object(scheduler, "get_async_redis", lambda: None):
+            self.assertTrue(await first._hold_leadership())
+            self.assertFalse(await second._hold_leadership())
+            self.assertTrue(await first._hold_leadership())  # renewed
+
+            self.db.leases.update_one({"_id": scheduler.LEADER_KEY}, {"$set": {"expires_at": datetime(2000, 1, 1)}})
+            self.assertTrue(await second._hold_leadership())
+            self.assertFalse(await first._hold_leadership())
+
+
+class SchedulerMiddlewareTests(SimpleTestCase):
+    async def test_starts_on_lifespan_startup(self):
+        from quiz import scheduler
+
+        app = mock.AsyncMock()
+        messages = iter([{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+        receive = mock.AsyncMock(side_effect=lambda: next(messages))
+        send = mock.AsyncMock()
+        with mock.patch.object(scheduler.scheduler, "ensure_started") as ensure_started:
+            await scheduler.SchedulerMiddleware(app)({"type": "lifespan"}, receive, send)
+            ensure_started.assert_called_once_with()
+            await scheduler.SchedulerMiddleware(app)({"type": "http"}, receive, send)  # servers without lifespan
+
+        self.assertEqual([c.args[0]["type"] for c in send.await_args_list], ["lifespan.startup.complete", "lifespan.shutdown.complete"])
+        app.assert_awaited_once()
+        self.assertEqual(ensure_started.call_count, 2)
@@ -10,6 +10,7 @@ urlpatterns = [
     path('<str:quiz_id>/start/', views.start_quiz, name='start_quiz'),  # Placeholder for join quiz view
     path('<str:quiz_id>/question/', views.get_current_question, name='get_current_question'),
     path('<str:quiz_id>/submit/', views.submit_answer, name='submit_answer'),
+    path('<str:quiz_id>/leaderboard/', views.get_leaderboard, name='get_leaderboard'),
     
 ]
      
\ No newline at end of file
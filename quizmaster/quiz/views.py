@@ -5,22 +5,116 @@ from rest_framework import status
 from django.views.decorators.csrf import csrf_exempt
 from .serializers import QuizCreateSerializer
 from .utils import is_valid_object_id
+from .quiz_cache import aget_compiled_quiz
+from .leaderboard import top_players, player_rank
+from . import game
+from . import admission
+from .roster import roster
+from .session_version import BUMP
+from .broadcast import abroadcast_to_room
+from .ratelimit import (
+    CreateThrottle, ReadThrottle, JoinThrottle, StartThrottle, QuestionThrottle, SubmitThrottle,
+)
 from accounts.authentication import CookieJWTAuthentication
-from rest_framework.decorators import authentication_classes, permission_classes
+from rest_framework.decorators import authentication_classes, permission_classes, throttle_classes
 from rest_framework.permissions import IsAuthenticated
-from quizmaster.mongo_client import quizzes_collection, sessions_collection
+from quizmaster import mongo_async
+from quizmaster.async_api import async_api_view
+from quizmaster.mongo_client import quizzes_collection, sessions_collection, participants_collection
 from bson import ObjectId
 from datetime import datetime
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+import hashlib
  
 
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def parse_page(request):
+    """Read ``?after=&limit=`` cursor pagination parameters; raises ValueError if invalid."""
+    after = request.query_params.get("after")
+    if after and not is_valid_object_id(after):
+        raise ValueError("after must be a valid id.")
+    try:
+        limit = int(request.query_params.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("limit must be an integer.")
+    return (ObjectId(after) if after else None), min(max(limit, 1), MAX_PAGE_SIZE)
+
+
+# Projections for session_participants documents
+PARTICIPANT_FIELDS = {"_id": 0, "session_id": 0, "quiz_id": 0}
+PARTICIPANT_SUMMARY = {"_id": 0, "session_id": 0, "answers": 0}
+
+# Fields get_sessions accepts in ?fields=, per part of the response
+SESSION_VIEW_FIELDS = {
+    "quiz": {
+        "title", "description", "topic", "difficulty", "duration", "start_time",
+        "max_participants", "pointsPerCorrect", "questions", "created_by", "created_at",
+    },
+    "session": {
+        "host_id", "status", "participant_count", "version", "created_at",
+        "startedAt", "endsAt", "finishedAt", "participants",
+    },
+}
+
+
+def parse_session_fields(raw):
+    """Parse ``?fields=quiz.title,session`` into ``{part: names}``; an empty set means the whole part."""
+    if not raw:
+        return {part: set() for part in SESSION_VIEW_FIELDS}
+    fields, whole = {}, set()
+    for item in filter(None, (item.strip() for item in raw.split(","))):
+        part, _, name = item.partition(".")
+        if part not in SESSION_VIEW_FIELDS or (name and name not in SESSION_VIEW_FIELDS[part]):
+            raise ValueError(f"Unknown field '{item}'.")
+        names = fields.setdefault(part, set())
+        if name:
+            names.add(name)
+        else:
+            whole.add(part)
+    for part in whole:
+        fields[part] = set()
+    return fields
+
+
+def quiz_projection(names, is_host):
+    """Quiz projection for ``names`` (all fields if empty); only the host gets the answers."""
+    if not names:
+        return None if is_host else {"questions.correct_answer": 0, "questions.explanation": 0}
+    projection = {name: 1 for name in names if name != "questions"}
+    if "questions" in names:
+        if is_host:
+            projection["questions"] = 1
+        else:
+            projection.update({"questions.question": 1, "questions.options": 1})
+    return projection
+
+
+def session_etag(version, is_host, fields):
+    """ETag for a get_sessions response: the session version plus what was asked for and by whom."""
+    shape = ";".join(f"{part}:{','.join(sorted(names))}" for part, names in sorted(fields.items()))
+    digest = hashlib.md5(f"{is_host}|{shape}".encode()).hexdigest()[:12]
+    return f'"{version}-{digest}"'
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison, as If-None-Match requires (compression may have weakened our ETag)."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
 
  
 @csrf_exempt
 @api_view(["POST"])
 @authentication_classes([CookieJWTAuthentication])
 @permission_classes([IsAuthenticated])
+@throttle_classes([CreateThrottle])
 def create_quiz(request):
      
     user = request.user 
@@ -37,7 +131,8 @@ def create_quiz(request):
         "quiz_id": str(quiz_result.inserted_id),
         "host_id": user_id,
         "status": "waiting",
-        "participants": [],
+        "participant_count": 0,  # participants live in session_participants
+        "version": 1,            # bumped on every change; see quiz/session_version.py
         "created_at": datetime.utcnow(),
     }
 
@@ -53,26 +148,65 @@ def create_quiz(request):
 @api_view(["GET"])
 @authentication_classes([CookieJWTAuthentication])
 @permission_classes([IsAuthenticated])
+@throttle_classes([ReadThrottle])
 def get_created_quiz_list(request):
-    """Retrieve all quizzes for the logged-in user and include session info."""
-    user_id = request.user["_id"]
+    """Retrieve the logged-in user's quizzes with session summary, newest first.
 
-    # Fetch quizzes created by this user
-    quizzes = list(quizzes_collection.find({"created_by": user_id}))
-    # Fetch sessions hosted by this user
-    sessions = list(sessions_collection.find({"host_id": user_id}))
+    Paginated with ``?after=<last _id>&limit=<n>``; ``next_cursor`` is null on the last page.
+    """
+    user_id = request.user["_id"]
+    try:
+        after, limit = parse_page(request)
+    except ValueError as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    match = {"created_by": user_id}
+    if after:
+        match["_id"] = {"$lt": after}
+
+    # One round trip: quizzes joined to their session, projected to summary fields
+    quizzes = list(quizzes_collection.aggregate([
+        {"$match": match},
+        {"$sort": {"_id": -1}},
+        {"$limit": limit + 1},
+        {"$lookup": {
+            "from": sessions_collection.name,
+            "let": {"quiz_id": {"$toString": "$_id"}},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$quiz_id", "$$quiz_id"]}}},
+                {"$project": {"_id": 0, "status": 1, "participant_count": 1}},
+            ],
+            "as": "session",
+        }},
+        {"$project": {
+            "title": 1,
+            "description": 1,
+            "topic": 1,
+            "difficulty": 1,
+            "duration": 1,
+            "start_time": 1,
+            "max_participants": 1,
+            "pointsPerCorrect": 1,
+            "created_by": 1,
+            "created_at": 1,
+            "questionCount": {"$size": {"$ifNull": ["$questions", []]}},
+            "session": {"$first": "$session"},
+        }},
+    ]))
+
+    next_cursor = None
+    if len(quizzes) > limit:
+        quizzes = quizzes[:limit]
+        next_cursor = quizzes[-1]["_id"]
 
     data = []
 
     for quiz in quizzes:
-        quiz_id = str(quiz["_id"])
-
-        # Find matching session (if exists)
-        session = next((s for s in sessions if str(s.get("quiz_id")) == quiz_id), None)
+        session = quiz.get("session") or {}
 
         # Build response object
         quiz_obj = {
-            "_id": quiz_id,
+            "_id": quiz["_id"],
             "title": quiz.get("title"),
             "description": quiz.get("description"),
             "topic": quiz.get("topic"),
@@ -81,40 +215,98 @@ def get_created_quiz_list(request):
             "start_time": quiz.get("start_time"),
             "max_participants": quiz.get("max_participants"),
             "pointsPerCorrect": quiz.get("pointsPerCorrect"),
-            "questionCount": len(quiz.get("questions", [])),
+            "questionCount": quiz["questionCount"],
             "host_id": str(quiz.get("created_by")),
-            "status": session.get("status") if session else None,
-            "participants": session.get("participants", []) if session else [],
+            "status": session.get("status"),
+            "participantCount": session.get("participant_count", 0),
             "created_at": quiz.get("created_at"),
         }
 
         data.append(quiz_obj)
 
-    return Response({"quizzes": data}, status=status.HTTP_200_OK)
+    return Response({"quizzes": data, "next_cursor": next_cursor}, status=status.HTTP_200_OK)
 
 
 @api_view(["GET"])
 @authentication_classes([CookieJWTAuthentication])
 @permission_classes([IsAuthenticated])
+@throttle_classes([ReadThrottle])
 def get_enrolled_quiz_list(request):
-    """Retrieve all quizzes the user has joined as a participant."""
-    user_id = request.user["_id"]
+    """Retrieve the quizzes the user has joined as a participant, most recent first.
 
-    # Fetch sessions where the user is a participant
-    sessions = list(sessions_collection.find({"participants.user_id": user_id}))
+    Paginated with ``?after=<cursor>&limit=<n>``. ``?participants=self`` (default)
+    returns only the caller's own entry; ``?participants=all`` returns every
+    participant's summary (without answers).
+    """
+    user_id = request.user["_id"]
+    try:
+        after, limit = parse_page(request)
+    except ValueError as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    scope = request.query_params.get("participants", "self")
+    if scope not in ("self", "all"):
+        return Response({"detail": "participants must be 'self' or 'all'."}, status=status.HTTP_400_BAD_REQUEST)
+
+    # The user's own participant documents drive the page
+    match = {"user_id": user_id}
+    if after:
+        match["_id"] = {"$lt": after}
+    entries = list(
+        participants_collection.find(match, {"session_id": 0}).sort("_id", -1).limit(limit + 1)
+    )
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = entries[-1]["_id"]
+
+    quiz_ids = [e["quiz_id"] for e in entries]
+
+    # Batched lookups instead of one query per enrollment
+    quizzes = {
+        str(q["_id"]): q
+        for q in quizzes_collection.aggregate([
+            {"$match": {"_id": {"$in": [ObjectId(qid) for qid in quiz_ids]}}},
+            {"$project": {
+                "title": 1,
+                "description": 1,
+                "topic": 1,
+                "difficulty": 1,
+                "duration": 1,
+                "start_time": 1,
+                "max_participants": 1,
+                "pointsPerCorrect": 1,
+                "created_by": 1,
+                "created_at": 1,
+                "questionCount": {"$size": {"$ifNull": ["$questions", []]}},
+            }},
+        ])
+    }
+    sessions = {
+        s["quiz_id"]: s
+        for s in sessions_collection.find(
+            {"quiz_id": {"$in": quiz_ids}}, {"_id": 0, "quiz_id": 1, "status": 1, "participant_count": 1}
+        )
+    }
+    everyone = {}
+    if scope == "all":
+        for p in participants_collection.find({"quiz_id": {"$in": quiz_ids}}, PARTICIPANT_SUMMARY):
+            everyone.setdefault(p["quiz_id"], []).append(p)
 
     data = []
 
-    for session in sessions:
-        quiz_id = session.get("quiz_id")
-        quiz = quizzes_collection.find_one({"_id": ObjectId(quiz_id)})
+    for entry in entries:
+        quiz_id = entry["quiz_id"]
+        quiz = quizzes.get(quiz_id)
 
         if not quiz:
             continue
+
+        session = sessions.get(quiz_id, {})
+        entry.pop("_id")
  
         # Build response object
         quiz_obj = {
-            "_id": str(quiz["_id"]),
+            "_id": quiz_id,
             "title": quiz.get("title"),
             "description": quiz.get("description"),
             "topic": quiz.get("topic"),
@@ -123,45 +315,79 @@ def get_enrolled_quiz_list(request):
             "start_time": quiz.get("start_time"),
             "max_participants": quiz.get("max_participants"),
             "pointsPerCorrect": quiz.get("pointsPerCorrect"),
-            "questionCount": len(quiz.get("questions", [])),
+            "questionCount": quiz["questionCount"],
             "host_id": str(quiz.get("created_by")),
             "status": session.get("status"),
-            "participants": session.get("participants", []),
+            "participantCount": session.get("participant_count", 0),
+            "participants": everyone.get(quiz_id, []) if scope == "all" else [entry],
             "created_at": quiz.get("created_at"),
         }
 
         data.append(quiz_obj)
 
-    return Response({"quizzes": data}, status=status.HTTP_200_OK)
+    return Response({"quizzes": data, "next_cursor": next_cursor}, status=status.HTTP_200_OK)
 
 @api_view(["GET"])
 @authentication_classes([CookieJWTAuthentication])
 @permission_classes([IsAuthenticated])
+@throttle_classes([ReadThrottle])
 def get_sessions(request, quiz_id):
-    """Retrieve a quiz by ObjectId string and return a JSON-serializable document."""
-  
-    session = sessions_collection.find_one({"quiz_id": quiz_id})
-    quiz = quizzes_collection.find_one({"_id": ObjectId(quiz_id)})
-    if not session:
+    """Retrieve a quiz with its session and participants.
+
+    ``?fields=`` narrows the response, e.g. ``?fields=quiz.title,session.status,session.participants``
+    (a bare ``quiz`` or ``session`` selects the whole part). Responses carry an ETag derived from
+    the session ``version``; a matching ``If-None-Match`` gets a 304 after one indexed lookup.
+    Only the host sees ``correct_answer`` and other players' answers. ObjectIds and datetimes are encoded by the renderer.
+    """
+    if not is_valid_object_id(quiz_id):
         return Response({"detail": "Quiz not found."}, status=status.HTTP_404_NOT_FOUND)
-    if not quiz:
+    try:
+        fields = parse_session_fields(request.query_params.get("fields"))
+    except ValueError as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    head = sessions_collection.find_one({"quiz_id": quiz_id}, {"version": 1, "host_id": 1})
+    if not head:
         return Response({"detail": "Quiz not found."}, status=status.HTTP_404_NOT_FOUND)
+    is_host = head.get("host_id") == request.user["_id"]
 
-    session["_id"] = str(session["_id"])
-    quiz["_id"] = str(quiz["_id"])
-    
-    response = {
-        "quiz": quiz,
-        "session": session
-    }
-    return Response(response, status=status.HTTP_200_OK)
- 
+    etag = session_etag(head.get("version", 0), is_host, fields)
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    response = {}
+    if "quiz" in fields:
+        quiz = quizzes_collection.find_one({"_id": ObjectId(quiz_id)}, quiz_projection(fields["quiz"], is_host))
+        if not quiz:
+            return Response({"detail": "Quiz not found."}, status=status.HTTP_404_NOT_FOUND)
+        response["quiz"] = quiz
+    if "session" in fields:
+        wanted = fields["session"]
+        projection = ({name: 1 for name in wanted if name != "participants"} or {"_id": 1}) if wanted else None
+        session = sessions_collection.find_one({"quiz_id": quiz_id}, projection)
+        if not session:
+            return Response({"detail": "Quiz not found."}, status=status.HTTP_404_NOT_FOUND)
+        if not wanted or "participants" in wanted:
+            session["participants"] = list(
+                participants_collection.find(
+                    {"quiz_id": quiz_id}, PARTICIPANT_FIELDS if is_host else PARTICIPANT_SUMMARY
+                ).sort("joinedAt", 1)
+            )
+        response["session"] = session
+
+    return Response(response, status=status.HTTP_200_OK, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+
+# The live-game endpoints below are async (adrf): they await Mongo and the
+# channel layer directly instead of blocking a worker thread. Authentication
+# and throttling are awaited too (see quizmaster/async_api.py).
 
 @csrf_exempt
-@api_view(["POST"])
+@async_api_view(["POST"])
 @authentication_classes([CookieJWTAuthentication])
 @permission_classes([IsAuthenticated])
-def join_quiz(request, quiz_id):
+@throttle_classes([JoinThrottle])
+async def join_quiz(request, quiz_id):
     
     print("Joining quiz:", quiz_id)
     user = request.user 
@@ -169,234 +395,147 @@ def join_quiz(request, quiz_id):
     username = user.get("username")
  
     # First check if quiz exists
-    quiz = quizzes_collection.find_one({"_id": ObjectId(quiz_id)})
+    quiz = await aget_compiled_quiz(quiz_id)
     if not quiz:
         return Response({"detail": "Quiz not found."}, status=status.HTTP_404_NOT_FOUND)
     
-    max_participants = quiz.get("max_participants", 0)
-
-    new_participant = {
-        "user_id": user_id,
-        "username": username,
-        "score": 0,
-        "currentQuestionIndex": 0,
-        "answers": [],
-        "joinedAt": datetime.utcnow()
-    }
+    max_participants = quiz.max_participants
 
-    # Atomic update: Only add participant if:
-    # 1. Session exists and status is "waiting"
-    # 2. User hasn't already joined
-    # 3. Room is not full (participants count < max_participants)
-    result = sessions_collection.find_one_and_update(
-        {
+    # O(1) admission check before touching Mongo; rejects with the precise reason
+    outcome = await admission.admit(quiz_id, user_id, max_participants)
+    if outcome == admission.UNKNOWN:
+        return Response({"detail": "Quiz session not found."}, status=status.HTTP_404_NOT_FOUND)
+    if outcome == admission.STARTED:
+        return Response({"detail": "Cannot join. Quiz already started."}, status=status.HTTP_400_BAD_REQUEST)
+    if outcome == admission.DUPLICATE:
+        return Response({"detail": "User already joined the quiz."}, status=status.HTTP_400_BAD_REQUEST)
+    if outcome == admission.FULL:
+        return Response({"detail": "Quiz is full."}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        # Atomic seat reservation (Mongo stays authoritative): only succeeds if
+        # 1. Session exists and status is "waiting"
+        # 2. Room is not full (participant_count < max_participants)
+        session = await mongo_async.sessions.find_one_and_update(
+            {
+                "quiz_id": quiz_id,
+                "status": "waiting",
+                "participant_count": {"$lt": max_participants}  # Room not full
+            },
+            {"$inc": {"participant_count": 1, **BUMP}},
+            projection={"_id": 1}
+        )
+
+        if session is None:
+            # Admission state disagreed with Mongo (rare) - give the seat back and determine why
+            await admission.release(quiz_id, user_id)
+            session = await mongo_async.sessions.get_by_quiz(quiz_id, {"status": 1, "participant_count": 1})
+            if not session:
+                return Response({"detail": "Quiz session not found."}, status=status.HTTP_404_NOT_FOUND)
+            if session["status"] != "waiting":
+                return Response({"detail": "Cannot join. Quiz already started."}, status=status.HTTP_400_BAD_REQUEST)
+            if await mongo_async.participants.get(quiz_id, user_id, {"_id": 1}):
+                return Response({"detail": "User already joined the quiz."}, status=status.HTTP_400_BAD_REQUEST)
+            if session.get("participant_count", 0) >= max_participants:
+                return Response({"detail": "Quiz is full."}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({"detail": "Could not join quiz."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # One document per (session_id, user_id); an existing one means a duplicate join
+        inserted = await mongo_async.participants.insert_if_absent(str(session["_id"]), user_id, {
             "quiz_id": quiz_id,
-            "status": "waiting",
-            "participants.user_id": {"$ne": user_id},  # User not already in list
-            "$expr": {"$lt": [{"$size": "$participants"}, max_participants]}  # Room not full
-        },
-        {"$push": {"participants": new_participant}},
-        return_document=False  # Return original doc (before update)
-    )
-
-    if result is None:
-        # Update failed - determine why
-        session = sessions_collection.find_one({"quiz_id": quiz_id})
-        if not session:
-            return Response({"detail": "Quiz session not found."}, status=status.HTTP_404_NOT_FOUND)
-        if session["status"] != "waiting":
-            return Response({"detail": "Cannot join. Quiz already started."}, status=status.HTTP_400_BAD_REQUEST)
-        if any(p["user_id"] == user_id for p in session.get("participants", [])):
-            return Response({"detail": "User already joined the quiz."}, status=status.HTTP_400_BAD_REQUEST)
-        if len(session.get("participants", [])) >= max_participants:
-            return Response({"detail": "Quiz is full."}, status=status.HTTP_400_BAD_REQUEST)
-        return Response({"detail": "Could not join quiz."}, status=status.HTTP_400_BAD_REQUEST)
-
-    # Notify other participants via WebSocket
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        f"quiz_{quiz_id}",
-        {
-            "type": "broadcast_participant_joined",
-            "user_id": user_id,
-            "username": username
-        }
-    )
+            "username": username,
+            "score": 0,
+            "currentQuestionIndex": 0,
+            "answers": [],
+            "joinedAt": datetime.utcnow()
+        })
+    except Exception:
+        # Mongo failed after admission took the seat: give it back so a retry is not
+        # rejected as a duplicate. Mongo's participant_count is left as is - the write
+        # may have been applied - so the room can only come out short, never over.
+        await admission.release(quiz_id, user_id)
+        raise
+
+    if not inserted:
+        # Give the reserved seat back
+        await mongo_async.sessions.update_by_id(session["_id"], {"$inc": {"participant_count": -1, **BUMP}})
+        return Response({"detail": "User already joined the quiz."}, status=status.HTTP_400_BAD_REQUEST)
+
+    await game.record_score(quiz_id, user_id, username, 0)
+
+    # Notify other participants via WebSocket (coalesced into roster_delta frames)
+    roster.record_join(quiz_id, user_id, username)
 
     return Response({"message": "Joined the quiz successfully."}, status=status.HTTP_200_OK)
 
 
 @csrf_exempt
-@api_view(["POST"])
+@async_api_view(["POST"])
 @authentication_classes([CookieJWTAuthentication])
 @permission_classes([IsAuthenticated])
-def start_quiz(request, quiz_id):
+@throttle_classes([StartThrottle])
+async def start_quiz(request, quiz_id):
     user = request.user 
     user_id = user["_id"]
  
-    quiz_session = sessions_collection.find_one({"quiz_id": quiz_id})
-    
-    if not quiz_session:
-        return Response({"detail": "Quiz session not found."}, status=status.HTTP_404_NOT_FOUND)
-    
-    if quiz_session["host_id"] != user_id:
-        return Response({"detail": "Only the host can start the quiz."}, status=status.HTTP_403_FORBIDDEN)
-    
-    sessions_collection.update_one(
-        {"quiz_id": quiz_id},
-        {"$set": {"status": "in_progress", "startedAt": datetime.utcnow()}}
-    )
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        f"quiz_{quiz_id}",  # Group Name
-        {
-            "type": "broadcast_game_start", # Function to call in consumer
-            "duration": 60 # You might want to fetch actual duration from the quiz object
-        }
-    )
+    try:
+        await game.start_quiz(quiz_id, user_id)
+    except game.GameError as e:
+        return Response({"detail": e.detail}, status=e.status_code)
 
     return Response({"message": "Quiz started successfully."}, status=status.HTTP_200_OK)
 
 
-@api_view(["GET"])
+@async_api_view(["GET"])
 @authentication_classes([CookieJWTAuthentication])
 @permission_classes([IsAuthenticated])
-def get_current_question(request, quiz_id):
+@throttle_classes([QuestionThrottle])
+async def get_current_question(request, quiz_id):
     """Return the participant's current question (without the correct answer).
 
     Response contains: question_index, question, options, total_questions.
     """
-    user = request.user
-    user_id = user["_id"]
-
-    # session must exist
-    quiz_session = sessions_collection.find_one({"quiz_id": quiz_id})
-    if not quiz_session:
-        return Response({"detail": "Quiz session not found."}, status=status.HTTP_404_NOT_FOUND)
-
-    # find participant
-    participants = quiz_session.get("participants", [])
-    participant = next((p for p in participants if p["user_id"] == user_id), None)
-    if not participant:
-        return Response({"detail": "User not a participant in this quiz."}, status=status.HTTP_403_FORBIDDEN)
-
-    # validate quiz existence and id
-    if not is_valid_object_id(quiz_id):
-        return Response({"detail": "Quiz not found."}, status=status.HTTP_404_NOT_FOUND)
-
-    quiz = quizzes_collection.find_one({"_id": ObjectId(str(quiz_id))})
-    if not quiz:
-        return Response({"detail": "Quiz not found."}, status=status.HTTP_404_NOT_FOUND)
-
-    current_index = participant.get("currentQuestionIndex", 0)
-    if current_index is None:
-        current_index = 0
-
-    questions = quiz.get("questions", [])
-    total = len(questions)
-
-    if current_index >= total:
-        return Response({"detail": "No more questions left."}, status=status.HTTP_400_BAD_REQUEST)
-
-    q = questions[current_index]
-    # Do not expose correct_answer
-    question_payload = {
-        "question_index": current_index,
-        "question": q.get("question"),
-        "options": q.get("options", []),
-        "total_questions": total,
-    }
+    user_id = request.user["_id"]
+    try:
+        question_payload = await game.get_current_question(quiz_id, user_id)
+    except game.GameError as e:
+        return Response({"detail": e.detail}, status=e.status_code)
     return Response(question_payload, status=status.HTTP_200_OK)
 
 
 @csrf_exempt
-@api_view(["POST"])
+@async_api_view(["POST"])
 @authentication_classes([CookieJWTAuthentication])
 @permission_classes([IsAuthenticated])
-def submit_answer(request, quiz_id):
+@throttle_classes([SubmitThrottle])
+async def submit_answer(request, quiz_id):
     """
     Evaluates answer, pushes to history, increments score/index atomically.
-    Prevents race conditions using optimistic locking.
+    Prevents race conditions using optimistic locking (see quiz/game.py).
     """
-    user = request.user
-    user_id = user["_id"] # Ensure this matches your DB format (str vs ObjectId)
-
-    selected_answer = request.data.get("answer")
-    if selected_answer is None:
-        return Response({"detail": "selected_answer is required."}, status=status.HTTP_400_BAD_REQUEST)
-
-    # 1. Validate Quiz ID and Fetch Quiz (Questions)
-    if not is_valid_object_id(quiz_id):
-        return Response({"detail": "Invalid Quiz ID."}, status=status.HTTP_400_BAD_REQUEST)
-        
-    quiz = quizzes_collection.find_one({"_id": ObjectId(str(quiz_id))})
-    if not quiz:
-        return Response({"detail": "Quiz not found."}, status=status.HTTP_404_NOT_FOUND)
-
-    # 2. Fetch ONLY the specific participant from the session
-    # We filter by quiz_id AND user_id immediately
-    quiz_session = sessions_collection.find_one(
-        {"quiz_id": quiz_id, "participants.user_id": user_id},
-        {"status": 1, "participants.$": 1} # Projection: Fetch only the matching participant
-    )
-
-    if not quiz_session:
-        return Response({"detail": "Session not found or user not a participant."}, status=status.HTTP_404_NOT_FOUND)
-        
-    if quiz_session.get("status") != "in_progress":
-        return Response({"detail": "Quiz is not in progress."}, status=status.HTTP_400_BAD_REQUEST)
-
-    # Extract participant data (Projection ensures list has exactly 1 item)
-    participant = quiz_session["participants"][0]
-    current_index = participant.get("currentQuestionIndex", 0)
+    user_id = request.user["_id"] # Ensure this matches your DB format (str vs ObjectId)
+    try:
+        result = await game.submit_answer(
+            quiz_id, user_id, request.data.get("answer"), request.data.get("question_index")
+        )
+    except game.GameError as e:
+        return Response({"detail": e.detail}, status=e.status_code)
+    return Response(result, status=status.HTTP_200_OK)
 
-    questions = quiz.get("questions", [])
-    
-    # 3. Check if quiz is finished
-    if current_index >= len(questions):
-        return Response({"detail": "No more questions left."}, status=status.HTTP_400_BAD_REQUEST)
-
-    # 4. Evaluate Answer
-    current_question = questions[current_index]
-    correct_answer = current_question.get("correct_answer")
-    is_correct = (selected_answer == correct_answer)
-
-    answer_record = {
-        "question_index": current_index,
-        "selectedOption": selected_answer,
-        "isCorrect": is_correct,
-    }
-
-    # 5. Atomic Update with Optimistic Locking
-    # We define what we want to change
-    update_ops = {
-        "$push": {"participants.$.answers": answer_record}, # Append efficiently
-        "$inc": {"participants.$.currentQuestionIndex": 1}  # Increment atomically
-    }
-
-    # If correct, we also increment the score atomically
-    if is_correct:
-        update_ops["$inc"]["participants.$.score"] = 1
-
-    # EXECUTE UPDATE
-    # The filter includes 'participants.currentQuestionIndex': current_index
-    # This prevents race conditions. If the index changed while we were calculating,
-    # this update will fail (match count 0), preventing double submission.
-    result = sessions_collection.update_one(
-        {
-            "quiz_id": quiz_id, 
-            "participants.user_id": user_id,
-            "participants.currentQuestionIndex": current_index 
-        },
-        update_ops
-    )
 
-    if result.matched_count == 0:
-        # This happens if the user double-clicked and the index already moved forward
-        return Response({"detail": "Answer already submitted for this question."}, status=status.HTTP_409_CONFLICT)
+@api_view(["GET"])
+@authentication_classes([CookieJWTAuthentication])
+@permission_classes([IsAuthenticated])
+@throttle_classes([ReadThrottle])
+def get_leaderboard(request, quiz_id):
+    """Return the top players and the caller's own rank (``?limit=`` caps the list)."""
+    user_id = request.user["_id"]
+    try:
+        limit = min(max(int(request.query_params.get("limit", 10)), 1), 100)
+    except ValueError:
+        return Response({"detail": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
 
     return Response({
-        "is_correct": is_correct, 
-        "correct_answer": correct_answer, # Optional: return correct answer to user
-        "next_question_index": current_index + 1
-    }, status=status.HTTP_200_OK)
\ No newline at end of file
+        "top_players": top_players(quiz_id, limit),
+        "me": player_rank(quiz_id, user_id),
+    }, status=status.HTTP_200_OK)
@@ -16,8 +16,16 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'quizmaster.settings')
 
 django_asgi_app = get_asgi_application()
 
+# Verify (optionally create) Mongo indexes once per server process, in the
+# background: with Mongo down it would otherwise block until server selection times out
+from django.conf import settings
+from quizmaster.indexes import start_background_check
+if settings.MONGO_INDEXES.get("CHECK_ON_STARTUP"):
+    start_background_check(create=settings.MONGO_INDEXES.get("CREATE_ON_STARTUP", False))
+
 # Import routing and middleware after Django setup
 from quiz.routing import websocket_urlpatterns
+from quiz.scheduler import SchedulerMiddleware, ENABLED as scheduler_enabled
 from quizmaster.token_auth import JwtAuthMiddleware
 
 application = ProtocolTypeRouter({
@@ -28,3 +36,7 @@ application = ProtocolTypeRouter({
         )
     ),
 })
+
+# The quiz clock runs on the event loop of each server process (one leader ticks)
+if scheduler_enabled:
+    application = SchedulerMiddleware(application)
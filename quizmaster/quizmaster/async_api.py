@@ -0,0 +1,84 @@
+"""adrf views whose authentication and throttling stay on the event loop.
+
+adrf runs ``APIView.initial()`` through ``sync_to_async``, so every request to
+an async view paid a thread hop plus a sync Mongo/Redis call for the principal
+and the rate limit. ``AsyncAPIView`` awaits ``aauthenticate`` /
+``aallow_request`` where the authenticator or throttle provides them and only
+falls back to a thread for ones that do not.
+"""
+from adrf.decorators import api_view as adrf_api_view
+from adrf.views import APIView
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from rest_framework import exceptions
+
+
+class AsyncAPIView(APIView):
+    async def async_dispatch(self, request, *args, **kwargs):
+        # adrf's async_dispatch, with ainitial() awaited instead of initial() in a thread
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.ainitial(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def ainitial(self, request, *args, **kwargs):
+        """``initial()`` for async views (permission classes here do no I/O, so they run as is)."""
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        request.accepted_renderer, request.accepted_media_type = self.perform_content_negotiation(request)
+        request.version, request.versioning_scheme = self.determine_version(request, *args, **kwargs)
+        await self.aperform_authentication(request)
+        self.check_permissions(request)
+        await self.acheck_throttles(request)
+
+    async def aperform_authentication(self, request):
+        for authenticator in request.authenticators:
+            authenticate = getattr(authenticator, "aauthenticate", None) or sync_to_async(authenticator.authenticate)
+            try:
+                user_auth = await authenticate(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+            if user_auth is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth
+                return
+        request._not_authenticated()
+
+    async def acheck_throttles(self, request):
+        durations = []
+        for throttle in self.get_throttles():
+            allow_request = getattr(throttle, "aallow_request", None) or sync_to_async(throttle.allow_request)
+            if not await allow_request(request, self):
+                durations.append(throttle.wait())
+        if durations:
+            self.throttled(request, max((d for d in durations if d is not None), default=None))
+
+
+def async_api_view(http_method_names=None):
+    """adrf's ``@api_view`` for async views, built on ``AsyncAPIView``."""
+    decorator = adrf_api_view(http_method_names)
+
+    def wrap(func):
+        view_class = decorator(func).cls
+        return type(view_class.__name__, (AsyncAPIView, view_class), {
+            "__doc__": view_class.__doc__,
+            "__module__": view_class.__module__,
+        }).as_view()
+
+    return wrap
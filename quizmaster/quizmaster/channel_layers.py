@@ -0,0 +1,24 @@
+"""Channel layer backends that time ``group_send`` (see ``quizmaster/metrics.py``)."""
+import time
+
+from channels.layers import InMemoryChannelLayer
+from channels_redis.core import RedisChannelLayer
+
+from quizmaster.metrics import group_send_duration
+
+
+class GroupSendMetricsMixin:
+    async def group_send(self, group, message):
+        started = time.perf_counter()
+        try:
+            return await super().group_send(group, message)
+        finally:
+            group_send_duration.observe(time.perf_counter() - started, message.get("type", ""))
+
+
+class InstrumentedRedisChannelLayer(GroupSendMetricsMixin, RedisChannelLayer):
+    pass
+
+
+class InstrumentedInMemoryChannelLayer(GroupSendMetricsMixin, InMemoryChannelLayer):
+    pass
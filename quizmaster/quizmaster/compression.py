@@ -0,0 +1,79 @@
+"""Response compression: brotli when the client accepts it (and ``brotli`` is
+installed), gzip otherwise. Bodies under ``COMPRESSION["MIN_SIZE"]`` are sent
+as is, since compressing them costs more than it saves."""
+import gzip
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+_config = getattr(settings, "COMPRESSION", {})
+
+MIN_SIZE = _config.get("MIN_SIZE", 1024)
+GZIP_LEVEL = _config.get("GZIP_LEVEL", 6)
+BROTLI_QUALITY = _config.get("BROTLI_QUALITY", 4)
+
+_accepts_br = re.compile(r"\bbr\b")
+_accepts_gzip = re.compile(r"\bgzip\b")
+
+
+def _choose_encoding(accept_encoding):
+    if brotli is not None and _accepts_br.search(accept_encoding):
+        return "br"
+    if _accepts_gzip.search(accept_encoding):
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    @staticmethod
+    def compress(request, response):
+        if (
+            response.streaming
+            or response.has_header("Content-Encoding")
+            or len(response.content) < MIN_SIZE
+        ):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = _choose_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+
+        if encoding == "br":
+            compressed = brotli.compress(response.content, quality=BROTLI_QUALITY)
+        else:
+            compressed = gzip.compress(response.content, compresslevel=GZIP_LEVEL, mtime=0)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+        # The bytes differ from the uncompressed representation
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        return response
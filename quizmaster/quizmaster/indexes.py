@@ -0,0 +1,146 @@
+"""Index declarations for the Mongo collections and checks that hot queries use them."""
+import logging
+import threading
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure, PyMongoError
+
+from quizmaster.mongo_client import db
+
+logger = logging.getLogger(__name__)
+
+# collection name -> indexes the application relies on
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "quizzes": [
+        IndexModel([("created_by", ASCENDING), ("_id", DESCENDING)], name="created_by_id"),
+        IndexModel([("start_time", ASCENDING)], name="start_time"),
+    ],
+    "sessions": [
+        IndexModel([("quiz_id", ASCENDING)], name="quiz_id_unique", unique=True),
+        IndexModel([("host_id", ASCENDING)], name="host_id"),
+        IndexModel([("status", ASCENDING)], name="status"),
+    ],
+    "session_participants": [
+        IndexModel([("session_id", ASCENDING), ("user_id", ASCENDING)], name="session_user_unique", unique=True),
+        IndexModel([("quiz_id", ASCENDING), ("user_id", ASCENDING)], name="quiz_user"),
+        IndexModel([("user_id", ASCENDING), ("_id", DESCENDING)], name="user_id"),
+    ],
+}
+
+# Query shapes on the request hot path; each must be served by an index.
+HOT_QUERIES = [
+    ("users", {"email": "probe@example.com"}),
+    ("quizzes", {"created_by": "probe"}),
+    ("sessions", {"quiz_id": "probe"}),
+    ("sessions", {"host_id": "probe"}),
+    ("sessions", {"status": "in_progress"}),
+    ("session_participants", {"quiz_id": "probe", "user_id": "probe"}),
+    ("session_participants", {"quiz_id": "probe"}),
+    ("session_participants", {"user_id": "probe"}),
+]
+
+# Result of the most recent startup_check(); an empty list means healthy.
+last_check_problems = None
+_check_thread = None
+
+
+def ensure_indexes(database=db):
+    """Create every declared index. Idempotent; returns the names created or confirmed."""
+    names = []
+    for collection, models in INDEXES.items():
+        names.extend(database[collection].create_indexes(models))
+    return names
+
+
+def index_report(database=db):
+    """Return ``{collection: {"missing": [...], "undeclared": [...], "unused": [...]}}``."""
+    report = {}
+    for collection, models in INDEXES.items():
+        declared = {model.document["name"]: list(model.document["key"].items()) for model in models}
+        existing = {
+            name: [tuple(field) for field in info["key"]]
+            for name, info in database[collection].index_information().items()
+            if name != "_id_"
+        }
+        # Matched by key pattern, so an equivalent index under another name still counts
+        missing = [name for name, key in declared.items() if key not in existing.values()]
+        undeclared = [name for name in existing if name not in declared]
+        try:
+            usage = database[collection].aggregate([{"$indexStats": {}}])
+            unused = sorted(
+                stat["name"] for stat in usage
+                if stat["name"] != "_id_" and stat["accesses"]["ops"] == 0
+            )
+        except OperationFailure:
+            unused = []  # $indexStats needs the clusterMonitor role
+        report[collection] = {"missing": missing, "undeclared": undeclared, "unused": unused}
+    return report
+
+
+def _plan_stages(plan):
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan", "winningPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+def explain_hot_queries(database=db):
+    """Return ``[(collection, filter, stages)]`` for every hot query shape."""
+    results = []
+    for collection, query in HOT_QUERIES:
+        explain = database[collection].find(query).explain()
+        stages = list(_plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {})))
+        results.append((collection, query, stages))
+    return results
+
+
+def collscan_queries(database=db):
+    return [
+        (collection, query) for collection, query, stages in explain_hot_queries(database)
+        if "COLLSCAN" in stages
+    ]
+
+
+def startup_check(create=False, database=db):
+    """Verify indexes when a server process starts; problems are logged and kept for readiness."""
+    global last_check_problems
+    problems = []
+    try:
+        if create:
+            ensure_indexes(database)
+        for collection, info in index_report(database).items():
+            for name in info["missing"]:
+                problems.append(f"missing index {collection}.{name}")
+        for collection, query in collscan_queries(database):
+            problems.append(f"COLLSCAN for {collection}.find({query})")
+    except PyMongoError as e:
+        problems.append(f"index check failed: {e}")
+    for problem in problems:
+        logger.warning(problem)
+    last_check_problems = problems
+    return problems
+
+
+def start_background_check(create=False, database=db):
+    """Run ``startup_check`` on a daemon thread, so a slow or unreachable Mongo
+    does not hold up server start."""
+    global _check_thread
+    _check_thread = threading.Thread(
+        target=startup_check, kwargs={"create": create, "database": database},
+        name="mongo-index-check", daemon=True,
+    )
+    _check_thread.start()
+    return _check_thread
+
+
+def check_pending():
+    """True while the background startup check is still running."""
+    return _check_thread is not None and _check_thread.is_alive()
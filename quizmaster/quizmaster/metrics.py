@@ -0,0 +1,331 @@
+"""Process-local metrics in the Prometheus text format, served at ``/metrics``.
+
+Hot paths never take a lock: every thread (each event loop, each sync worker
+thread) writes to its own shard, and shards are only summed when ``/metrics``
+is scraped. When a thread exits, its shard is folded into one shared
+"retired" shard, so short-lived threads (timers, ``async_to_sync`` helpers)
+do not pile up. Each worker process exposes its own numbers; scrape every
+worker.
+"""
+import ipaddress
+import itertools
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from pymongo import monitoring
+
+# Seconds; covers sub-millisecond Mongo commands up to slow HTTP requests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = []
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = {}  # token -> values of a live thread
+        self._retired = {}  # everything written by threads that have exited
+        self._tokens = itertools.count()
+        self._shards_lock = threading.Lock()  # taken when a thread's shard is created or retired, and on scrape
+        REGISTRY.append(self)
+
+    def _shard(self):
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            token = next(self._tokens)
+            # The owner lives in thread-local storage, so it is freed when the thread exits
+            owner = self._local.owner = _ShardOwner()
+            weakref.finalize(owner, self._retire, token)
+            with self._shards_lock:
+                self._shards[token] = values
+            return values
+
+    def _retire(self, token):
+        with self._shards_lock:
+            for labels, value in self._shards.pop(token, {}).items():
+                self._add(self._retired, labels, value)
+
+    def _add(self, merged, labels, value):
+        raise NotImplementedError
+
+    def _merged(self):
+        merged = {}
+        with self._shards_lock:
+            for shard in [self._retired, *self._shards.values()]:
+                for labels, value in list(shard.items()):
+                    self._add(merged, labels, value)
+        return merged
+
+    def values(self):
+        """``{labels: value}`` summed over all threads."""
+        return self._merged()
+
+    def value(self, *labels):
+        return self._merged().get(labels, 0)
+
+    def reset(self):
+        with self._shards_lock:
+            self._retired.clear()
+            for shard in self._shards.values():
+                shard.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(self._merged().items()):
+            lines.extend(self._lines(labels, value))
+        return lines
+
+    def _labels(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def _add(self, merged, labels, value):
+        merged[labels] = merged.get(labels, 0) + value
+
+    def _lines(self, labels, value):
+        yield f"{self.name}{self._labels(labels)} {value}"
+
+
+class Gauge(Counter):
+    """A counter that may go down.
+
+    Series that reach zero are dropped, so a gauge labelled by room forgets
+    the room once it empties (as long as a room's ups and downs happen on
+    one thread, as a consumer's do on its event loop).
+    """
+    kind = "gauge"
+
+    def inc(self, *labels, amount=1):
+        shard = self._shard()
+        value = shard.get(labels, 0) + amount
+        if value:
+            shard[labels] = value
+        else:
+            shard.pop(labels, None)
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def _add(self, merged, labels, value):
+        value += merged.get(labels, 0)
+        if value:
+            merged[labels] = value
+        else:
+            merged.pop(labels, None)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        shard = self._shard()
+        series = shard.get(labels)
+        if series is None:
+            # one count per bucket plus +Inf, then the sum
+            series = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def _add(self, merged, labels, series):
+        total = merged.setdefault(labels, [0] * len(series[:-1]) + [0.0])
+        for i, value in enumerate(series):
+            total[i] += value
+
+    def _lines(self, labels, series):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+            cumulative += count
+            yield f"{self.name}_bucket{self._labels(labels, [('le', bound)])} {cumulative}"
+        yield f"{self.name}_sum{self._labels(labels)} {series[-1]}"
+        yield f"{self.name}_count{self._labels(labels)} {cumulative}"
+
+
+class _ShardOwner:
+    pass
+
+
+class CacheMetrics:
+    """Reads the counters ``TTLCache`` already keeps when ``/metrics`` is scraped."""
+
+    _counters = (
+        ("hits", "Cache lookups that found a live entry."),
+        ("misses", "Cache lookups that found nothing or an expired entry."),
+        ("evictions", "Entries pushed out because the cache was full."),
+        ("expirations", "Entries dropped on lookup because their TTL had passed."),
+    )
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self._caches = {}  # name -> TTLCache
+        REGISTRY.append(self)
+
+    def register(self, name, cache):
+        self._caches[name] = cache
+        return cache
+
+    def render(self):
+        stats = sorted((name, cache.stats()) for name, cache in self._caches.items())
+        lines = []
+        for field, documentation in self._counters:
+            name = f"{self.prefix}_{field}_total"
+            lines += [f"# HELP {name} {documentation}", f"# TYPE {name} counter"]
+            lines += [f'{name}{{cache="{_escape(cache)}"}} {values[field]}' for cache, values in stats]
+        name = f"{self.prefix}_entries"
+        lines += [f"# HELP {name} Entries held now.", f"# TYPE {name} gauge"]
+        lines += [f'{name}{{cache="{_escape(cache)}"}} {values["size"]}' for cache, values in stats]
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# -- application metrics ------------------------------------------------------------
+
+http_request_duration = Histogram(
+    "quizmaster_http_request_duration_seconds", "Time spent handling HTTP requests, per view.",
+    ("view", "method", "status"),
+)
+mongo_command_duration = Histogram(
+    "quizmaster_mongo_command_duration_seconds", "Mongo command round trips, per collection and command.",
+    ("collection", "command"),
+)
+mongo_command_failures = Counter(
+    "quizmaster_mongo_command_failures_total", "Mongo commands that returned an error.",
+    ("collection", "command"),
+)
+group_send_duration = Histogram(
+    "quizmaster_channel_group_send_duration_seconds", "Channel layer group_send calls, per event type.",
+    ("event",),
+)
+room_fanout_duration = Histogram(
+    "quizmaster_room_fanout_duration_seconds", "Per-worker fan-out of one room event to local sockets, per event type.",
+    ("event",),
+)
+ws_connects = Counter("quizmaster_ws_connects_total", "Accepted WebSocket connections.")
+ws_disconnects = Counter("quizmaster_ws_disconnects_total", "Closed WebSocket connections (after accept).")
+ws_open_sockets = Gauge("quizmaster_ws_open_sockets", "Open WebSocket connections.")
+rate_limited = Counter(
+    "quizmaster_rate_limited_total", "Requests refused by a rate limit, by rule, bucket (user/room) and transport.",
+    ("rule", "bucket", "transport"),
+)
+mongo_pool_connections = Gauge(
+    "quizmaster_mongo_pool_connections", "Mongo connections of this process, by state (open, in_use).", ("state",),
+)
+mongo_pool_checkout_failures = Counter(
+    "quizmaster_mongo_pool_checkout_failures_total", "Failed Mongo connection checkouts, by reason.", ("reason",),
+)
+caches = CacheMetrics("quizmaster_cache")  # per-process TTLCaches, by name
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every command sent by the client it is registered on."""
+
+    def __init__(self):
+        self._collections = {}  # (connection, request_id) -> collection, between started and finished
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        self._collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ""
+
+    def succeeded(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        mongo_command_duration.observe(event.duration_micros / 1e6, collection, event.command_name)
+
+    def failed(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        mongo_command_duration.observe(event.duration_micros / 1e6, collection, event.command_name)
+        mongo_command_failures.inc(collection, event.command_name)
+
+
+class MetricsMiddleware:
+    """Observes request latency per view (``url_name``, else the view function's name).
+
+    Sync and async capable, so async views never get a thread handoff on its account.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self._observe(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self._observe(request, response, started)
+        return response
+
+    @staticmethod
+    def _observe(request, response, started):
+        http_request_duration.observe(
+            time.perf_counter() - started, view_name(request), request.method, response.status_code
+        )
+
+
+def view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unresolved"
+    # DRF's @api_view keeps the function name on the generated view class
+    view_class = getattr(match.func, "cls", None)
+    return match.url_name or getattr(view_class, "__name__", None) or match.func.__name__
+
+
+def metrics_view(request):
+    """Only answers clients in ``METRICS["ALLOW_FROM"]`` (networks; the socket's peer address)."""
+    from django.conf import settings
+    from django.http import Http404, HttpResponse
+
+    config = getattr(settings, "METRICS", {})
+    if not config.get("ENABLED", True) or not _allowed(request.META.get("REMOTE_ADDR"), config):
+        raise Http404
+    return HttpResponse(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _allowed(address, config):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network) for network in config.get("ALLOW_FROM", ("127.0.0.1/32", "::1/128")))
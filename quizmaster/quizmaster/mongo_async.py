@@ -0,0 +1,129 @@
+"""Async MongoDB access for consumers and async views.
+
+Runs queries on the event loop through PyMongo's native ``AsyncMongoClient``
+instead of hopping to a thread with ``database_sync_to_async``. Works alongside the sync client in
+``mongo_client.py``: both point at the same ``MONGO_URI`` and database and
+share its ``MONGO_POOL`` options.
+"""
+import asyncio
+import os
+import weakref
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import AsyncMongoClient, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from quizmaster.mongo_client import DB_NAME, client_options, uri
+
+# Async clients are bound to the loop they first run on, so keep one per loop.
+_clients = weakref.WeakKeyDictionary()
+# A forked child starts without any of the parent's clients (see mongo_client.py)
+os.register_at_fork(after_in_child=_clients.clear)
+
+
+def get_async_db():
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncMongoClient(uri, **client_options())
+    return client[DB_NAME]
+
+
+class _Repository:
+    collection_name = None
+
+    @property
+    def collection(self):
+        return get_async_db()[self.collection_name]
+
+
+class UserRepository(_Repository):
+    collection_name = "users"
+
+    async def get_by_id(self, user_id, projection=None):
+        return await self.collection.find_one({"_id": ObjectId(user_id)}, projection)
+
+    async def get_by_email(self, email, projection=None):
+        return await self.collection.find_one({"email": email}, projection)
+
+
+class QuizRepository(_Repository):
+    collection_name = "quizzes"
+
+    async def get(self, quiz_id, projection=None):
+        return await self.collection.find_one({"_id": ObjectId(quiz_id)}, projection)
+
+
+class SessionRepository(_Repository):
+    collection_name = "sessions"
+
+    async def get_by_quiz(self, quiz_id, projection=None):
+        return await self.collection.find_one({"quiz_id": quiz_id}, projection)
+
+    async def update_by_id(self, session_id, update):
+        return await self.collection.update_one({"_id": session_id}, update)
+
+    async def update_by_quiz(self, quiz_id, update, extra_filter=None):
+        query = {"quiz_id": quiz_id, **(extra_filter or {})}
+        return await self.collection.update_one(query, update)
+
+    async def find_one_and_update(self, query, update, projection=None, after=False):
+        return await self.collection.find_one_and_update(
+            query, update, projection=projection,
+            return_document=ReturnDocument.AFTER if after else ReturnDocument.BEFORE,
+        )
+
+
+class ParticipantRepository(_Repository):
+    collection_name = "session_participants"
+
+    async def get(self, quiz_id, user_id, projection=None):
+        return await self.collection.find_one({"quiz_id": quiz_id, "user_id": user_id}, projection)
+
+    async def insert_if_absent(self, session_id, user_id, fields):
+        """Create the (session_id, user_id) document; ``False`` if it already existed."""
+        result = await self.collection.update_one(
+            {"session_id": session_id, "user_id": user_id}, {"$setOnInsert": fields}, upsert=True
+        )
+        return result.upserted_id is not None
+
+    async def bulk_write(self, operations, ordered=False):
+        return await self.collection.bulk_write(operations, ordered=ordered)
+
+    async def list_for_users(self, quiz_id, user_ids, projection=None):
+        return await self.collection.find({"quiz_id": quiz_id, "user_id": {"$in": user_ids}}, projection).to_list(None)
+
+    async def list_for_quiz(self, quiz_id, projection=None):
+        return await self.collection.find({"quiz_id": quiz_id}, projection).sort("joinedAt", 1).to_list(None)
+
+    async def find_one_and_update(self, query, update, projection=None, after=False):
+        return await self.collection.find_one_and_update(
+            query, update, projection=projection,
+            return_document=ReturnDocument.AFTER if after else ReturnDocument.BEFORE,
+        )
+
+
+class LeaseRepository(_Repository):
+    collection_name = "leases"
+
+    async def acquire(self, name, owner, ttl):
+        """Take or renew lease ``name`` for ``owner`` for ``ttl`` seconds; ``False`` while another owner holds it."""
+        now = datetime.utcnow()
+        try:
+            # Matches our own or an expired lease; otherwise the upsert collides on _id
+            await self.collection.update_one(
+                {"_id": name, "$or": [{"owner": owner}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=ttl)}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+
+users = UserRepository()
+quizzes = QuizRepository()
+sessions = SessionRepository()
+participants = ParticipantRepository()
+leases = LeaseRepository()
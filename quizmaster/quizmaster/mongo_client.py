@@ -1,8 +1,24 @@
+"""Sync MongoDB access.
 
+The client is created lazily, on first use, once per process: a forked worker
+drops the parent's client and builds its own, so sockets are never shared
+across processes. Pool sizes and timeouts come from ``MONGO_POOL`` in settings.
+
+The module-level ``db`` and ``*_collection`` names are proxies that resolve
+the current process's client on each access, so they can be imported freely.
+"""
+import os
+import threading
+
+from django.conf import settings
+from dotenv import load_dotenv
+from pymongo import monitoring
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
-from dotenv import load_dotenv
-import os
+
+from quizmaster import metrics
+from quizmaster import slow_queries
+from quizmaster.metrics import MongoCommandListener
 
 # Load environment variables from .env file
 load_dotenv()
@@ -10,11 +26,129 @@ load_dotenv()
 # Get MongoDB URI from environment
 uri = os.getenv('MONGO_URI')
 
-# Create a new client and connect to the server
-print("MongoDB connected")
-client = MongoClient(uri, server_api=ServerApi('1'))
+DB_NAME = "quizmaster"
+
+# MONGO_POOL key -> MongoClient option
+_POOL_OPTIONS = {
+    "MAX_POOL_SIZE": "maxPoolSize",
+    "MIN_POOL_SIZE": "minPoolSize",
+    "MAX_IDLE_TIME_MS": "maxIdleTimeMS",
+    "WAIT_QUEUE_TIMEOUT_MS": "waitQueueTimeoutMS",
+    "CONNECT_TIMEOUT_MS": "connectTimeoutMS",
+    "SERVER_SELECTION_TIMEOUT_MS": "serverSelectionTimeoutMS",
+    "SOCKET_TIMEOUT_MS": "socketTimeoutMS",
+}
+
+
+def client_options():
+    """Keyword arguments shared by the sync and async clients."""
+    config = getattr(settings, "MONGO_POOL", {})
+    options = {option: config[key] for key, option in _POOL_OPTIONS.items() if config.get(key) is not None}
+    return {
+        "server_api": ServerApi('1'),
+        "event_listeners": [MongoCommandListener(), pool_listener, *slow_queries.listeners()],
+        **options,
+    }
+
+
+class PoolListener(monitoring.ConnectionPoolListener):
+    """Feeds connection pool gauges (all clients of this process) into ``/metrics``."""
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        metrics.mongo_pool_connections.inc("open")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        metrics.mongo_pool_connections.dec("open")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        metrics.mongo_pool_checkout_failures.inc(event.reason)
+
+    def connection_checked_out(self, event):
+        metrics.mongo_pool_connections.inc("in_use")
+
+    def connection_checked_in(self, event):
+        metrics.mongo_pool_connections.dec("in_use")
+
+
+pool_listener = PoolListener()
+
+
+def pool_stats():
+    return {
+        "open": metrics.mongo_pool_connections.value("open"),
+        "in_use": metrics.mongo_pool_connections.value("in_use"),
+        "checkout_failures": sum(metrics.mongo_pool_checkout_failures.values().values()),
+    }
+
+
+_client = None
+_client_pid = None
+_lock = threading.Lock()
+
+
+def get_client():
+    """This process's ``MongoClient``, created on first use."""
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = MongoClient(uri, connect=False, **client_options())
+                _client_pid = os.getpid()
+    return _client
+
+
+def get_db():
+    return get_client()[DB_NAME]
+
+
+def _after_fork_in_child():
+    # The parent's sockets belong to the parent: forget the client, never close it here
+    global _client, _client_pid, _lock
+    _client = _client_pid = None
+    _lock = threading.Lock()
+    metrics.mongo_pool_connections.reset()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class _LazyDatabase:
+    def __getattr__(self, name):
+        return getattr(get_db(), name)
+
+    def __getitem__(self, name):
+        return get_db()[name]
+
+
+class _LazyCollection:
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, name):
+        return getattr(get_db()[self._name], name)
+
 
-db = client.quizmaster
-users_collection = db.users
-quizzes_collection = db.quizzes
-sessions_collection = db.sessions
\ No newline at end of file
+db = _LazyDatabase()
+users_collection = _LazyCollection("users")
+quizzes_collection = _LazyCollection("quizzes")
+sessions_collection = _LazyCollection("sessions")
+# One document per (session_id, user_id); see `manage.py migrate_participants`
+participants_collection = _LazyCollection("session_participants")
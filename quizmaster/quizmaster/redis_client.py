@@ -0,0 +1,35 @@
+from dotenv import load_dotenv
+import asyncio
+import os
+import weakref
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Redis used for shared live-game state. When REDIS_URL is not set every
+# component falls back to its in-process stand-in (single worker only).
+REDIS_URL = os.getenv('REDIS_URL')
+
+_client = None
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> redis.asyncio.Redis
+
+
+def get_redis():
+    """Return a shared ``redis.Redis`` client, or ``None`` if Redis is not configured."""
+    global _client
+    if _client is None and REDIS_URL:
+        import redis
+        _client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+    return _client
+
+
+def get_async_redis():
+    """Return a ``redis.asyncio.Redis`` client for the running loop, or ``None``."""
+    if not REDIS_URL:
+        return None
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        import redis.asyncio
+        client = _async_clients[loop] = redis.asyncio.Redis.from_url(REDIS_URL, decode_responses=True)
+    return client
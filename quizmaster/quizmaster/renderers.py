@@ -0,0 +1,32 @@
+"""JSON rendering for API responses, built on ``ujson``.
+
+Encodes Mongo documents as they come out of PyMongo: ``ObjectId`` becomes its
+hex string and ``Decimal128`` a number. Everything else ujson cannot encode
+(datetimes, UUIDs, lazy strings, ...) is formatted exactly as DRF's encoder
+would, so responses keep their shape.
+"""
+import ujson
+from bson import Decimal128, ObjectId
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_fallback = JSONEncoder()
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return _fallback.default(obj.to_decimal())
+    return _fallback.default(obj)
+
+
+def dumps(data):
+    return ujson.dumps(data, ensure_ascii=False, escape_forward_slashes=False, default=_default)
+
+
+class MongoJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return dumps(data).encode("utf-8")
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from datetime import timedelta
 from pathlib import Path
 
+from quizmaster.redis_client import REDIS_URL
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -49,13 +51,16 @@ INSTALLED_APPS = [
 ]
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
+        'quizmaster.renderers.MongoJSONRenderer',  # ujson; encodes ObjectId/Decimal128 natively
     ),
     
     
 }   
 
 MIDDLEWARE = [
+    'quizmaster.metrics.MetricsMiddleware',  # first, so it times the whole stack
+    'quizmaster.slow_queries.CallerMiddleware',
+    'quizmaster.compression.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -153,11 +158,149 @@ CORS_ALLOW_ALL_ORIGINS = True
 # Allow cookies/credentials
 CORS_ALLOW_CREDENTIALS = True
 
+# Redis channel layer on REDIS_URL, or the local Redis when it is not set
 CHANNEL_LAYERS = {
     "default": {
-        "BACKEND": "channels_redis.core.RedisChannelLayer",
+        "BACKEND": "quizmaster.channel_layers.InstrumentedRedisChannelLayer",  # RedisChannelLayer + metrics
         "CONFIG": {
-            "hosts": [("127.0.0.1", 6379)],
+            "hosts": [REDIS_URL or ("127.0.0.1", 6379)],
         },
     },
-}
\ No newline at end of file
+}
+
+# Compiled quiz cache used by get_current_question / submit_answer
+QUIZ_CACHE = {
+    "MAX_SIZE": 512,  # number of quizzes kept per process
+    "TTL": 300,       # seconds
+}
+
+# Live leaderboard (Redis sorted sets when REDIS_URL is set, in-process otherwise)
+LEADERBOARD = {
+    "BROADCAST_INTERVAL": 0.25,  # seconds between leaderboard_update pushes per room
+    "TOP_K": 10,
+    "KEY_TTL": 86400,  # seconds the Redis lb:* keys live after their last write
+}
+
+# Write-behind mode for submit_answer: answers are acknowledged from memory and
+# written to Mongo in batches. An acknowledged answer is lost only if the process
+# dies within FLUSH_INTERVAL_MS of it. Needs sticky routing per session.
+ANSWER_WRITE_BEHIND = {
+    "ENABLED": False,
+    "FLUSH_INTERVAL_MS": 200,
+    "MAX_BATCH": 500,      # flush early once this many answers are queued
+    "MAX_PENDING": 10000,  # callers flush synchronously at this many; still full, submits get a 503
+}
+
+# Index verification when the ASGI app starts (see `manage.py ensure_indexes`)
+MONGO_INDEXES = {
+    "CHECK_ON_STARTUP": True,
+    "CREATE_ON_STARTUP": False,
+}
+
+# How CookieJWTAuthentication resolves the user on each request
+AUTH_PRINCIPAL = {
+    "MODE": "lookup",         # "lookup" (Mongo, cached) or "claims" (token claims only)
+    "CACHE_TTL": 30,          # seconds a looked-up user is reused
+    "CACHE_MAX_SIZE": 10000,
+}
+
+# Join admission state (Redis when REDIS_URL is set, in-process otherwise)
+ADMISSION = {
+    "STATE_TTL": 24 * 3600,  # seconds a session's capacity/joined-set is kept in Redis
+}
+
+# Roster broadcasts: joins are batched into one roster_delta per window
+ROSTER = {
+    "WINDOW": 0.25,  # seconds
+}
+
+# Server-side quiz clock (see quiz/scheduler.py and `manage.py run_scheduler`)
+QUIZ_SCHEDULER = {
+    "ENABLED": True,       # start with each ASGI worker (see SchedulerMiddleware)
+    "TICK": 1.0,           # timer wheel resolution, seconds
+    "POLL_INTERVAL": 15,   # seconds between scans for sessions to start/track
+    "LOCK_TTL": 10,        # leader lock lifetime, seconds
+    "START_GRACE": 300,    # still auto-start sessions whose start_time passed this recently
+}
+
+# Prometheus-text metrics for this worker process at /metrics (see quizmaster/metrics.py)
+METRICS = {
+    "ENABLED": True,
+    # Networks allowed to scrape it (the peer address; others get a 404). Add the scraper's here.
+    "ALLOW_FROM": ["127.0.0.1/32", "::1/128"],
+}
+
+# Opt-in slow Mongo command log (see quizmaster/slow_queries.py and `manage.py slow_queries`)
+SLOW_QUERIES = {
+    "ENABLED": False,
+    "THRESHOLD_MS": 100,
+    "DOCS_EXAMINED_RATIO": 10,       # flag plans examining this many docs per returned doc
+    "EXPLAIN": True,                 # explain captures (executionStats) on a background thread
+    "EXPLAIN_INTERVAL": 300,         # seconds between explains of the same query shape
+    "BUFFER_SIZE": 200,              # per-process ring buffer
+    "CAPPED_BYTES": 8 * 1024 * 1024, # size of the shared capped collection
+}
+
+# Mongo connection pool, per process (see quizmaster/mongo_client.py; None = driver default)
+MONGO_POOL = {
+    "MAX_POOL_SIZE": 100,
+    "MIN_POOL_SIZE": 0,
+    "MAX_IDLE_TIME_MS": 60000,             # close idle sockets after a minute
+    "WAIT_QUEUE_TIMEOUT_MS": 2000,         # fail fast when the pool is exhausted
+    "CONNECT_TIMEOUT_MS": 5000,
+    "SERVER_SELECTION_TIMEOUT_MS": 5000,   # also bounds the /readyz ping
+    "SOCKET_TIMEOUT_MS": None,
+}
+
+# Response compression (see quizmaster/compression.py; brotli is used when installed)
+COMPRESSION = {
+    "MIN_SIZE": 1024,      # bytes; smaller bodies are sent uncompressed
+    "GZIP_LEVEL": 6,
+    "BROTLI_QUALITY": 4,   # 0-11; 4 is close to gzip's cost with smaller output
+}
+
+# Redis hot state for in-progress sessions (see quiz/hot_state.py). Answers reach
+# Mongo up to CHECKPOINT_INTERVAL late. Only used when REDIS_URL is also set;
+# takes precedence over ANSWER_WRITE_BEHIND.
+HOT_STATE = {
+    "ENABLED": False,
+    "CHECKPOINT_INTERVAL": 1.0,  # seconds between Mongo checkpoints per worker
+    "CHECKPOINT_BATCH": 1000,    # answers popped per bulk write
+    "TTL": 6 * 3600,             # seconds the Redis keys of a session live
+}
+
+# Token-bucket rate limits (see quiz/ratelimit.py): (tokens per second, burst)
+# per user and per room (quiz). Redis-backed when REDIS_URL is set.
+RATE_LIMITS = {
+    "ENABLED": True,
+    "RULES": {
+        "create": {"user": (0.2, 5)},
+        "read": {"user": (5, 20)},
+        "join": {"user": (1, 5), "room": (200, 1000)},
+        "start": {"user": (0.2, 3)},
+        "question": {"user": (5, 20)},
+        "submit": {"user": (5, 10), "room": (2000, 5000)},
+        "ws": {"user": (10, 30)},  # WebSocket frames with any other action
+    },
+}
+
+# Session version used for get_sessions ETags (see quiz/session_version.py)
+SESSION_VERSION = {
+    "SCORE_BUMP_INTERVAL": 0.5,  # seconds; score changes bump the version at most this often
+}
+
+# WebSocket wire formats (see quiz/protocol.py). JSON text frames stay the
+# default; clients may offer the "quiz.msgpack.v1" subprotocol instead.
+WS_PROTOCOL = {
+    "MSGPACK": True,
+    "FRAME_CACHE_SIZE": 1024,  # encoded group events kept per worker
+    "FRAME_CACHE_TTL": 10.0,   # seconds; only needs to outlive one fan-out
+}
+
+# How room events reach sockets (see quiz/fanout.py). "channel_layer": a
+# group_send through CHANNEL_LAYERS, one Redis write per socket. "worker": one
+# Redis pub/sub message per event, fanned out by each worker to its own sockets.
+ROOM_FANOUT = {
+    "MODE": "channel_layer",
+    "CHANNEL_PREFIX": "fanout:",
+}
@@ -0,0 +1,262 @@
+"""Opt-in slow-query recorder for the Mongo clients.
+
+A command listener captures every command slower than ``THRESHOLD_MS`` with its
+filter shape (values replaced by type names) and the view or WebSocket action
+that issued it. A background thread then explains the command and flags
+COLLSCANs and high docsExamined/nReturned ratios. Captures are kept in a
+per-process ring buffer and, so all workers can be inspected together, in the
+capped ``slow_queries`` collection read by ``manage.py slow_queries`` and
+``/api/v1/admin/slow-queries/``.
+
+The caller is tracked with a context variable. The sync client runs commands
+in the request's thread and ``AsyncMongoClient`` in the awaiting task, and
+both call the listener there, so captures from either carry the caller.
+"""
+import contextvars
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from pymongo import monitoring
+from pymongo.errors import CollectionInvalid
+
+from quizmaster.metrics import view_name
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, "SLOW_QUERIES", {})
+
+ENABLED = _config.get("ENABLED", False)
+THRESHOLD_MS = _config.get("THRESHOLD_MS", 100)
+DOCS_EXAMINED_RATIO = _config.get("DOCS_EXAMINED_RATIO", 10)
+EXPLAIN = _config.get("EXPLAIN", True)
+EXPLAIN_INTERVAL = _config.get("EXPLAIN_INTERVAL", 300)  # seconds between explains of one shape
+
+COLLECTION = "slow_queries"
+
+# Where the query text lives for each explainable command
+_FILTER_FIELDS = {
+    "find": lambda cmd: cmd.get("filter", {}),
+    "aggregate": lambda cmd: cmd.get("pipeline", []),
+    "count": lambda cmd: cmd.get("query", {}),
+    "distinct": lambda cmd: cmd.get("query", {}),
+    "findAndModify": lambda cmd: cmd.get("query", {}),
+    "update": lambda cmd: [u.get("q", {}) for u in cmd.get("updates", [])[:1]],
+    "delete": lambda cmd: [d.get("q", {}) for d in cmd.get("deletes", [])[:1]],
+}
+
+# Session/transport fields the explain command must not carry
+_STRIP_FIELDS = {"lsid", "txnNumber", "apiVersion", "apiStrict", "apiDeprecationErrors", "writeConcern"}
+
+current_caller = contextvars.ContextVar("slow_query_caller", default=None)
+
+buffer = deque(maxlen=_config.get("BUFFER_SIZE", 200))
+
+
+def query_shape(value):
+    """``{"user_id": "abc", "n": {"$gt": 3}}`` -> ``{"user_id": "str", "n": {"$gt": "int"}}``.
+
+    Stored as JSON text, since ``$``-prefixed keys cannot be written to Mongo as is.
+    """
+    if isinstance(value, dict):
+        return {key: query_shape(v) for key, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        shape = [query_shape(v) for v in value[:1]]
+        return shape + ["..."] if len(value) > 1 else shape
+    return type(value).__name__
+
+
+def _first(doc, key):
+    """First value stored under ``key`` anywhere in a nested explain document."""
+    if isinstance(doc, dict):
+        if key in doc:
+            return doc[key]
+        children = doc.values()
+    elif isinstance(doc, list):
+        children = doc
+    else:
+        return None
+    for child in children:
+        found = _first(child, key)
+        if found is not None:
+            return found
+    return None
+
+
+def summarize_explain(explain):
+    from quizmaster.indexes import _plan_stages
+
+    stages = list(_plan_stages(_first(explain, "winningPlan") or {}))
+    docs_examined = _first(explain, "totalDocsExamined") or 0
+    returned = _first(explain, "nReturned") or 0
+    ratio = docs_examined / max(returned, 1)
+    flags = []
+    if "COLLSCAN" in stages:
+        flags.append("COLLSCAN")
+    if ratio > DOCS_EXAMINED_RATIO:
+        flags.append(f"docsExamined/nReturned={ratio:.0f}")
+    return {
+        "stages": stages,
+        "docs_examined": docs_examined,
+        "keys_examined": _first(explain, "totalKeysExamined") or 0,
+        "returned": returned,
+        "ratio": ratio,
+        "flags": flags,
+    }
+
+
+class _Explainer(threading.Thread):
+    """Explains and persists captures off the request path."""
+
+    def __init__(self):
+        super().__init__(name="slow-query-explainer", daemon=True)
+        self.queue = queue.Queue(maxsize=1000)
+        self._explained = {}  # shape key -> last explain time
+        self._collection = None
+
+    def submit(self, capture, command):
+        try:
+            self.queue.put_nowait((capture, command))
+        except queue.Full:
+            pass  # the capture stays in the local buffer, unexplained
+
+    def run(self):
+        while True:
+            capture, command = self.queue.get()
+            try:
+                if EXPLAIN and command is not None:
+                    self._explain(capture, command)
+                self._persist(capture)
+            except Exception:
+                logger.exception("Could not explain/store slow query")
+
+    def _explain(self, capture, command):
+        key = (capture["database"], capture["collection"], capture["command"], capture["filter"])
+        now = time.monotonic()
+        if now - self._explained.get(key, float("-inf")) < EXPLAIN_INTERVAL:
+            return
+        self._explained[key] = now
+        from quizmaster.mongo_client import get_client
+
+        explain = get_client()[capture["database"]].command("explain", command, verbosity="executionStats")
+        capture["explain"] = summarize_explain(explain)
+
+    def _persist(self, capture):
+        if self._collection is None:
+            from quizmaster.mongo_client import db
+
+            try:
+                db.create_collection(COLLECTION, capped=True, size=_config.get("CAPPED_BYTES", 8 * 1024 * 1024))
+            except CollectionInvalid:
+                pass  # already exists
+            self._collection = db[COLLECTION]
+        self._collection.insert_one(dict(capture))
+
+
+_explainer = None
+_explainer_lock = threading.Lock()
+
+
+def _get_explainer():
+    global _explainer
+    if _explainer is None:
+        with _explainer_lock:
+            if _explainer is None:
+                _explainer = _Explainer()
+                _explainer.start()
+    return _explainer
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    def __init__(self, threshold_ms=THRESHOLD_MS):
+        self.threshold_micros = threshold_ms * 1000
+        self._pending = {}  # (connection, request_id) -> (command, database, caller)
+
+    def started(self, event):
+        if event.command_name == "explain" or event.command.get(event.command_name) == COLLECTION:
+            return  # our own traffic
+        self._pending[(event.connection_id, event.request_id)] = (
+            event.command, event.database_name, current_caller.get()
+        )
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None or event.duration_micros < self.threshold_micros:
+            return
+        command, database, caller = pending
+        name = event.command_name
+        target = command.get(name)
+        filter_of = _FILTER_FIELDS.get(name)
+        capture = {
+            "at": datetime.utcnow(),
+            "duration_ms": event.duration_micros / 1000,
+            "database": database,
+            "collection": target if isinstance(target, str) else "",
+            "command": name,
+            "filter": json.dumps(query_shape(filter_of(command))) if filter_of else None,
+            "caller": caller,
+            "explain": None,
+        }
+        buffer.append(capture)
+        explainable = None
+        if filter_of:
+            explainable = {k: v for k, v in command.items() if k not in _STRIP_FIELDS and not k.startswith("$")}
+        _get_explainer().submit(capture, explainable)
+
+
+def listeners():
+    """Event listeners to register on a Mongo client (empty unless enabled)."""
+    return [SlowQueryListener()] if ENABLED else []
+
+
+def recent(limit=50, flagged_only=False):
+    """Most recent captures, newest first, across all workers (capped collection)."""
+    from quizmaster.mongo_client import db
+
+    query = {"explain.flags.0": {"$exists": True}} if flagged_only else {}
+    return list(db[COLLECTION].find(query, {"_id": 0}).sort("$natural", -1).limit(limit))
+
+
+class CallerMiddleware:
+    """Records which view is running, so slow queries can be attributed to it.
+
+    Sync and async capable; in async mode ``process_view`` is a coroutine too,
+    so Django runs it on the event loop rather than in a thread. In sync mode
+    the caller is reset after each request, since the worker thread (and its
+    context) serves the next one too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.get_response(request)  # each request runs in its own task and context
+        token = current_caller.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            current_caller.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        current_caller.set(view_name(request))
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        current_caller.set(view_name(request))
@@ -1,62 +1,64 @@
-from channels.db import database_sync_to_async
 from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.http.cookie import parse_cookie
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
-from quizmaster.mongo_client import users_collection
-from bson import ObjectId
+from accounts.authentication import (
+    PRINCIPAL_MODE,
+    aload_principal,
+    principal_from_claims,
+)
 
-@database_sync_to_async
-def get_user(user_id):
+
+class WsPrincipal:
+    """Authenticated WebSocket user; mimics the bits of Django's User the consumers use."""
+
+    __slots__ = ("id", "username", "email", "is_staff")
+    is_authenticated = True
+
+    def __init__(self, user_doc):
+        self.id = user_doc["_id"]
+        self.username = user_doc.get("username")
+        self.email = user_doc.get("email")
+        self.is_staff = user_doc.get("is_staff", False) # Fallback if not present
+
+
+async def get_user(token):
+    # Claims-only: no DB access at all
+    if PRINCIPAL_MODE == "claims":
+        user_doc = principal_from_claims(token)
+        if user_doc:
+            return WsPrincipal(user_doc)
+
+    # Cache shared with CookieJWTAuthentication; a miss queries on the event loop
     try:
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
-        if user:
-            user['_id'] = str(user['_id'])
-            # Create a simple object to mimic Django's User model
-            class User:
-                is_authenticated = True
-                id = user['_id']
-                username = user.get('username')
-                email = user.get('email')
-                is_staff = user.get('is_staff', False) # Fallback if not present
-            return User()
-        return None
+        user_doc = await aload_principal(token["user_id"])
     except Exception:
         return None
+    return WsPrincipal(user_doc) if user_doc else None
+
+
+def get_cookie(scope, name):
+    """Return cookie ``name`` from the ASGI scope headers, or ``None``."""
+    for header, value in scope.get('headers', ()):
+        if header == b'cookie':
+            return parse_cookie(value.decode('latin-1')).get(name)
+    return None
+
 
 class JwtAuthMiddleware(BaseMiddleware):
     async def __call__(self, scope, receive, send):
-        # 1. Get headers from scope
-        headers = dict(scope['headers'])
-        
-        # 2. Extract Cookie header
-        # Headers are byte strings in ASGI, so we decode them
-        cookies_str = headers.get(b'cookie', b'').decode()
-        
-        access_token = None
-        
-        # 3. Parse cookies to find 'access_token'
-        # Format: "name=value; name2=value2"
-        for cookie in cookies_str.split('; '):
-            if cookie.startswith('access_token='):
-                access_token = cookie.split('=')[1]
-                break
-        
-        # 4. Validate Token
+        access_token = get_cookie(scope, 'access_token')
+        user = None
+
+        # Validate Token
         if access_token:
             try:
                 # Decode the token (stateless check)
-                token = AccessToken(access_token)
-                user_id = token['user_id']
-                
-                # Fetch user from DB
-                scope['user'] = await get_user(user_id)
-                
+                user = await get_user(AccessToken(access_token))
             except (InvalidToken, TokenError, KeyError):
                 # Token is invalid
-                from django.contrib.auth.models import AnonymousUser
-                scope['user'] = AnonymousUser()
-        else:
-            from django.contrib.auth.models import AnonymousUser
-            scope['user'] = AnonymousUser()
+                user = None
 
-        return await super().__call__(scope, receive, send)
\ No newline at end of file
+        scope['user'] = user or AnonymousUser()
+        return await super().__call__(scope, receive, send)
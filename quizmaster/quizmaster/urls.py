@@ -2,11 +2,16 @@
 from django.contrib import admin
 from django.urls import path ,include
 import accounts
+from quizmaster.metrics import metrics_view
+from quizmaster.views import get_slow_queries, readyz
  
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/user/',include('accounts.urls')),
     path('api/v1/quizzes/',include('quiz.urls')),
+    path('metrics', metrics_view, name='metrics'),
+    path('readyz', readyz, name='readyz'),
+    path('api/v1/admin/slow-queries/', get_slow_queries, name='get_slow_queries'),
     
     
 ]
@@ -0,0 +1,48 @@
+from django.http import JsonResponse
+from pymongo.errors import PyMongoError
+from rest_framework import status
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from accounts.authentication import CookieJWTAuthentication
+from quizmaster import indexes, slow_queries
+from quizmaster.mongo_client import get_client, pool_stats
+
+
+def readyz(request):
+    """Readiness probe: Mongo answers a ping and the startup index check finished without problems."""
+    checks = {"pool": pool_stats()}
+    ready = True
+    try:
+        get_client().admin.command("ping")
+        checks["mongo"] = "ok"
+    except PyMongoError as e:
+        checks["mongo"] = str(e)
+        ready = False
+    if indexes.check_pending():
+        checks["indexes"] = "startup check still running"
+        ready = False
+    elif indexes.last_check_problems:
+        checks["indexes"] = indexes.last_check_problems
+        ready = False
+
+    return JsonResponse({"ready": ready, **checks}, status=200 if ready else 503)
+
+
+@api_view(["GET"])
+@authentication_classes([CookieJWTAuthentication])
+@permission_classes([IsAdminUser])
+def get_slow_queries(request):
+    """Recent slow Mongo commands from every worker (``?limit=``, ``?flagged=1`` for COLLSCAN etc.)."""
+    try:
+        limit = min(max(int(request.query_params.get("limit", 50)), 1), 500)
+    except ValueError:
+        return Response({"detail": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+    flagged = request.query_params.get("flagged") in ("1", "true")
+
+    return Response({
+        "enabled": slow_queries.ENABLED,
+        "threshold_ms": slow_queries.THRESHOLD_MS,
+        "queries": slow_queries.recent(limit, flagged_only=flagged),
+    }, status=status.HTTP_200_OK)